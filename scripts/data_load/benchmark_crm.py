@@ -0,0 +1,139 @@
+"""
+CRM scale benchmark.
+
+Measures, against a CRM storage backend holding N synthetic profiles (see generate_profiles.py):
+- lookups by client id (load_from_crm_by_client_id)
+- fuzzy lookups by name, i.e. LIKE '%name%' (load_from_crm_by_client_fullname), both hits and misses
+- the profile-to-prompt serialization cost, i.e. the JSON the CRM tools hand over to the LLM
+
+Backends:
+- memory: InMemoryCRMStore, populated in-process with the generated profiles
+- cosmos: CRMStore, pointing at the Cosmos DB container of the current azd environment (use --load to bulk load the profiles first)
+
+Usage:
+    python scripts/data_load/benchmark_crm.py banking 100000 --backend memory --lookups 1000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+from crm_store import InMemoryCRMStore
+from generate_profiles import generate_profiles
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def describe(name, durations, **extra):
+    return {
+        "name": name,
+        "count": len(durations),
+        "mean_ms": round(statistics.fmean(durations) * 1000, 3),
+        "p50_ms": round(percentile(durations, 50) * 1000, 3),
+        "p95_ms": round(percentile(durations, 95) * 1000, 3),
+        "p99_ms": round(percentile(durations, 99) * 1000, 3),
+        "ops_per_s": round(len(durations) / max(sum(durations), 1e-9), 1),
+        **extra,
+    }
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def sample_queries(profiles, lookups, seed):
+    """
+    Consume the generated profiles, yielding them on, while reservoir-sampling the (client id, last name) pairs to query.
+    """
+    rng = random.Random(seed)
+    sample = []
+
+    def _iter():
+        for i, profile in enumerate(profiles):
+            if len(sample) < lookups:
+                sample.append((profile["clientID"], profile["lastName"]))
+            else:
+                j = rng.randint(0, i)
+                if j < lookups:
+                    sample[j] = (profile["clientID"], profile["lastName"])
+            yield profile
+
+    return sample, _iter()
+
+
+def run(db, sample):
+    results = []
+
+    by_id = [timed(db.get_customer_profile_by_client_id, client_id) for client_id, _ in sample]
+    results.append(describe("lookup_by_id", [d for d, _ in by_id], hits=sum(1 for _, r in by_id if r)))
+
+    by_name = [timed(db.get_customer_profile_by_full_name, last_name) for _, last_name in sample]
+    results.append(describe("lookup_by_name", [d for d, _ in by_name], hits=sum(1 for _, r in by_name if r)))
+
+    misses = [timed(db.get_customer_profile_by_full_name, f"Unknown Client {i}") for i in range(max(1, len(sample) // 10))]
+    results.append(describe("lookup_by_name_miss", [d for d, _ in misses], hits=sum(1 for _, r in misses if r)))
+
+    fetched = [r for _, r in by_id if r]
+    if fetched:
+        # SK CRMFacade uses json.dumps, the vanilla agents wrap_function serializes with ensure_ascii=False
+        sk_payloads = [timed(json.dumps, profile) for profile in fetched]
+        vanilla_payloads = [timed(lambda p: json.dumps(p, ensure_ascii=False), profile) for profile in fetched]
+        for name, payloads in (("serialize_sk", sk_payloads), ("serialize_vanilla", vanilla_payloads)):
+            chars = statistics.fmean(len(payload) for _, payload in payloads)
+            # ~4 characters per token is a good approximation for JSON payloads
+            results.append(describe(name, [d for d, _ in payloads], avg_chars=round(chars), approx_tokens=round(chars / 4)))
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CRM lookups and profile serialization at scale")
+    parser.add_argument("use_case", choices=["banking", "insurance"], help="The profile shape to generate")
+    parser.add_argument("count", type=int, help="Number of profiles in the data set (e.g. 10000 to 1000000)")
+    parser.add_argument("--backend", choices=["memory", "cosmos"], default="memory", help="The storage backend to benchmark")
+    parser.add_argument("--load", action="store_true", help="cosmos backend: bulk load the generated profiles before benchmarking")
+    parser.add_argument("--lookups", type=int, default=1000, help="Number of lookups per measurement")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed of the data set")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    sample, profiles = sample_queries(generate_profiles(args.use_case, args.count, seed=args.seed), args.lookups, args.seed)
+
+    started = time.perf_counter()
+    if args.backend == "memory":
+        db = InMemoryCRMStore(profiles)
+    else:
+        from azure.identity import DefaultAzureCredential
+        from bulk_load_crm import bulk_load
+        from crm_store import CRMStore
+        from setup_cosmosdb import load_azd_env
+
+        load_azd_env()
+        db = CRMStore(
+                url=os.getenv("COSMOSDB_ENDPOINT"),
+                key=DefaultAzureCredential(),
+                database_name=os.getenv("COSMOSDB_DATABASE_NAME"),
+                container_name=os.getenv("COSMOSDB_CONTAINER_CLIENT_NAME")
+            )
+        if args.load:
+            bulk_load(db, profiles)
+        else:
+            # Only the sampled keys are needed, the profiles are expected to be in the container already
+            for _ in profiles:
+                pass
+    setup_s = time.perf_counter() - started
+
+    results = run(db, sample)
+    if args.json:
+        print(json.dumps({"backend": args.backend, "use_case": args.use_case, "count": args.count, "setup_s": round(setup_s, 1), "results": results}, indent=2))
+    else:
+        print(f"backend={args.backend} use_case={args.use_case} profiles={args.count} setup={setup_s:.1f}s")
+        for result in results:
+            print("  " + "  ".join(f"{key}={value}" for key, value in result.items()))
@@ -0,0 +1,277 @@
+"""
+Bulk loader for CRM client profiles.
+
+Streams profiles from a directory of JSON files or from an NDJSON file and upserts them into the CRM container
+with bounded concurrency. Throttled requests (HTTP 429) are retried after the delay advertised by the server,
+throughput and RU consumption are reported while loading, and loaded ids are checkpointed so that an
+interrupted load can be resumed.
+
+Usage:
+    python scripts/data_load/bulk_load_crm.py <directory|file.ndjson> [--concurrency 16] [--checkpoint path] [--restart]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from azure.cosmos import exceptions
+
+logger = logging.getLogger("moneta")
+
+NDJSON_EXTENSIONS = (".ndjson", ".jsonl")
+
+
+def iter_profiles(source):
+    """
+    Lazily yield the customer profiles found at source.
+
+    Args:
+    - source (str): A directory of .json/.ndjson files, a single .json file (one profile or a list) or an NDJSON file (one profile per line).
+    """
+    if os.path.isdir(source):
+        for entry in sorted(os.scandir(source), key=lambda e: e.name):
+            if entry.is_file() and entry.name.endswith((".json",) + NDJSON_EXTENSIONS):
+                yield from _iter_file(entry.path)
+    else:
+        yield from _iter_file(source)
+
+
+def _iter_file(path):
+    if path.endswith(NDJSON_EXTENSIONS):
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    else:
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        if isinstance(data, list):
+            yield from data
+        else:
+            yield data
+
+
+def profile_id(profile):
+    return str(profile.get("id") or profile.get("clientID") or "")
+
+
+class Checkpoint:
+    """
+    Append-only file with the ids of the profiles already loaded. Used to resume an interrupted load.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.ids = set()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.ids = {line.strip() for line in file if line.strip()}
+        self.file = open(path, "a", encoding="utf-8") if path else None
+
+    def __contains__(self, item):
+        return item in self.ids
+
+    def add(self, item):
+        with self.lock:
+            self.ids.add(item)
+            if self.file:
+                self.file.write(f"{item}\n")
+                self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+class LoadStats:
+    """
+    Thread-safe counters for the bulk load, including request units (RU) consumed.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.loaded = 0
+        self.skipped = 0
+        self.failed = 0
+        self.throttled = 0
+        self.request_charge = 0.0
+
+    def record(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return {
+            "loaded": self.loaded,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "elapsed_s": round(elapsed, 1),
+            "profiles_per_s": round(self.loaded / elapsed, 1),
+            "request_charge": round(self.request_charge, 1),
+            "ru_per_s": round(self.request_charge / elapsed, 1),
+        }
+
+
+class ThrottleGate:
+    """
+    Shared pause honoured by all the workers: when one request is throttled, nobody sends until the server's retry-after has elapsed.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resume_at = 0.0
+
+    def pause(self, seconds):
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+    def wait(self):
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def retry_after_seconds(error, attempt):
+    """
+    Delay requested by Cosmos DB for a throttled request, falling back to exponential backoff when the header is missing.
+    """
+    headers = getattr(error, "headers", None) or {}
+    retry_after_ms = headers.get("x-ms-retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    return min(2 ** attempt * 0.1, 30)
+
+
+def upsert_with_retry(db, profile, stats, gate, max_retries):
+    attempt = 0
+    while True:
+        gate.wait()
+        headers = {}
+        try:
+            db.upsert_customer_profile(profile, response_hook=lambda response_headers, _: headers.update(response_headers or {}))
+            stats.record(request_charge=float(headers.get("x-ms-request-charge", 0) or 0))
+            return
+        except exceptions.CosmosHttpResponseError as e:
+            if e.status_code != 429 or attempt >= max_retries:
+                raise
+            attempt += 1
+            delay = retry_after_seconds(e, attempt)
+            stats.record(throttled=1)
+            logger.debug(f"Throttled loading profile {profile_id(profile)}, retrying in {delay:.2f}s (attempt {attempt})")
+            gate.pause(delay)
+
+
+def bulk_load(db, profiles, concurrency=16, checkpoint=None, max_retries=10, report_every=1000):
+    """
+    Upsert the given profiles into the CRM container with bounded concurrency.
+
+    Args:
+    - db (CRMStore): The CRM store to load into.
+    - profiles (iterable): The profiles to load, consumed lazily.
+    - concurrency (int): The maximum number of in-flight requests.
+    - checkpoint (Checkpoint): Ids already loaded are skipped, newly loaded ids are appended.
+    - max_retries (int): The maximum number of retries of a throttled request.
+    - report_every (int): Log progress every N processed profiles.
+
+    Returns:
+    - dict: The load summary (counts, throughput and RU consumption).
+    """
+    checkpoint = checkpoint or Checkpoint(None)
+    stats = LoadStats()
+    gate = ThrottleGate()
+    in_flight = {}
+    processed = 0
+
+    def load_one(profile):
+        upsert_with_retry(db, profile, stats, gate, max_retries)
+        return profile_id(profile)
+
+    def collect(done):
+        nonlocal processed
+        for future in done:
+            pending_id = in_flight.pop(future)
+            try:
+                checkpoint.add(future.result())
+                stats.record(loaded=1)
+            except Exception as e:
+                logger.error(f"Failed to load profile {pending_id}: {e}")
+                stats.record(failed=1)
+            processed += 1
+            if processed % report_every == 0:
+                logger.info(f"Progress: {stats.summary()}")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for profile in profiles:
+            item_id = profile_id(profile)
+            if not item_id:
+                logger.error("Skipping profile without 'id' or 'clientID'")
+                stats.record(failed=1)
+                continue
+            if item_id in checkpoint:
+                stats.record(skipped=1)
+                continue
+            # Bound the number of profiles held in memory, not only the number of threads
+            if len(in_flight) >= concurrency * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight[executor.submit(load_one, profile)] = item_id
+        if in_flight:
+            done, _ = wait(in_flight)
+            collect(done)
+
+    summary = stats.summary()
+    logger.info(f"Bulk load completed: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    from azure.identity import DefaultAzureCredential
+    from rich.logging import RichHandler
+    from crm_store import CRMStore
+    from setup_cosmosdb import load_azd_env
+
+    parser = argparse.ArgumentParser(description="Bulk load CRM client profiles into Cosmos DB")
+    parser.add_argument("source", help="Directory of JSON/NDJSON files, or a single JSON/NDJSON file")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum number of in-flight upserts")
+    parser.add_argument("--max-retries", type=int, default=10, help="Maximum retries of a throttled (429) upsert")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file, defaults to <source>.checkpoint")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and load everything again")
+    parser.add_argument("--report-every", type=int, default=1000, help="Log progress every N profiles")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s", datefmt="[%X]", handlers=[RichHandler(rich_tracebacks=True)])
+    logger.setLevel(logging.INFO)
+
+    load_azd_env()
+
+    checkpoint_path = args.checkpoint or f"{os.path.normpath(args.source)}.checkpoint"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    db = CRMStore(
+            url=os.getenv("COSMOSDB_ENDPOINT"),
+            key=DefaultAzureCredential(),
+            database_name=os.getenv("COSMOSDB_DATABASE_NAME"),
+            container_name=os.getenv("COSMOSDB_CONTAINER_CLIENT_NAME")
+        )
+
+    checkpoint = Checkpoint(checkpoint_path)
+    try:
+        summary = bulk_load(db, iter_profiles(args.source),
+                            concurrency=args.concurrency,
+                            checkpoint=checkpoint,
+                            max_retries=args.max_retries,
+                            report_every=args.report_every)
+    finally:
+        checkpoint.close()
+
+    raise SystemExit(1 if summary["failed"] else 0)
@@ -47,6 +47,18 @@ class CRMStore:
             print(f"An error occurred: {e}")
             return None
 
+    def upsert_customer_profile(self, customer_profile, **kwargs):
+        """
+        Creates or replaces the customer profile in Cosmos DB.
+        
+        Unlike create_customer_profile, errors are not swallowed so that callers (e.g. the bulk loader) can retry throttled requests.
+        
+        Args:
+        - customer_profile (dict): The customer profile to save.
+        - kwargs: Additional request options forwarded to the container (e.g. response_hook).
+        """
+        return self.container.upsert_item(body=customer_profile, **kwargs)
+
 
     def get_customer_profile_by_full_name(self, full_name):
         """
@@ -90,3 +102,71 @@ class CRMStore:
             enable_cross_partition_query=True
         ))
         return items[0] if items else None
+
+
+class InMemoryCRMStore:
+    """
+    In-process CRM store with the same interface as CRMStore.
+    
+    Profiles are kept serialized, as a document store would return them, and looked up by client_id through a dict.
+    Full name lookups reproduce the case-sensitive LIKE '%name%' semantics of the Cosmos DB query with a linear scan
+    of the name index, keyed by client_id so that an upsert replaces the previous name.
+    Useful for local development and as a baseline for the CRM scale benchmark.
+    """
+    def __init__(self, profiles=None):
+        self.profiles = {}
+        self.full_names = {}
+        for profile in profiles or []:
+            self.upsert_customer_profile(profile)
+
+    def create_customer_profile(self, customer_profile):
+        """
+        Saves the customer profile, unless a profile with the same client id already exists.
+        
+        Args:
+        - customer_profile (dict): The customer profile to save.
+        """
+        if customer_profile["clientID"] in self.profiles:
+            print(f"An error occurred: profile {customer_profile['clientID']} already exists")
+            return None
+        return self.upsert_customer_profile(customer_profile)
+
+    def upsert_customer_profile(self, customer_profile, **kwargs):
+        """
+        Creates or replaces the customer profile.
+        
+        Args:
+        - customer_profile (dict): The customer profile to save.
+        """
+        client_id = customer_profile["clientID"]
+        self.full_names[client_id] = customer_profile.get("fullName", "")
+        self.profiles[client_id] = json.dumps(customer_profile)
+        return customer_profile
+
+    def get_customer_profile_by_full_name(self, full_name):
+        """
+        Retrieves a customer profile based on a partial match of the customer's full name.
+        
+        Args:
+        - full_name (str): The partial or full name of the customer to search for.
+        
+        Returns:
+        - dict: The customer profile, if found.
+        """
+        for client_id, name in self.full_names.items():
+            if full_name in name:
+                return json.loads(self.profiles[client_id])
+        return None
+
+    def get_customer_profile_by_client_id(self, client_id):
+        """
+        Retrieves a customer profile based on a client_id.
+        
+        Args:
+        - client_id (str): The client id of the customer to search for.
+        
+        Returns:
+        - dict: The customer profile, if found.
+        """
+        profile = self.profiles.get(client_id)
+        return json.loads(profile) if profile is not None else None
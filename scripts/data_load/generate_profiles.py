@@ -0,0 +1,206 @@
+"""
+Synthetic client-profile generator.
+
+Produces realistic banking and insurance client profiles in the shapes of src/data/customer-profiles/customer-banking.json
+and customer-insurance.json. Profiles are written as NDJSON (one profile per line) and generated lazily, so data sets of
+1M profiles can be produced in constant memory and fed to bulk_load_crm.py.
+
+Usage:
+    python scripts/data_load/generate_profiles.py banking 10000 -o profiles-banking.ndjson [--seed 42]
+"""
+import argparse
+import json
+import random
+
+FIRST_NAMES = [
+    "Pete", "John", "Maria", "Anna", "Luca", "Sofia", "James", "Emma", "Noah", "Olivia", "Liam", "Ava", "Lucas",
+    "Mia", "Hiroshi", "Yuki", "Wei", "Mei", "Arjun", "Priya", "Omar", "Layla", "Mateo", "Camila", "Lars", "Ingrid",
+    "Pierre", "Claire", "Hans", "Greta", "Ahmed", "Fatima", "Kwame", "Amara", "Diego", "Valentina", "Ivan", "Olga",
+]
+LAST_NAMES = [
+    "Mitchell", "Doe", "Rossi", "Smith", "Müller", "Schmidt", "Johnson", "Williams", "Brown", "Jones", "Garcia",
+    "Martinez", "Tanaka", "Suzuki", "Wang", "Li", "Sharma", "Patel", "Haddad", "Khan", "Silva", "Santos", "Larsen",
+    "Nielsen", "Dubois", "Moreau", "Fischer", "Weber", "Mensah", "Okafor", "Fernandez", "Lopez", "Ivanov", "Petrova",
+]
+ADDRESSES = [
+    ("New York", "NY", "USA", "American"), ("San Francisco", "CA", "USA", "American"), ("Zurich", "ZH", "Switzerland", "Swiss"),
+    ("Geneva", "GE", "Switzerland", "Swiss"), ("London", "LND", "UK", "British"), ("Milan", "MI", "Italy", "Italian"),
+    ("Singapore", "SG", "Singapore", "Singaporean"), ("Kuala Lumpur", "KL", "Malaysia", "Malaysia"),
+    ("Tokyo", "13", "Japan", "Japanese"), ("Frankfurt", "HE", "Germany", "German"), ("Paris", "IDF", "France", "French"),
+]
+STREETS = ["Main St", "Bahnhofstrasse", "High Street", "Via Roma", "Orchard Road", "Park Ave", "Rue de Rivoli", "Market St"]
+
+RISK_PROFILES = {
+    "Conservative": ("Income", "Short-term", "Income"),
+    "Moderate": ("Balanced", "Medium-term", "Balanced"),
+    "Aggressive": ("Growth", "Long-term", "Growth"),
+}
+STRATEGIES = {
+    "Income": "The portfolio focus on assets generating a steady income, such as bonds and dividend paying stocks, preserving capital while providing regular cash flows.",
+    "Balanced": "The portfolio balances growth and income by combining equities and fixed income, aiming at moderate returns with a controlled level of risk.",
+    "Growth": "The portfolio focus on assets with higher growth potential, such as stocks in emerging industries or innovative companies. By emphasizing growth, investors accept greater risk but also seek higher returns.",
+}
+SOURCES_OF_WEALTH = ["Investments", "Employment", "Inheritance", "Business Ownership", "Real Estate"]
+POSITIONS = [
+    ("MSFT", "Microsoft Corp", "Technology", "Software", "USD", "Equity", "Common Stock"),
+    ("NVDA", "NVIDIA Corp", "Technology", "Semiconductors", "USD", "Equity", "Common Stock"),
+    ("AAPL", "Apple Inc", "Technology", "Consumer Electronics", "USD", "Equity", "Common Stock"),
+    ("AMZN", "Amazon.com Inc", "Consumer Discretionary", "Internet & Direct Marketing Retail", "USD", "Equity", "Common Stock"),
+    ("GOOGL", "Alphabet Inc", "Communication Services", "Interactive Media & Services", "USD", "Equity", "Common Stock"),
+    ("META", "Facebook Inc / Meta", "Communication Services", "Interactive Media & Services", "USD", "Equity", "Common Stock"),
+    ("JNJ", "Johnson & Johnson", "Health Care", "Pharmaceuticals", "USD", "Equity", "Common Stock"),
+    ("V", "Visa Inc", "Financials", "IT Services", "USD", "Equity", "Common Stock"),
+    ("NESN", "Nestle SA", "Consumer Staples", "Food Products", "CHF", "Equity", "Common Stock"),
+    ("NOVN", "Novartis AG", "Health Care", "Pharmaceuticals", "CHF", "Equity", "Common Stock"),
+    ("ASML", "ASML Holding NV", "Technology", "Semiconductors", "EUR", "Equity", "Common Stock"),
+    ("SAP", "SAP SE", "Technology", "Software", "EUR", "Equity", "Common Stock"),
+    ("SPY", "SPDR S&P 500 ETF Trust", "Diversified", "Index Fund", "USD", "Equity", "ETF"),
+    ("CSSMI", "iShares SMI ETF", "Diversified", "Index Fund", "CHF", "Equity", "ETF"),
+    ("AGG", "iShares Core US Aggregate Bond ETF", "Fixed Income", "Bond Fund", "USD", "Fixed Income", "ETF"),
+    ("TLT", "iShares 20+ Year Treasury Bond ETF", "Fixed Income", "Government Bonds", "USD", "Fixed Income", "ETF"),
+    ("GLD", "SPDR Gold Shares", "Commodities", "Precious Metals", "USD", "Commodity", "ETF"),
+]
+POLICY_PRODUCTS = [
+    ("P230ZII", "Ztravel International"), ("P230ZII", "Ztravel International Plus"), ("P045PSI", "Personal Accident"),
+    ("P110CAR", "Comprehensive Car Insurance"), ("P120TRV", "Comprehensive Travel Protection"),
+]
+POLICY_BENEFITS = {
+    "Overseas Medical Expenses": [100000, 250000, 500000],
+    "Follow up Treatment in Malaysia": [5000.0, 50000.0, 500000.0],
+    "Alternative Medicine": [500.0, 5000.0],
+    "Overseas Hospital Income": [15000.0, 150000.0],
+    "Child Care Benefit": [10000.0, 100000.0],
+    "Compassionate Visit": [10000.0, 100000.0],
+}
+UNLIMITED_BENEFITS = ["Emergency Medical Evacuation", "Medical Repatriation", "Repatriation of Mortal Remains"]
+
+
+def _person(rng, client_id):
+    first_name = rng.choice(FIRST_NAMES)
+    last_name = rng.choice(LAST_NAMES)
+    city, state, country, nationality = rng.choice(ADDRESSES)
+    return {
+        "id": client_id,
+        "clientID": client_id,
+        "firstName": first_name,
+        "lastName": last_name,
+        "fullName": f"{first_name} {last_name}",
+        "dateOfBirth": f"{rng.randint(1940, 2004)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "nationality": nationality,
+        "contactDetails": {
+            "email": f"{first_name.lower()}.{last_name.lower()}{client_id[-4:]}@example.com",
+            "phone": f"{rng.randint(100, 999)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}"
+        },
+        "address": {
+            "street": f"{rng.randint(1, 999)} {rng.choice(STREETS)}",
+            "city": city,
+            "state": state,
+            "postalCode": f"{rng.randint(10000, 99999)}",
+            "country": country
+        },
+    }
+
+
+def banking_profile(rng, client_id):
+    """Generate a banking client profile shaped like customer-banking.json."""
+    profile = _person(rng, client_id)
+    risk_profile = rng.choice(list(RISK_PROFILES))
+    objectives, horizon, portfolio_risk = RISK_PROFILES[risk_profile]
+    annual_income = rng.randrange(50000, 2000000, 5000)
+    positions = rng.sample(POSITIONS, rng.randint(3, 12))
+    profile["financialInformation"] = {
+        "sourceOfWealth": rng.choice(SOURCES_OF_WEALTH),
+        "netIncome": str(int(annual_income * rng.uniform(0.55, 0.8))),
+        "annualIncome": str(annual_income),
+        "assets": {
+            "realEstate": str(rng.randrange(0, 5000000, 10000)),
+            "investments": str(rng.randrange(10000, 10000000, 10000)),
+            "cash": str(rng.randrange(1000, 1000000, 1000))
+        }
+    }
+    profile["investmentProfile"] = {
+        "riskProfile": risk_profile,
+        "investmentObjectives": objectives,
+        "investmentHorizon": horizon
+    }
+    profile["portfolio"] = {
+        "strategy": STRATEGIES[portfolio_risk],
+        "riskProfile": portfolio_risk,
+        "performanceYTD": f"{rng.uniform(-15, 25):.1f}%",
+        "performanceSinceInception": f"{rng.uniform(-20, 120):.1f}%",
+        "inceptionDate": f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2000, 2023)}",
+        "positions": [
+            {
+                "ticker": ticker,
+                "companyName": company_name,
+                "sector": sector,
+                "industry": industry,
+                "currency": currency,
+                "assetClass": asset_class,
+                "type": position_type,
+                "average_cost": str(rng.randint(10, 900)),
+                "units": str(rng.randrange(10, 1000, 10))
+            }
+            for ticker, company_name, sector, industry, currency, asset_class, position_type in positions
+        ]
+    }
+    return profile
+
+
+def insurance_profile(rng, client_id):
+    """Generate an insurance client profile shaped like customer-insurance.json."""
+    profile = _person(rng, client_id)
+    policies = []
+    for policy_no in range(rng.randint(1, 5)):
+        plan_product, product_type = rng.choice(POLICY_PRODUCTS)
+        year = rng.randint(2015, 2025)
+        month = rng.randint(1, 12)
+        policy = {
+            "PolicyNo": str(policy_no),
+            "BasicPlanProduct": plan_product,
+            "ProductType": product_type,
+            "PolicyStatus": rng.choice(["A", "A", "A", "L", "E"]),
+            "EffectiveDate": f"{year}-{month:02d}-{rng.randint(1, 28):02d} 00:00:00.000",
+            "ExpiryDate": f"{year + 1}-{month:02d}-{rng.randint(1, 28):02d} 00:00:00.000",
+        }
+        policy.update({benefit: str(rng.choice(amounts)) for benefit, amounts in POLICY_BENEFITS.items()})
+        policy.update({benefit: "Unlimited" for benefit in UNLIMITED_BENEFITS})
+        policies.append(policy)
+    profile["policies"] = policies
+    return profile
+
+
+GENERATORS = {
+    "banking": banking_profile,
+    "insurance": insurance_profile,
+}
+
+
+def generate_profiles(use_case, count, seed=42, start_id=1000000):
+    """
+    Lazily generate count profiles for the given use case ('banking' or 'insurance').
+
+    Client ids are sequential from start_id, so that the sample profiles shipped in src/data are never overwritten.
+    The same seed always produces the same data set.
+    """
+    rng = random.Random(seed)
+    generator = GENERATORS[use_case]
+    for i in range(count):
+        yield generator(rng, str(start_id + i))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic CRM client profiles as NDJSON")
+    parser.add_argument("use_case", choices=sorted(GENERATORS), help="The profile shape to generate")
+    parser.add_argument("count", type=int, help="Number of profiles to generate (e.g. 10000 to 1000000)")
+    parser.add_argument("-o", "--output", default=None, help="Output NDJSON file, defaults to profiles-<use_case>-<count>.ndjson")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed, for reproducible data sets")
+    parser.add_argument("--start-id", type=int, default=1000000, help="First client id")
+    args = parser.parse_args()
+
+    output = args.output or f"profiles-{args.use_case}-{args.count}.ndjson"
+    with open(output, "w", encoding="utf-8") as file:
+        for profile in generate_profiles(args.use_case, args.count, seed=args.seed, start_id=args.start_id):
+            file.write(json.dumps(profile, ensure_ascii=False))
+            file.write("\n")
+    print(f"Generated {args.count} {args.use_case} profiles in {output}")
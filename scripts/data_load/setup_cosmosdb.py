@@ -7,6 +7,7 @@ from rich.logging import RichHandler
 from dotenv import load_dotenv
 from azure.identity import DefaultAzureCredential
 from crm_store import CRMStore
+from bulk_load_crm import bulk_load, iter_profiles
 
 def load_azd_env():
     """Get path to current azd env file and load file using python-dotenv"""
@@ -38,27 +39,8 @@ if __name__ == "__main__":
             container_name=os.getenv("COSMOSDB_CONTAINER_CLIENT_NAME")
         )
 
-    # Loading Insurance Customer
-    logger.info("Loading Insurance Customer")
-    ins_customer = ''
-    try:  
-        # Open and read the JSON file
-        with open('src/data/customer-profiles/customer-insurance.json', 'r') as file:
-            ins_customer =  json.load(file)
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}") 
-
-    db.create_customer_profile(ins_customer)
-
-
-    # Loading Banking
-    logger.info("Loading Banking Customer")
-    banking_customer = ''
-    try:  
-        # Open and read the JSON file
-        with open('src/data/customer-profiles/customer-banking.json', 'r') as file:
-            banking_customer =  json.load(file)
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}") 
-
-    db.create_customer_profile(banking_customer)
\ No newline at end of file
+    # Loading the Insurance and Banking customers. Upserts make the load idempotent across re-deployments.
+    logger.info("Loading Insurance and Banking Customers")
+    summary = bulk_load(db, iter_profiles('src/data/customer-profiles'), concurrency=4)
+    if summary["failed"]:
+        logger.error(f"{summary['failed']} customer profiles failed to load")
@@ -5,11 +5,11 @@ import json
 import datetime
 from fastapi import FastAPI, HTTPException, Body  
 from fastapi.responses import JSONResponse  
-from azure.identity import DefaultAzureCredential  
 from opentelemetry.trace import get_tracer
 
 from conversation_store import ConversationStore  
 from gbb.handler import VanillaAgenticHandler  
+from gbb.genai_vanilla_agents.shared_clients import get_azure_transport, get_credential
 from sk.handler import SemanticKernelHandler  
   
 import util
@@ -68,8 +68,8 @@ async def health_check():
     session_id = f"{user_id}-{current_time}"
    
     with tracer.start_as_current_span(session_id):
-        # Authenticate using DefaultAzureCredential  
-        key = DefaultAzureCredential()
+        # Authenticate using the process-wide DefaultAzureCredential and its token cache
+        key = get_credential()
     
         # Select use case container based on usecase_type  
         if usecase_type == 'fsi_insurance':  
@@ -85,7 +85,8 @@ async def health_check():
             url=os.getenv("COSMOSDB_ENDPOINT"),  
             key=key,  
             database_name=os.getenv("COSMOSDB_DATABASE_NAME"),  
-            container_name=container_name  
+            container_name=container_name,
+            transport=get_azure_transport()
         )  
     
         # Check if user exists, if not create a new user  
@@ -141,6 +142,6 @@ async def health_check():
         new_messages = result.get("reply", [])  
     
         return JSONResponse(  
-            content={"chat_id": chat_id, "reply": new_messages},  
+            content={"chat_id": chat_id, "reply": new_messages, "usage": result.get("usage")},  
             status_code=200  
     )  
\ No newline at end of file
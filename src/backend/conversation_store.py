@@ -3,8 +3,9 @@ import datetime
 import random
 
 class ConversationStore:
-    def __init__(self, url, key, database_name, container_name):
-        self.client = CosmosClient(url, credential=key)
+    def __init__(self, url, key, database_name, container_name, transport=None):
+        # An optional shared transport, e.g. shared_clients.get_azure_transport(), reuses the pooled connections
+        self.client = CosmosClient(url, credential=key, **({"transport": transport} if transport is not None else {}))
         self.database_name = database_name
         self.container_name = container_name
         self.db = None
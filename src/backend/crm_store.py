@@ -5,8 +5,9 @@ import datetime
 import random
 
 class CRMStore:
-    def __init__(self, url, key, database_name, container_name):
-        self.client = CosmosClient(url, credential=key)
+    def __init__(self, url, key, database_name, container_name, transport=None):
+        # An optional shared transport, e.g. shared_clients.get_azure_transport(), reuses the pooled connections
+        self.client = CosmosClient(url, credential=key, **({"transport": transport} if transport is not None else {}))
         self.database_name = database_name
         self.container_name = container_name
         self.db = None
@@ -47,6 +48,18 @@ class CRMStore:
             print(f"An error occurred: {e}")
             return None
 
+    def upsert_customer_profile(self, customer_profile, **kwargs):
+        """
+        Creates or replaces the customer profile in Cosmos DB.
+        
+        Unlike create_customer_profile, errors are not swallowed so that callers (e.g. the bulk loader) can retry throttled requests.
+        
+        Args:
+        - customer_profile (dict): The customer profile to save.
+        - kwargs: Additional request options forwarded to the container (e.g. response_hook).
+        """
+        return self.container.upsert_item(body=customer_profile, **kwargs)
+
 
     def get_customer_profile_by_full_name(self, full_name):
         """
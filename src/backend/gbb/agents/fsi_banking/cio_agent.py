@@ -3,10 +3,12 @@ import json
 import os
 import logging
 from gbb.genai_vanilla_agents.agent import Agent
+from gbb.genai_vanilla_agents.tool_output import ToolOutputPolicy
+from gbb.genai_vanilla_agents.tool_cache import ToolCachePolicy, watch_indexer
 from gbb.agents.fsi_banking.config import create_llm   
 from typing import List, Annotated, Optional
 import requests
-from azure.identity import DefaultAzureCredential
+from gbb.genai_vanilla_agents.shared_clients import get_azure_transport, get_credential
 from azure.search.documents import SearchClient
 
 
@@ -32,11 +34,17 @@ cio_agent = Agent(
 
 
 
+# AI Search chunks overlap (2000 characters pages with 500 overlap): keep the title and the text, strip the overlaps and compress to the query
+search_output_policy = ToolOutputPolicy(max_tokens=3000, mode="extract", fields=["title", "chunk"], text_field="chunk", dedupe=True)
+# The index only changes when its indexer runs: the searches are cached across requests, and dropped when a new indexer run completes
+search_cache_policy = ToolCachePolicy(ttl=3600, tags=[os.getenv('AI_SEARCH_CIO_INDEX_NAME')])
+watch_indexer(os.getenv('AI_SEARCH_ENDPOINT'), os.getenv('AI_SEARCH_CIO_INDEX_NAME'), get_credential())
+
 def search(query: str):
     service_endpoint = os.getenv('AI_SEARCH_ENDPOINT')
     index_name = os.getenv('AI_SEARCH_CIO_INDEX_NAME')
 
-    search_client = SearchClient(service_endpoint, index_name, DefaultAzureCredential())
+    search_client = SearchClient(service_endpoint, index_name, get_credential(), transport=get_azure_transport())
     payload = json.dumps(
         {
             "search": query,
@@ -69,7 +77,7 @@ def search(query: str):
     return output
     
     
-@cio_agent.register_tool(description="Search investement overview, in-house investment view and reccomendations from Moneta Bank and CIO.")
+@cio_agent.register_tool(description="Search investement overview, in-house investment view and reccomendations from Moneta Bank and CIO.", output_policy=search_output_policy, memoize=True, cache=search_cache_policy)
 def search_cio(query:Annotated[str,"The query to search for"]) -> str:
     """
     Search and retrieve investement research and in-house views from Moneta Bank by permorming a POST request to an Azure AI Search using the specified search body.
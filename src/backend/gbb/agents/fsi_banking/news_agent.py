@@ -3,7 +3,9 @@ from pydantic import BaseModel, Field
 import json
 import os
 import logging
+from email.utils import parsedate_to_datetime
 from gbb.genai_vanilla_agents.agent import Agent
+from gbb.genai_vanilla_agents.tool_output import ToolOutputPolicy
 from gbb.agents.fsi_banking.config import create_llm
 from typing import List, Annotated, Optional
 import requests
@@ -91,7 +93,19 @@ def get_feed(response):
     return ms_df
 
 
-@news_agent.register_tool(description="Search for investement's news from the web for the client's portfolio positions")
+def published_on(article: dict) -> float:
+    """The timestamp of the RSS pubDate (RFC 822) of an article, the articles without a valid date sort last."""
+    try:
+        return parsedate_to_datetime(article.get("Published On")).timestamp()
+    except (TypeError, ValueError):
+        return float("-inf")
+
+
+# The whole RSS feed is fetched: keep the fields useful to the answer and the most recent articles
+news_output_policy = ToolOutputPolicy(max_tokens=2500, fields=["Title", "Description", "Published On"],
+                                      sort_key=published_on, descending=True, max_items=20)
+
+@news_agent.register_tool(description="Search for investement's news from the web for the client's portfolio positions", output_policy=news_output_policy, memoize=True)
 def fetch_news(positions:Annotated[List[str],"The positions of the client's portfolio"]) -> str:
     """
     Search the web for investement's news for the specific for each of the positions passed as input into a pandas DataFrame.
@@ -107,6 +121,6 @@ def fetch_news(positions:Annotated[List[str],"The positions of the client's port
         response = get_source(url)
         news = get_feed(response)
         #logging.info(f"News: {news}")
-        return json.dumps(news.values.tolist())        
+        return json.dumps(news.to_dict(orient="records"))        
     except Exception as e:
         logging.error(f"An unexpected error occurred in the 'fetch_news' function of the 'news_agent': {e}") 
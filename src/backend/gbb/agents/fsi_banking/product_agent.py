@@ -4,10 +4,12 @@ import json
 import os
 import logging
 from gbb.genai_vanilla_agents.agent import Agent
+from gbb.genai_vanilla_agents.tool_output import ToolOutputPolicy
+from gbb.genai_vanilla_agents.tool_cache import ToolCachePolicy, watch_indexer
 from gbb.agents.fsi_banking.config import create_llm
 from typing import List, Annotated, Optional
 import requests
-from azure.identity import DefaultAzureCredential
+from gbb.genai_vanilla_agents.shared_clients import get_azure_transport, get_credential
 from azure.search.documents import SearchClient
 
 
@@ -33,11 +35,17 @@ product_agent = Agent(
 
 
 
+# AI Search chunks overlap (2000 characters pages with 500 overlap): keep the title and the text, strip the overlaps and compress to the query
+search_output_policy = ToolOutputPolicy(max_tokens=3000, mode="extract", fields=["title", "chunk"], text_field="chunk", dedupe=True)
+# The index only changes when its indexer runs: the searches are cached across requests, and dropped when a new indexer run completes
+search_cache_policy = ToolCachePolicy(ttl=3600, tags=[os.getenv('AI_SEARCH_FUNDS_INDEX_NAME')])
+watch_indexer(os.getenv('AI_SEARCH_ENDPOINT'), os.getenv('AI_SEARCH_FUNDS_INDEX_NAME'), get_credential())
+
 def search(query: str):
     service_endpoint = os.getenv('AI_SEARCH_ENDPOINT')
     index_name = os.getenv('AI_SEARCH_FUNDS_INDEX_NAME')
 
-    search_client = SearchClient(service_endpoint, index_name, DefaultAzureCredential())
+    search_client = SearchClient(service_endpoint, index_name, get_credential(), transport=get_azure_transport())
     payload = json.dumps(
         {
             "search": query,
@@ -68,7 +76,7 @@ def search(query: str):
     return output
     
     
-@product_agent.register_tool(description="Search investments funds and ETFs product details")
+@product_agent.register_tool(description="Search investments funds and ETFs product details", output_policy=search_output_policy, memoize=True, cache=search_cache_policy)
 def search_product(query:Annotated[str,"The query to search for"]) -> str:
     """
     Search investments funds and ETFs product details by permorming a POST request to an Azure AI Search using the specified search body.
@@ -1,9 +1,81 @@
 import os
 from gbb.genai_vanilla_agents.llm import AzureOpenAILLM
+from gbb.genai_vanilla_agents.llm_pool import PooledLLM, create_llm_pool, endpoint_configs_from_env
+from gbb.genai_vanilla_agents.llm_replay import Cassette, RecordingLLM, ReplayLLM
+from gbb.genai_vanilla_agents.llm_cache import CachedLLM, create_azure_openai_embedding_function, create_llm_cache
+from gbb.genai_vanilla_agents.llm_routing import PurposeLLM
+from gbb.agents.team_strategy import HeuristicTeamStrategyClassifier
 
-def create_llm():
+# Set AZURE_OPENAI_ENDPOINTS to spread the calls across several deployments, see endpoint_configs_from_env
+llm_pool = create_llm_pool(endpoint_configs_from_env()) if os.getenv("AZURE_OPENAI_ENDPOINTS") else None
+
+# Set LLM_REPLAY_CASSETTE to serve the LLM calls from a recorded cassette (offline benchmarks), LLM_RECORD_CASSETTE to record one
+replay_llm = ReplayLLM(Cassette(os.getenv("LLM_REPLAY_CASSETTE")),
+                       latency=os.getenv("LLM_REPLAY_LATENCY", "recorded"),
+                       fixed_latency=float(os.getenv("LLM_REPLAY_FIXED_LATENCY", "1.0")),
+                       percentile=float(os.getenv("LLM_REPLAY_PERCENTILE")) if os.getenv("LLM_REPLAY_PERCENTILE") else None) if os.getenv("LLM_REPLAY_CASSETTE") else None
+
+def create_llm(purpose: str = "answerer"):
+    """
+    LLM for the given call purpose (router, planner, summarizer, answerer).
+    Set AZURE_OPENAI_<PURPOSE>_DEPLOYMENT_NAME (e.g. AZURE_OPENAI_ROUTER_DEPLOYMENT_NAME) to serve a purpose with its own deployment,
+    e.g. a smaller and faster model for the routing calls. Defaults to AZURE_OPENAI_DEPLOYMENT_NAME (or the pool).
+    """
+    return PurposeLLM(_create_llm(purpose), purpose)
+
+def _create_llm(purpose: str):
+    if replay_llm is not None:
+        return replay_llm
+    llm = _create_azure_llm(purpose)
+    if os.getenv("LLM_RECORD_CASSETTE"):
+        return RecordingLLM(llm, Cassette(os.getenv("LLM_RECORD_CASSETTE")))
+    return llm
+
+def _create_azure_llm(purpose: str):
+    deployment = os.getenv(f"AZURE_OPENAI_{purpose.upper()}_DEPLOYMENT_NAME")
+    if llm_pool is not None and not deployment:
+        return PooledLLM(llm_pool)
     return AzureOpenAILLM({
-        "azure_deployment": os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+        "azure_deployment": deployment or os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+        "azure_endpoint": os.getenv("AZURE_OPENAI_ENDPOINT"),
+        "api_version": os.getenv("AZURE_OPENAI_API_VERSION"),
+        "api_key": os.getenv("AZURE_OPENAI_KEY"),
+        "tokens_per_minute": int(os.getenv("AZURE_OPENAI_TPM", "0")) or None,
+        "requests_per_minute": int(os.getenv("AZURE_OPENAI_RPM", "0")) or None,
+        "max_retries": int(os.getenv("AZURE_OPENAI_MAX_RETRIES", "5")),
+    })
+
+# Shared by all the requests of the process, so that repeated inquiries (e.g. the predefined questions) are served from the cache.
+# Set LLM_CACHE_PATH to persist the cache in a SQLite file.
+llm_cache = create_llm_cache(os.getenv("LLM_CACHE_PATH"),
+                             max_size=int(os.getenv("LLM_CACHE_MAX_SIZE", "10000")),
+                             ttl=float(os.getenv("LLM_CACHE_TTL", str(24 * 3600))))
+
+# Set LLM_CACHE_SIMILARITY_THRESHOLD (e.g. 0.95) to also reuse the responses of similar inquiries, using the embedding deployment
+llm_cache_embedding_function = create_azure_openai_embedding_function({
+        "azure_deployment": os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"),
         "azure_endpoint": os.getenv("AZURE_OPENAI_ENDPOINT"),
         "api_version": os.getenv("AZURE_OPENAI_API_VERSION"),
-    })
\ No newline at end of file
+        "dimensions": int(os.getenv("AZURE_OPENAI_EMBEDDING_DIMENSIONS", "0")) or None,
+    }) if os.getenv("LLM_CACHE_SIMILARITY_THRESHOLD") else None
+
+def create_cached_llm(purpose: str = "router"):
+    """
+    LLM for the deterministic calls (temperature 0): the team strategy classifier, the next speaker selection and the plan creation.
+    The sampled calls (e.g. the summaries) bypass the cache, use create_llm for them.
+    """
+    return PurposeLLM(CachedLLM(_create_llm(purpose), llm_cache,
+                                embedding_function=llm_cache_embedding_function,
+                                similarity_threshold=float(os.getenv("LLM_CACHE_SIMILARITY_THRESHOLD", "0.95"))), purpose)
+
+def create_strategy_rules() -> HeuristicTeamStrategyClassifier:
+    """
+    The keywords of the agents, so that the clear-cut inquiries are classified without calling the model.
+    """
+    return HeuristicTeamStrategyClassifier(
+        domains={
+            "CRM": [r"my client", r"client'?s? (?:profile|policies|policy|data|details|premium)", r"premiums? (?:of|for) "],
+            "Product": [r"terms", r"conditions", r"coverages?", r"exclusions?", r"deductibles?", r"products?\b", r"offering"],
+        },
+        client_domain="CRM",
+    )
@@ -4,10 +4,11 @@ import json
 import os
 import logging
 from gbb.genai_vanilla_agents.agent import Agent
+from gbb.genai_vanilla_agents.tool_output import ToolOutputPolicy
 from gbb.agents.fsi_insurance.config import create_llm
 from typing import List, Annotated, Optional
 from crm_store import CRMStore
-from azure.identity import DefaultAzureCredential
+from gbb.genai_vanilla_agents.shared_clients import get_azure_transport, get_credential
 
 
 crm_agent = Agent(  
@@ -27,15 +28,19 @@ crm_agent = Agent(
         - You need to fetch generic policies answers""",  
 )  
 
-key = DefaultAzureCredential()
+key = get_credential()
 db = CRMStore(
         url=os.getenv("COSMOSDB_ENDPOINT"),
         key=key,
         database_name=os.getenv("COSMOSDB_DATABASE_NAME"),
-        container_name=os.getenv("COSMOSDB_CONTAINER_CLIENT_NAME")
+        container_name=os.getenv("COSMOSDB_CONTAINER_CLIENT_NAME"),
+        transport=get_azure_transport()
     )
 
-@crm_agent.register_tool(description="Load insured client data from the CRM from the given full name")
+# Only the profile fields, not the Cosmos DB metadata (_rid, _etag, _ts...) nor the redundant first and last names
+crm_output_policy = ToolOutputPolicy(max_tokens=2000, fields=["clientID", "fullName", "dateOfBirth", "nationality", "contactDetails", "address", "policies"])
+
+@crm_agent.register_tool(description="Load insured client data from the CRM from the given full name", output_policy=crm_output_policy, memoize=True)
 def load_from_crm_by_client_fullname(full_name:Annotated[str,"The customer full name to search for"]) -> str:
     """
     Load an insured client data and policies into a pandas DataFrame.
@@ -52,7 +57,7 @@ def load_from_crm_by_client_fullname(full_name:Annotated[str,"The customer full
     except Exception as e:
         print(f"An unexpected error occurred loading client data from the DB: {e}") 
 
-@crm_agent.register_tool(description="Load insured client data from the CRM by client_id")
+@crm_agent.register_tool(description="Load insured client data from the CRM by client_id", output_policy=crm_output_policy, memoize=True)
 def load_from_crm_by_client_id(client_id:Annotated[str,"The customer client_id to search for"]) -> str:
     """
     Load insured client data from the CRM by client_id into a pandas DataFrame.
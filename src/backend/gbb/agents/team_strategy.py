@@ -0,0 +1,220 @@
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from gbb.genai_vanilla_agents.askable import Askable
+from gbb.genai_vanilla_agents.conversation import ConversationMetrics
+from gbb.genai_vanilla_agents.llm import LLM
+
+import logging
+logger = logging.getLogger(__name__)
+
+# The team strategies: a routed Team when one agent can answer, a PlannedTeam when the inquiry needs several agents
+SINGLE = "single"
+MULTIPLE = "multiple"
+
+# A client id (e.g. 123456), a full name introduced as a client (e.g. "the client Pete Mitchell"), or a person referred to by a pronoun.
+# Bare capitalized words are not names: "Chief Investment" or "Index Switzerland" are not clients.
+CLIENT_ID_PATTERN = r"\b(?:client|customer)(?:[ _]?id)?\s*[:#]?\s*\d{3,}\b|\b\d{5,}\b"
+CLIENT_NAME_PATTERN = r"\b(?:[Cc]lient|[Cc]ustomer)s?\s+(?:named\s+|called\s+)?[A-Z][a-z]+ [A-Z][a-z]+\b"
+CLIENT_PRONOUN_PATTERN = r"\b(?:he|she|him|his|her|hers)\b"
+# Separators of the distinct requests of an inquiry
+INTENT_SEPARATORS = r"\?|;|\n|\b(?:and also|as well as|then|additionally|moreover)\b|(?:^|\s)\d\.\s"
+
+STRATEGY_SYSTEM_PROMPT = """
+    You need to understand if the user inquiry can be responded by 1 agent in particular or if it requires a plan involving multiple agents to fullfill the request in one shot.
+    Only respond with 1 word based on your decision and nothing else, also don't include the single quote or any other characters, only 1 word as output.
+    'single' or 'multiple'
+    """
+
+def normalize_strategy(answer: Optional[str]) -> Optional[str]:
+    """
+    The strategy in a model answer, tolerant to case, whitespace, quotes and punctuation (e.g. " 'Single'. "), None when there is none.
+    """
+    words = re.findall(r"[a-z]+", (answer or "").lower())
+    if SINGLE in words and MULTIPLE not in words:
+        return SINGLE
+    if MULTIPLE in words and SINGLE not in words:
+        return MULTIPLE
+    return None
+
+def normalize_inquiry(inquiry: str) -> str:
+    """
+    The cache key of an inquiry: case, whitespace and trailing punctuation do not change the decision.
+    """
+    return " ".join(inquiry.lower().split()).rstrip(" ?!.")
+
+class TeamStrategyClassifier(ABC):
+    """
+    Decides the team strategy of an inquiry: SINGLE or MULTIPLE.
+    """
+    @abstractmethod
+    def classify(self, inquiry: str, metrics: ConversationMetrics = None, previous: Optional[str] = None) -> str:
+        """
+        Args:
+            inquiry (str): The user inquiry.
+            metrics (ConversationMetrics): The conversation metrics, to account the usage of the model calls.
+            previous (str): The decision of the previous turn of the chat, if any.
+        """
+        pass
+
+class HeuristicTeamStrategyClassifier:
+    """
+    Local rules deciding the strategy of the clear-cut inquiries, without any model call:
+    - a single request matching the keywords of a single domain (e.g. the profile of a client, a fund) is SINGLE;
+    - several requests spanning several domains (e.g. the portfolio of a client and the news about its positions) are MULTIPLE;
+    - a short inquiry without any domain nor client reference (e.g. a greeting) is SINGLE;
+    anything else is uncertain and left to the model. In particular, an inquiry referring to a client (id, name or pronoun) without
+    matching the keywords of the client domain is never SINGLE: the client data may be needed on top of the matched domain.
+
+    Args:
+        domains (dict[str, Iterable[str]]): The keywords (regular expressions, case insensitive) of each domain, usually one per agent.
+        client_domain (str): The domain of the inquiries mentioning a client name or id, usually the CRM agent.
+        max_small_talk_words (int): The maximum number of words of an inquiry without any domain to be considered as small talk.
+    """
+    def __init__(self, domains: dict[str, Iterable[str]], client_domain: Optional[str] = None, max_small_talk_words: int = 6):
+        self.domains = {domain: re.compile("|".join(rf"\b(?:{keyword})" for keyword in keywords), re.IGNORECASE)
+                        for domain, keywords in domains.items()}
+        self.client_domain = client_domain
+        self.max_small_talk_words = max_small_talk_words
+        self.client_id = re.compile(CLIENT_ID_PATTERN, re.IGNORECASE)
+        self.client_name = re.compile(CLIENT_NAME_PATTERN)
+        self.client_pronoun = re.compile(CLIENT_PRONOUN_PATTERN, re.IGNORECASE)
+        self.intent_separators = re.compile(INTENT_SEPARATORS, re.IGNORECASE)
+
+    def matched_domains(self, inquiry: str) -> set[str]:
+        """
+        The domains whose keywords appear in the inquiry.
+        """
+        return {domain for domain, pattern in self.domains.items() if pattern.search(inquiry)}
+
+    def mentions_client(self, inquiry: str) -> bool:
+        return bool(self.client_id.search(inquiry) or self.client_name.search(inquiry) or self.client_pronoun.search(inquiry))
+
+    def count_intents(self, inquiry: str) -> int:
+        return max(1, sum(1 for part in self.intent_separators.split(inquiry) if part and len(part.split()) >= 2))
+
+    def decide(self, inquiry: str) -> Optional[str]:
+        """
+        SINGLE or MULTIPLE when the rules are confident, None otherwise.
+        """
+        domains = self.matched_domains(inquiry)
+        intents = self.count_intents(inquiry)
+        if len(domains) >= 2 and (intents >= 2 or len(domains) >= 3):
+            return MULTIPLE
+        if self.client_domain is not None and self.client_domain not in domains and self.mentions_client(inquiry):
+            # The client reference alone is not enough to tell whether the client domain is needed too
+            return None
+        if len(domains) == 1 and intents == 1:
+            return SINGLE
+        if not domains and intents == 1 and len(inquiry.split()) <= self.max_small_talk_words:
+            return SINGLE
+        return None
+
+class LLMTeamStrategyClassifier(TeamStrategyClassifier):
+    """
+    Asks the language model for the strategy.
+
+    Args:
+        llm (LLM): The language model, usually a cached router deployment.
+        system_prompt (str): The instructions of the classification.
+    """
+    def __init__(self, llm: LLM, system_prompt: str = STRATEGY_SYSTEM_PROMPT):
+        self.llm = llm
+        self.system_prompt = system_prompt
+
+    def classify(self, inquiry: str, metrics: ConversationMetrics = None, previous: Optional[str] = None) -> str:
+        local_messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": inquiry},
+        ]
+        # Deterministic, so that the answer can be cached
+        response, usage = self.llm.ask(messages=local_messages, temperature=0)
+        if metrics is not None:
+            metrics.add_usage(usage, "group_chat/strategy", getattr(self.llm, "purpose", "router"))
+        logger.debug(f"model team strategy answer = {response.content!r}")
+        strategy = normalize_strategy(response.content)
+        if strategy is None:
+            # The planned team can handle any inquiry
+            logger.warning(f"Unexpected team strategy answer {response.content!r}, falling back to {MULTIPLE}")
+            return MULTIPLE
+        return strategy
+
+class TieredTeamStrategyClassifier(TeamStrategyClassifier):
+    """
+    Decides the strategy with the cheapest source available, in order:
+    1. the local rules, when they are confident;
+    2. the previous decision for the same inquiry (process-wide LRU cache);
+    3. the decision of the previous turn of the chat, the follow-up inquiries usually keep the same strategy;
+    4. the model, whose decisions are cached.
+
+    Args:
+        heuristic (HeuristicTeamStrategyClassifier): The local rules, None to skip them.
+        fallback (TeamStrategyClassifier): The classifier of the uncertain inquiries, usually LLMTeamStrategyClassifier.
+        max_size (int): The maximum number of cached decisions, the least recently used are evicted first.
+        reuse_previous (bool): Whether the uncertain follow-up inquiries keep the decision of the previous turn.
+    """
+    def __init__(self, heuristic: Optional[HeuristicTeamStrategyClassifier], fallback: TeamStrategyClassifier,
+                 max_size: int = 1000, reuse_previous: bool = True):
+        self.heuristic = heuristic
+        self.fallback = fallback
+        self.max_size = max_size
+        self.reuse_previous = reuse_previous
+        self.lock = threading.Lock()
+        self.decisions = OrderedDict()
+        self.sources = {"heuristic": 0, "cache": 0, "previous": 0, "fallback": 0}
+
+    def classify(self, inquiry: str, metrics: ConversationMetrics = None, previous: Optional[str] = None) -> str:
+        strategy, source = self._decide(inquiry, metrics, previous)
+        with self.lock:
+            self.sources[source] += 1
+        logger.info(f"agent team strategy decision = {strategy} (source: {source})")
+        return strategy
+
+    def _decide(self, inquiry: str, metrics: ConversationMetrics, previous: Optional[str]) -> tuple[str, str]:
+        if self.heuristic is not None:
+            strategy = self.heuristic.decide(inquiry)
+            if strategy is not None:
+                return strategy, "heuristic"
+        key = normalize_inquiry(inquiry)
+        with self.lock:
+            strategy = self.decisions.get(key)
+            if strategy is not None:
+                self.decisions.move_to_end(key)
+                return strategy, "cache"
+        if self.reuse_previous and previous in (SINGLE, MULTIPLE):
+            return previous, "previous"
+        strategy = self.fallback.classify(inquiry, metrics, previous)
+        with self.lock:
+            self.decisions[key] = strategy
+            while len(self.decisions) > self.max_size:
+                self.decisions.popitem(last=False)
+        return strategy, "fallback"
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.decisions), **self.sources}
+
+class TeamTemplates:
+    """
+    The prebuilt teams of a use case, one per strategy. They are built once, with their LLM clients and strategies,
+    and shared by all the runs: the teams keep their execution state in the run context, not on the instance.
+
+    Args:
+        classifier (TeamStrategyClassifier): Selects the team of an inquiry.
+        teams (dict[str, Askable]): The team of each strategy.
+    """
+    def __init__(self, classifier: TeamStrategyClassifier, teams: dict[str, Askable]):
+        if set(teams) != {SINGLE, MULTIPLE}:
+            raise ValueError(f"A team is required for each strategy, got: {list(teams)}")
+        self.classifier = classifier
+        self.teams = teams
+
+    def create(self, inquiry: str, metrics: ConversationMetrics = None, previous: Optional[str] = None) -> tuple[Askable, str]:
+        """
+        The team of the inquiry, to be run by a Workflow, and its strategy, to be passed as previous on the next turn of the chat.
+        """
+        strategy = self.classifier.classify(inquiry, metrics, previous)
+        return self.teams[strategy], strategy
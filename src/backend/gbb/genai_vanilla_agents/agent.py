@@ -1,16 +1,29 @@
+import inspect
 import logging
-from typing import Annotated, Callable, Optional
+from typing import Annotated, Callable, Optional, Union
 import json
 
 from .conversation import AllMessagesStrategy, AppendMessagesUpdateStrategy, Conversation, ConversationReadingStrategy, ConversationUpdateStrategy
 
 from .askable import Askable
-from .function_utils import get_function_schema, wrap_function, F
+from .function_utils import get_function_schema, load_basemodels_if_needed, wrap_function, F
 from .llm import LLM
+from .run_context import memoize_tool
+from .tool_cache import ToolCachePolicy, cached_tool
+from .tokens import TokenCounter, default_token_counter, fit_messages
+from .tool_output import ToolOutputPolicy
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+def _update_conversation_variable(
+    variableName: Annotated[str, "The variable name to update"], 
+    variableValue: Annotated[str, "The new value of the variable"]) -> Annotated[str, "Confirmation that the variable was updated"]:
+    ...
+
+# The schema is the same for all the agents and calls, only the function is bound to the conversation of each call
+UPDATE_CONVERSATION_VARIABLE_TOOL = get_function_schema(_update_conversation_variable, name="update_conversation_variable", description="update a conversation or context variable")
+
 class Agent(Askable):
     """
     An agent that can be asked to solve the user inquiry by using a language model.
@@ -22,17 +35,32 @@ class Agent(Askable):
         llm (LLM): The language model to use for the decision-making process.
         reading_strategy (ConversationReadingStrategy): The reading strategy to use to select the messages to pass to the LLM.
         update_strategy (ConversationUpdateStrategy): The update strategy to use to update the conversation with the response.
+        max_input_tokens (int): The token budget of the LLM input (system message, messages and tool schemas). The oldest messages are dropped to fit it, None for no budget.
+        token_counter (TokenCounter): The token counter used for the budget and the estimates, defaults to the shared one.
+        prompt_layout (str): "default" to replace __context__ in the system message with the conversation variables, "cache" to keep the system message
+            byte-identical across calls (prompt cache friendly) and send the variables in a last system message instead.
     """
     def __init__(self, description: str, id: str, system_message: str, llm: LLM,
-                 reading_strategy: ConversationReadingStrategy = AllMessagesStrategy(),
-                 update_strategy: ConversationUpdateStrategy = AppendMessagesUpdateStrategy()):
+                 reading_strategy: ConversationReadingStrategy = None,
+                 update_strategy: ConversationUpdateStrategy = None,
+                 max_input_tokens: Optional[int] = None,
+                 token_counter: Optional[TokenCounter] = None,
+                 prompt_layout: str = "default"):
         super().__init__(id, description)
         self.tools = []
         self.tools_function = {}
+        self.tool_output_policies = {}
         self.llm = llm
         self.system_message = system_message
-        self.reading_strategy = reading_strategy
-        self.update_strategy = update_strategy
+        self.reading_strategy = reading_strategy or AllMessagesStrategy()
+        self.update_strategy = update_strategy or AppendMessagesUpdateStrategy()
+        self.max_input_tokens = max_input_tokens
+        self.token_counter = token_counter or default_token_counter
+        if prompt_layout not in ("default", "cache"):
+            raise ValueError(f"Unknown prompt layout: {prompt_layout}")
+        self.prompt_layout = prompt_layout
+        # Token count of the tool schemas, by number of registered tools
+        self._tools_tokens = (None, 0)
         
         logger.debug(f"Agent initialized with ID: {self.id}, Description: {self.description}")
 
@@ -47,8 +75,9 @@ class Agent(Askable):
             stream (bool): Whether to stream the conversation updates."""
         logger.debug(f"[Agent ID: {self.id}] Received messages: %s", conversation.messages)
         
-        local_messages = self._prepare_llm_input(conversation)
         local_tools, local_tools_function = self._prepare_llm_tools(conversation=conversation)
+        local_messages = self._prepare_llm_input(conversation, local_tools)
+        estimated_tokens = self.token_counter.count_messages(local_messages) + self._count_tools_tokens(local_tools)
 
         try:
             if not stream:
@@ -77,16 +106,75 @@ class Agent(Askable):
                         
                     conversation.update([mark, content])
             
-            if usage is not None:
-                # Update conversation metrics with response usage
-                conversation.metrics.total_tokens += usage["total_tokens"]
-                conversation.metrics.prompt_tokens += usage["prompt_tokens"]
-                conversation.metrics.completion_tokens += usage["completion_tokens"]
+            # Update conversation metrics with response usage
+            conversation.metrics.add_usage(usage, self.id, getattr(self.llm, "purpose", "answerer"))
+            self._report_tokens(conversation, estimated_tokens, usage)
+        except Exception as e:
+            return self._handle_error(conversation, e)
+        
+        return self._handle_response(conversation, response_message)
+
+    async def ask_async(self, conversation: Conversation, stream = False):
+        """
+        Async version of ask: the language model is called with ask_async/ask_stream_async, so that no thread is held while waiting for the completion.
+        
+        Args:
+            conversation (Conversation): The conversation to use for the execution
+            stream (bool): Whether to stream the conversation updates."""
+        logger.debug(f"[Agent ID: {self.id}] Received messages: %s", conversation.messages)
+        
+        local_tools, local_tools_function = self._prepare_llm_tools(conversation=conversation)
+        local_messages = self._prepare_llm_input(conversation, local_tools)
+        estimated_tokens = self.token_counter.count_messages(local_messages) + self._count_tools_tokens(local_tools)
+
+        try:
+            if not stream:
+                response, usage = await self.llm.ask_async(
+                    messages=local_messages,
+                    tools=local_tools,
+                    tools_function=local_tools_function
+                )
+                logger.debug(f"[Agent ID: {self.id}] API response received: %s", response)
+                response_message = response.model_dump()
+            else:
+                response_message = None
+                usage = None
+                async for mark, content in self.llm.ask_stream_async(
+                    messages=local_messages,
+                    tools=local_tools,
+                    tools_function=local_tools_function
+                ):
+                    if mark == "start" or mark == "end":
+                        content = self.id
+                    if mark == "response" and content is not None:
+                        response_message, usage = content
+                        
+                    conversation.update([mark, content])
+            
+            # Update conversation metrics with response usage
+            conversation.metrics.add_usage(usage, self.id, getattr(self.llm, "purpose", "answerer"))
+            self._report_tokens(conversation, estimated_tokens, usage)
         except Exception as e:
-            logger.error(f"[Agent ID: {self.id}] Error during LLM call: %s", e)
-            conversation.log.append(("error", "agent/error", self.id, e))
-            return "error"
+            return self._handle_error(conversation, e)
         
+        return self._handle_response(conversation, response_message)
+
+    def _handle_error(self, conversation: Conversation, e: Exception):
+        logger.error(f"[Agent ID: {self.id}] Error during LLM call: %s", e)
+        conversation.log.append(("error", "agent/error", self.id, e))
+        return "error"
+
+    def _report_tokens(self, conversation: Conversation, estimated_tokens: int, usage: dict):
+        """
+        Report the estimated prompt tokens of the request side by side with the actual ones.
+        NOTE with tool calls the actual prompt tokens are summed over all the completions of the tool loop, the estimate covers the first one only.
+        """
+        actual_tokens = usage["prompt_tokens"] if usage is not None else None
+        conversation.metrics.estimated_prompt_tokens += estimated_tokens
+        logger.debug(f"[Agent ID: {self.id}] Prompt tokens estimated: %s, actual: %s", estimated_tokens, actual_tokens)
+        conversation.log.append(("info", "agent/tokens", self.id, {"estimated": estimated_tokens, "actual": actual_tokens}))
+
+    def _handle_response(self, conversation: Conversation, response_message: dict):
         response_message['name'] = self.id
         self.update_strategy.update(conversation, response_message)
         logger.debug(f"[Agent ID: {self.id}] Response message: %s", response_message)
@@ -95,30 +183,77 @@ class Agent(Askable):
 
     def _prepare_llm_tools(self, conversation: Conversation):
         
-        # Closure function to update a conversation variable
-        def update_conversation_variable(
-            variableName: Annotated[str, "The variable name to update"], 
-            variableValue: Annotated[str, "The new value of the variable"]) -> Annotated[str, "Confirmation that the variable was updated"]:
+        # Closure function to update a conversation variable, its schema is precomputed
+        def update_conversation_variable(variableName: str, variableValue: str) -> str:
             conversation.variables[variableName] = variableValue
             return f"Variable {variableName} updated to {variableValue}"
         
-        s = get_function_schema(update_conversation_variable, name="update_conversation_variable", description="update a conversation or context variable")
-        local_tools = self.tools + [s]
-        local_tools_function = {**self.tools_function, "update_conversation_variable": wrap_function(update_conversation_variable)}
+        local_tools = self.tools + [UPDATE_CONVERSATION_VARIABLE_TOOL]
+        local_tools_function = {**self.tools_function, "update_conversation_variable": update_conversation_variable}
+        for tool_name, (function, policy) in self.tool_output_policies.items():
+            local_tools_function[tool_name] = self._shape_tool_output(conversation, tool_name, function, policy)
         return local_tools,local_tools_function
 
-    def _prepare_llm_input(self, conversation):
+    def _shape_tool_output(self, conversation: Conversation, tool_name: str, function: Callable, policy: ToolOutputPolicy):
+        """
+        Wrap a tool to shape its result with the output policy. The raw result is kept in the conversation log for tracing.
+        """
+        def trace(kwargs, raw, output):
+            logger.debug(f"[Agent ID: {self.id}] Tool %s output shaped to %s characters", tool_name, len(output))
+            conversation.log.append(("debug", "agent/tool_output", self.id, {"tool": tool_name, "arguments": kwargs, "raw": raw, "output": output}))
+            return output
+
+        if inspect.iscoroutinefunction(function):
+            async def _a_shaped(**kwargs):
+                raw = await function(**kwargs)
+                return trace(kwargs, raw, policy.apply(raw, kwargs))
+            return _a_shaped
+
+        def _shaped(**kwargs):
+            raw = function(**kwargs)
+            return trace(kwargs, raw, policy.apply(raw, kwargs))
+        return _shaped
+
+    def _prepare_llm_input(self, conversation, tools: list = None):
         local_messages = []
-        local_messages.append({"role": "system", "content": self.system_message.replace("__context__", json.dumps(conversation.variables))})
-        local_messages.extend(self.reading_strategy.get_messages(conversation))
+        if self.prompt_layout == "cache" and "__context__" in self.system_message:
+            # Static prefix first (instructions, then the messages in order), volatile variables last
+            system_message = {"role": "system", "content": self.system_message.replace("__context__", "(see the context variables in the last message)")}
+            context_messages = [{"role": "system", "content": "# CONTEXT VARIABLES\n\n" + json.dumps(conversation.variables, sort_keys=True)}]
+        else:
+            system_message = {"role": "system", "content": self.system_message.replace("__context__", json.dumps(conversation.variables))}
+            context_messages = []
+        local_messages.append(system_message)
+        messages = self.reading_strategy.get_messages(conversation)
+        if self.max_input_tokens is not None:
+            # The system messages and the tool schemas are always sent, the messages get what is left of the budget
+            fixed_tokens = sum(self.token_counter.count_message(message) for message in [system_message] + context_messages) + self._count_tools_tokens(tools)
+            messages = fit_messages(messages, self.max_input_tokens - fixed_tokens, self.token_counter)
+        local_messages.extend(messages)
+        local_messages.extend(context_messages)
         logger.debug(f"[Agent ID: {self.id}] Local messages prepared for API call (last 3): %s", local_messages[-3:])
         return local_messages
     
+    def _count_tools_tokens(self, tools: list) -> int:
+        """
+        The tokens of the tool schemas, counted again only when a tool is registered.
+        """
+        if not tools:
+            return 0
+        count, tokens = self._tools_tokens
+        if count != len(tools):
+            tokens = self.token_counter.count_tools(tools)
+            self._tools_tokens = (len(tools), tokens)
+        return tokens
+
     def register_tool(
         self,
         *,
         name: Optional[str] = None,
         description: Optional[str] = None,
+        output_policy: Optional[ToolOutputPolicy] = None,
+        memoize: bool = False,
+        cache: Optional[Union[ToolCachePolicy, float]] = None,
     ) -> Callable[[F], F]:
         """
         Decorator for registering a function to be used by an agent as a tool. NOTE: remember to annotate the function with the types of the parameters and the return value.
@@ -126,6 +261,10 @@ class Agent(Askable):
         Args:
             name (str): The name of the tool. If not provided, the function name will be used.
             description (str): The description of the tool. If not provided, the function description will be used.
+            output_policy (ToolOutputPolicy): How the tool result is shaped before being sent to the LLM (size limit, field allowlist, de-duplication). If not provided, the result is sent verbatim.
+            memoize (bool): For read-only tools, memoize the results for the duration of a Workflow run, keyed by the qualified tool name and arguments,
+                and shared by all the agents of the run. Leave it off for tools with side effects or whose result changes within a run.
+            cache (ToolCachePolicy | float): For read-only tools, cache the results across requests and users with the given policy (or ttl in seconds), see tool_cache.
         """
         def _decorator(func: F) -> F:
             """Decorator for registering a function to be used by an agent.
@@ -162,7 +301,13 @@ class Agent(Askable):
                 self.tools = []
                 self.tools_function = {}
             self.tools.append(f)
-            self.tools_function[func._name] = wrap_function(func)
+            # The module qualifies the cache and memo keys: different agents and use cases can register different tools with the same name
+            qualified_name = f"{func.__module__}.{func._name}"
+            function = cached_tool(cache, name=qualified_name)(func) if cache is not None else func
+            function = memoize_tool(qualified_name, function) if memoize else function
+            self.tools_function[func._name] = wrap_function(function)
+            if output_policy is not None:
+                self.tool_output_policies[func._name] = (load_basemodels_if_needed(function), output_policy)
             logger.debug(f"[Agent ID: {self.id}] Tool registered successfully: %s", func._name)
 
             return func
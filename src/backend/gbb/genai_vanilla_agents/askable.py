@@ -1,4 +1,5 @@
 # A common Python interface for both Agent and Team
+import asyncio
 from abc import ABC, abstractmethod
 
 from .conversation import Conversation
@@ -9,6 +10,12 @@ class Askable(ABC):
     def ask(self, conversation: Conversation, stream = False) -> str:
         pass
     
+    async def ask_async(self, conversation: Conversation, stream = False) -> str:
+        """
+        Async version of ask. The default implementation runs ask in a worker thread, Askables calling LLMs override it with a native async implementation.
+        """
+        return await asyncio.to_thread(self.ask, conversation, stream)
+    
     def __init__(self, id: str, description: str):
         self._id = id
         self._description = description
@@ -3,6 +3,7 @@ from typing import Annotated
 
 import requests
 from .llm import LLM
+from .shared_clients import get_requests_session, get_token_provider
 from .conversation import AllMessagesStrategy, ConversationReadingStrategy
 from .agent import Agent
 
@@ -10,13 +11,13 @@ from .agent import Agent
 import logging
 logger = logging.getLogger(__name__)
 
-from azure.identity import DefaultAzureCredential
-credential = DefaultAzureCredential()
-token = credential.get_token("https://dynamicsessions.io/.default")
 import os
 
+# Token of the dynamic sessions, cached and refreshed before it expires by the shared credential
+dynamic_sessions_token = get_token_provider("https://dynamicsessions.io/.default")
+
 class AzureCodingAgent(Agent):
-    def __init__(self, id: str, description: str, llm: LLM, reading_strategy: ConversationReadingStrategy = AllMessagesStrategy()):
+    def __init__(self, id: str, description: str, llm: LLM, reading_strategy: ConversationReadingStrategy = None):
         system_message = """
         You are an expert Python developer.
         Your task is to write a Python code snippet to solve a given problem.
@@ -54,9 +55,9 @@ def run_code(
         return "Error: AZURE_DYNAMIC_SESSIONS_ENDPOINT environment variable is not set"
     
     try:
-        response = requests.post(
+        response = get_requests_session().post(
             f"{management_endpoint}/code/execute?api-version=2024-02-02-preview&identifier={conversation_id}", 
-            headers={"Authorization": f"Bearer {token.token}"}, 
+            headers={"Authorization": f"Bearer {dynamic_sessions_token()}"}, 
             json={
             "properties": {
                 "codeInputType": "inline",
@@ -14,7 +14,7 @@ import tempfile
 import venv
 
 class LocalCodingAgent(Agent):
-    def __init__(self, id: str, description: str, llm: LLM, reading_strategy: ConversationReadingStrategy = AllMessagesStrategy()):
+    def __init__(self, id: str, description: str, llm: LLM, reading_strategy: ConversationReadingStrategy = None):
         system_message = """
         You are an expert Python developer.
         Your task is to write a Python code snippet to solve a given problem.
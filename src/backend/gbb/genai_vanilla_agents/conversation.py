@@ -1,6 +1,12 @@
+import json
+import os
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Sequence
 from queue import SimpleQueue
-from typing import Any, Protocol
+from typing import Any, Iterable, NamedTuple, Optional, Protocol, Union
 
 from pydantic import BaseModel
 
@@ -8,18 +14,190 @@ from .llm import LLM
 import logging
 logger = logging.getLogger(__name__)
 
+class UsageMetrics(BaseModel):
+    calls: int = 0
+    total_tokens: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+
+    def add_usage(self, usage: dict):
+        self.calls += 1
+        self.total_tokens += usage["total_tokens"]
+        self.prompt_tokens += usage["prompt_tokens"]
+        self.completion_tokens += usage["completion_tokens"]
+        self.cached_tokens += usage.get("cached_tokens", 0)
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """
+        The fraction of the prompt tokens served from the prompt cache.
+        """
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
 # a ConversationMetrics class with totalTokens, promptTokens and completionTokens
 class ConversationMetrics(BaseModel):
     total_tokens: int
     prompt_tokens: int
     completion_tokens: int
+    # Prompt tokens served from the prompt cache, included in prompt_tokens
+    cached_tokens: int = 0
+    # Sum of the prompt tokens estimated locally before each agent call, to compare with prompt_tokens
+    estimated_prompt_tokens: int = 0
+    # Usage by agent (or team) id
+    agents: dict[str, UsageMetrics] = {}
+    # Usage by call purpose (router, planner, summarizer, answerer)
+    purposes: dict[str, UsageMetrics] = {}
+    
+    def add_usage(self, usage: dict, agent_id: str = None, purpose: str = None):
+        """
+        Accumulate the usage returned by an LLM call, if any, optionally attributed to an agent and a call purpose
+        """
+        if usage is None:
+            return
+        self.total_tokens += usage["total_tokens"]
+        self.prompt_tokens += usage["prompt_tokens"]
+        self.completion_tokens += usage["completion_tokens"]
+        self.cached_tokens += usage.get("cached_tokens", 0)
+        if agent_id is not None:
+            self.agents.setdefault(agent_id, UsageMetrics()).add_usage(usage)
+        if purpose is not None:
+            self.purposes.setdefault(purpose, UsageMetrics()).add_usage(usage)
+
+    def since(self, previous: "ConversationMetrics") -> "ConversationMetrics":
+        """
+        The usage accumulated since the previous snapshot (see model_copy(deep=True)), e.g. the usage of a single request.
+        """
+        def difference(current: BaseModel, before: BaseModel, fields: list[str]) -> dict:
+            return {field: getattr(current, field) - (getattr(before, field) if before is not None else 0) for field in fields}
+
+        fields = ["total_tokens", "prompt_tokens", "completion_tokens", "cached_tokens", "estimated_prompt_tokens"]
+        usage_fields = ["calls", "total_tokens", "prompt_tokens", "completion_tokens", "cached_tokens"]
+        return ConversationMetrics(
+            **difference(self, previous, fields),
+            agents={key: UsageMetrics(**difference(value, previous.agents.get(key), usage_fields))
+                    for key, value in self.agents.items() if value.calls != getattr(previous.agents.get(key), "calls", 0)},
+            purposes={key: UsageMetrics(**difference(value, previous.purposes.get(key), usage_fields))
+                      for key, value in self.purposes.items() if value.calls != getattr(previous.purposes.get(key), "calls", 0)},
+        )
+
+# Maximum number of events kept per conversation, the oldest are dropped first
+CONVERSATION_LOG_MAX_EVENTS = int(os.getenv("CONVERSATION_LOG_MAX_EVENTS", "500"))
+
+# The events exported by EventLog.export, shipped to the telemetry by the logging handler (see util.set_up_logging)
+events_logger = logging.getLogger(__name__ + ".events")
+
+_EVENT_LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+
+
+class ConversationEvent(NamedTuple):
+    """
+    An event of the conversation log, e.g. ("info", "team/choice", "group_chat", ("CRM", "reason")).
+
+    Args:
+        level (str): "debug", "info", "warning" or "error".
+        kind (str): The event kind, e.g. "agent/error".
+        source (str): The id of the agent or team reporting the event.
+        details (tuple): The event details, exceptions are kept as their message so that their traceback and frames are released.
+        timestamp (float): The event time, in seconds since the epoch.
+        sequence (int): The position of the event in the conversation log, dropped events included.
+    """
+    level: str
+    kind: str
+    source: str
+    details: tuple = ()
+    timestamp: float = 0.0
+    sequence: int = 0
+
+    def to_dict(self) -> dict:
+        return {"level": self.level, "kind": self.kind, "source": self.source, "details": list(self.details),
+                "timestamp": self.timestamp, "sequence": self.sequence}
+
+class EventLog:
+    """
+    Size-bounded log of the conversation events (ring buffer), one per conversation.
+
+    Accepts the tuples appended by the agents and teams, (level, kind, source, *details), and stores them as ConversationEvent.
+
+    Args:
+        events (Iterable): The initial events, tuples or ConversationEvent.
+        max_events (int): The maximum number of events kept, the oldest are dropped first.
+    """
+    def __init__(self, events: Iterable[Union[tuple, ConversationEvent]] = (), max_events: int = CONVERSATION_LOG_MAX_EVENTS):
+        self.events = deque(maxlen=max_events)
+        # Tools run in a thread pool and may report events concurrently
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.exported = 0
+        self.extend(events)
+
+    def append(self, event: Union[tuple, ConversationEvent]):
+        if not isinstance(event, ConversationEvent):
+            level, kind, source, *details = event
+            event = ConversationEvent(level, kind, source, tuple(details), time.time())
+        details = tuple(f"{type(detail).__name__}: {detail}" if isinstance(detail, BaseException) else detail for detail in event.details)
+        with self.lock:
+            self.sequence += 1
+            self.events.append(event._replace(details=details, timestamp=event.timestamp or time.time(), sequence=self.sequence))
+
+    def extend(self, events: Iterable[Union[tuple, ConversationEvent]]):
+        for event in events:
+            self.append(event)
+
+    @property
+    def dropped(self) -> int:
+        """
+        The number of events dropped because the log was full.
+        """
+        with self.lock:
+            return self.sequence - len(self.events)
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.events))
+
+    def __getitem__(self, index: int) -> ConversationEvent:
+        with self.lock:
+            return self.events[index]
+
+    def to_list(self) -> list[dict]:
+        return [event.to_dict() for event in self]
+
+    def export(self, target: logging.Logger = None) -> int:
+        """
+        Emit the events not exported yet as log records, with the event fields as attributes (event.kind, event.source...)
+        so that they can be queried in the telemetry. Returns the number of events exported.
+
+        Args:
+            target (logging.Logger): The logger, defaults to the "gbb.genai_vanilla_agents.conversation.events" one.
+        """
+        target = target or events_logger
+        with self.lock:
+            events = [event for event in self.events if event.sequence > self.exported]
+            self.exported = self.sequence
+        for event in events:
+            target.log(_EVENT_LEVELS.get(event.level, logging.INFO), "%s %s", event.kind, event.source, extra={
+                "event.kind": event.kind,
+                "event.source": event.source,
+                "event.details": json.dumps(event.details, default=str),
+                "event.sequence": event.sequence,
+            })
+        return len(events)
 
 class Conversation():
-    def __init__(self, messages: list[dict] = [], variables: dict[str, str] = {}, metrics = ConversationMetrics(total_tokens=0, prompt_tokens=0, completion_tokens=0), log = []):
-        self.messages = messages
-        self.variables = variables
-        self.log = log
-        self.metrics = metrics
+    def __init__(self, messages: list[dict] = None, variables: dict[str, str] = None, metrics: ConversationMetrics = None,
+                 log: Union[EventLog, Iterable] = None, state: dict = None):
+        # Default arguments are evaluated once, mutable ones would be shared by all the conversations
+        self.messages = messages if messages is not None else []
+        self.variables = variables if variables is not None else {}
+        self.log = log if isinstance(log, EventLog) else EventLog(log or ())
+        # Serialized state of the components reading the conversation (e.g. the rolling summary of SummarizeMessagesStrategy), not sent to the model
+        self.state = state if state is not None else {}
+        # A default instance would be shared by all the conversations, and so would their usage
+        self.metrics = metrics if metrics is not None else ConversationMetrics(total_tokens=0, prompt_tokens=0, completion_tokens=0)
         self.stream_queue = SimpleQueue()
         
     def stream(self):
@@ -40,11 +218,13 @@ class Conversation():
         return {
             "messages": self.messages,
             "variables": self.variables,
-            "metrics": self.metrics.model_dump()
+            "metrics": self.metrics.model_dump(),
+            "state": self.state
         }
         
     def fork(self):
-        return Conversation(messages=self.messages.copy(), variables=self.variables.copy())
+        # The fork shares the metrics, the log and the state, so that its usage, events and state updates are accounted in the main conversation
+        return Conversation(messages=self.messages.copy(), variables=self.variables.copy(), metrics=self.metrics, log=self.log, state=self.state)
         
     @classmethod
     def from_dict(cls, data):
@@ -52,65 +232,210 @@ class Conversation():
             messages = data.get('messages', []),
             variables = data.get('variables', {}),
             log = data.get('log', []),
-            metrics = ConversationMetrics(**data.get('metrics', {}))
+            metrics = ConversationMetrics(**data.get('metrics', {})),
+            state = data.get('state', {})
         )
         
+class MessageView(Sequence):
+    """
+    A read-only selection of the messages of a conversation, stored as positions in the message list.
+
+    The reading strategies select messages on views without copying them; the list is only built by to_list(),
+    when the messages are sent to the language model.
+
+    Args:
+        messages (list[dict]): The messages of the conversation.
+        indices (range | list[int]): The positions of the selected messages, defaults to all of them.
+    """
+    __slots__ = ("messages", "indices")
+
+    def __init__(self, messages: list[dict], indices: Union[range, list[int]] = None):
+        self.messages = messages
+        self.indices = range(len(messages)) if indices is None else indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[dict, "MessageView"]:
+        if isinstance(index, slice):
+            return MessageView(self.messages, self.indices[index])
+        return self.messages[self.indices[index]]
+
+    def __iter__(self):
+        messages = self.messages
+        return (messages[i] for i in self.indices)
+
+    def covers(self, conversation: Conversation) -> bool:
+        """
+        Whether the view selects all the messages of the conversation, in order.
+        """
+        return self.messages is conversation.messages and self.indices == range(len(conversation.messages))
+
+    def without_system(self) -> "MessageView":
+        messages = self.messages
+        return MessageView(messages, [i for i in self.indices if messages[i]["role"] != "system"])
+
+    def _non_system(self, positions: Iterable[int], count: int) -> list[int]:
+        messages = self.messages
+        selected = []
+        for i in positions:
+            if len(selected) == count:
+                break
+            if messages[i]["role"] != "system":
+                selected.append(i)
+        return selected
+
+    def first(self, k: int) -> "MessageView":
+        """
+        The first k messages, system messages excluded. Only the head of the view is scanned.
+        """
+        return MessageView(self.messages, self._non_system(self.indices, k))
+
+    def last(self, n: int) -> "MessageView":
+        """
+        The last n messages, system messages excluded. Only the tail of the view is scanned.
+        """
+        return MessageView(self.messages, self._non_system(reversed(self.indices), n)[::-1])
+
+    def to_list(self) -> list[dict]:
+        if isinstance(self.indices, range) and self.indices.step == 1:
+            return self.messages[self.indices.start:self.indices.stop]
+        return list(map(self.messages.__getitem__, self.indices))
+
 class ConversationReadingStrategy(ABC):
     @abstractmethod
     def get_messages(self, conversation: Conversation) -> list[dict]:
         pass
+
+    def select(self, view: MessageView, conversation: Conversation) -> MessageView:
+        """
+        The messages selected from a view of the conversation, e.g. the output of the previous strategy of a pipeline.
+
+        Strategies selecting messages by position override it (see MessageViewReadingStrategy), the others read a conversation holding the view messages.
+        """
+        if view.covers(conversation):
+            return MessageView(self.get_messages(conversation))
+        return MessageView(self.get_messages(Conversation(messages=view.to_list(), variables=conversation.variables,
+                                                          metrics=conversation.metrics, log=conversation.log, state=conversation.state)))
     
     def exclude_system_messages(self, messages: list[dict]) -> list[dict]:
         return [message for message in messages if message["role"] != "system"]
+
+class MessageViewReadingStrategy(ConversationReadingStrategy):
+    """
+    Base of the strategies working on message views: the selected messages are only copied once, by get_messages.
+    """
+    @abstractmethod
+    def select(self, view: MessageView, conversation: Conversation) -> MessageView:
+        pass
+
+    def get_messages(self, conversation: Conversation) -> list[dict]:
+        return self.select(MessageView(conversation.messages), conversation).to_list()
     
-class LastNMessagesStrategy(ConversationReadingStrategy):
+class LastNMessagesStrategy(MessageViewReadingStrategy):
     def __init__(self, n: int):
         self.n = n
         
-    def get_messages(self, conversation: Conversation) -> list[dict]:
-        return self.exclude_system_messages(conversation.messages)[-self.n:]
+    def select(self, view: MessageView, conversation: Conversation) -> MessageView:
+        if self.n > 0:
+            return view.last(self.n)
+        # Same as the list slice [-n:] otherwise
+        return view.without_system()[-self.n:]
     
-class AllMessagesStrategy(ConversationReadingStrategy):
+class AllMessagesStrategy(MessageViewReadingStrategy):
+    def select(self, view: MessageView, conversation: Conversation) -> MessageView:
+        return view.without_system()
+
     def get_messages(self, conversation: Conversation) -> list[dict]:
+        # The whole history is copied anyway, in a single pass
         return self.exclude_system_messages(conversation.messages)
     
-class TopKLastNMessagesStrategy(ConversationReadingStrategy):
+class TopKLastNMessagesStrategy(MessageViewReadingStrategy):
     def __init__(self, k: int, n: int):
         self.k = k
         self.n = n
         
-    def get_messages(self, conversation: Conversation) -> list[dict]:
-        list = self.exclude_system_messages(conversation.messages)
-        return list[:self.k] + list[-self.n:]
+    def select(self, view: MessageView, conversation: Conversation) -> MessageView:
+        if self.k > 0 and self.n > 0:
+            first, last = view.first(self.k), view.last(self.n)
+        else:
+            # Same as the list slices [:k] and [-n:] otherwise
+            messages = view.without_system()
+            first, last = messages[:self.k], messages[-self.n:]
+        return MessageView(view.messages, list(first.indices) + list(last.indices))
     
-class SummarizeMessagesStrategy(ConversationReadingStrategy):
-    def __init__(self, llm: LLM, system_prompt: str):
+class SummarizeMessagesStrategy(MessageViewReadingStrategy):
+    """
+    Replaces the messages with a summary written by the language model.
+
+    In incremental mode the last summary is kept in the conversation state (shared with the forks and serialized with the conversation).
+    The summary message is the high-water mark: once it is in the history (e.g. written back by a PlannedTeam), the next call only
+    summarizes the prior summary and the messages after it, so the cost scales with the size of the turn instead of the age of the chat.
+    When the summary message is not found (e.g. cut by a previous strategy of a pipeline) the whole history is summarized again.
+
+    Args:
+        llm (LLM): The language model writing the summary.
+        system_prompt (str): The summarization instructions.
+        incremental (bool): Whether to summarize only the messages after the last summary.
+        state_key (str): The key of the summary in the conversation state, to tell apart several incremental strategies.
+    """
+    def __init__(self, llm: LLM, system_prompt: str, incremental: bool = False, state_key: str = "summarizer"):
         super().__init__()
         self.llm = llm
         self.system_prompt = system_prompt
+        self.incremental = incremental
+        self.state_key = state_key
         
-    def get_messages(self, conversation: Conversation) -> list[dict]:
-        # Extract the conversation text from the messages        
-        local_messages = []
-        local_messages += self.exclude_system_messages(conversation.messages)
+    def select(self, view: MessageView, conversation: Conversation) -> MessageView:
+        previous = conversation.state.get(self.state_key) if self.incremental else None
+        mark = self._find_summary(view, previous["summary"]) if previous else None
+        if mark is None:
+            # Extract the conversation text from the messages
+            new_messages = view.without_system()
+            local_messages = new_messages.to_list()
+        else:
+            # The prior summary stands for all the messages up to it
+            new_messages = view[mark + 1:].without_system()
+            if len(new_messages) == 0:
+                return MessageView([self._summary_message(previous["summary"])])
+            local_messages = [self._summary_message(previous["summary"])] + new_messages.to_list()
         local_messages.append({"role": "user", "content": self.system_prompt})
         
         # Summarize the conversation text
         response, usage = self.llm.ask(messages=local_messages)
+        conversation.metrics.add_usage(usage, "summarizer", getattr(self.llm, "purpose", "summarizer"))
         response_message = response.model_dump()
         summarized_text = response_message["content"]
         
-        return [{"role": "assistant", "name": "summarizer", "content": summarized_text}]
+        if self.incremental:
+            summarized = len(new_messages) + (previous["messages"] if mark is not None else 0)
+            conversation.state[self.state_key] = {"summary": summarized_text, "messages": summarized}
+            conversation.log.append(("debug", "summarizer/summary", self.state_key,
+                                     {"mode": "full" if mark is None else "incremental", "new_messages": len(new_messages), "summarized_messages": summarized}))
+        return MessageView([self._summary_message(summarized_text)])
 
-class PipelineConversationReadingStrategy(ConversationReadingStrategy):
+    def _summary_message(self, summary: str) -> dict:
+        return {"role": "assistant", "name": "summarizer", "content": summary}
+
+    def _find_summary(self, view: MessageView, summary: str) -> Optional[int]:
+        """
+        The position in the view of the last summary message, searched from the end: only the messages of the current turn are scanned.
+        """
+        for position in range(len(view) - 1, -1, -1):
+            message = view[position]
+            if message.get("name") == "summarizer" and message.get("content") == summary:
+                return position
+        return None
+
+class PipelineConversationReadingStrategy(MessageViewReadingStrategy):
     def __init__(self, strategies: list[ConversationReadingStrategy]):
         self.strategies = strategies
         
-    def get_messages(self, conversation: Conversation) -> list[dict]:
-        messages = conversation.messages
+    def select(self, view: MessageView, conversation: Conversation) -> MessageView:
+        # Each strategy reads the view selected by the previous one, no intermediate list nor conversation is built
         for strategy in self.strategies:
-            messages = strategy.get_messages(Conversation(messages=messages))
-        return messages
+            view = strategy.select(view, conversation)
+        return view
     
 class ConversationUpdateStrategy(ABC):
     @abstractmethod
@@ -1,10 +1,16 @@
-from collections import defaultdict
-from typing import Generator
-from openai import NOT_GIVEN, AzureOpenAI, Stream
+import asyncio
+import contextvars
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncGenerator, Generator
+from openai import NOT_GIVEN, AsyncAzureOpenAI, AsyncStream, AzureOpenAI, Stream
 from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from openai.types.completion import CompletionUsage
 from abc import ABC, abstractmethod
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
+
+from .shared_clients import get_async_http_client, get_http_client, get_token_provider
+from .throttling import RetryPolicy, estimate_tokens, get_rate_limiter
 
 import json
 import logging
@@ -25,6 +31,45 @@ class LLM(ABC):
     def ask_stream(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7) -> Generator[tuple[str, any], None, tuple[dict, any]]:
         pass
 
+    async def ask_async(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN) -> tuple[dict, dict]:
+        """
+        Async version of ask.
+
+        The default implementation runs ask in a worker thread, LLMs doing network I/O should override it with a native async implementation.
+        """
+        kwargs = {} if response_format is NOT_GIVEN else {"response_format": response_format}
+        return await asyncio.to_thread(self.ask, messages=messages, tools=tools, tools_function=tools_function, temperature=temperature, **kwargs)
+
+    def invalidate(self, messages: list, temperature: float = 0.7, response_format = NOT_GIVEN):
+        """
+        Drop the response cached for this request, if any, e.g. when the caller rejected it and asks again.
+
+        No-op for the LLMs without cache, wrappers forward it to the wrapped LLM.
+        """
+        pass
+
+    async def invalidate_async(self, messages: list, temperature: float = 0.7, response_format = NOT_GIVEN):
+        """
+        Async version of invalidate.
+
+        The default implementation runs invalidate in a worker thread, LLMs whose invalidation does I/O should override it.
+        """
+        await asyncio.to_thread(self.invalidate, messages, temperature=temperature, response_format=response_format)
+
+    async def ask_stream_async(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7) -> AsyncGenerator[tuple[str, any], None]:
+        """
+        Async version of ask_stream, yielding the same [mark, content] updates.
+
+        The default implementation pulls the updates of ask_stream from a worker thread, LLMs doing network I/O should override it with a native async implementation.
+        """
+        gen = self.ask_stream(messages=messages, tools=tools, tools_function=tools_function, temperature=temperature)
+        end_of_stream = object()
+        while True:
+            update = await asyncio.to_thread(next, gen, end_of_stream)
+            if update is end_of_stream:
+                break
+            yield update
+
 class ErrorTestingLLM(LLM):
     """
     LLM that raises an error when asked. Used for testing error handling.
@@ -50,84 +95,159 @@ class AzureOpenAILLM(LLM):
         - azure_deployment: str, Azure deployment name
         - azure_endpoint: str, Azure endpoint
         - api_key: str, Azure API key. Leave empty if using Azure AD token provider
+        - token_provider: callable returning a bearer token, used when no api_key is set (default the process-wide credential, see shared_clients)
+        - http_client: httpx.Client of the sync client (default the process-wide connection pool)
+        - async_http_client: httpx.AsyncClient of the async client (default the process-wide connection pool)
         - api_version: str, API version
+        - parallel_tool_calls: bool, run the tool calls of a single turn concurrently (default True)
+        - tokens_per_minute: int, TPM quota of the deployment, enforced client-side by a limiter shared by all the instances (default None, no limit)
+        - requests_per_minute: int, RPM quota of the deployment (default None, no limit)
+        - max_retries: int, retries of throttled (429) and transient (5xx) errors, with exponential backoff honouring Retry-After (default 5)
+        - stream_coalesce_chars: int, minimum characters of a streamed content delta, smaller deltas are coalesced (default 0, a delta per chunk)
+        - max_tool_iterations: int, maximum rounds of tool calls of a single ask, the model is then asked to answer with the results gathered so far (default 10)
         
     """
     def __init__(self, config: dict):
         super().__init__(config)
                 
-        # api_key = self.config['api_key']
-        token_provider = get_bearer_token_provider(DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default")
-        # ) if api_key is None or api_key == "" else None
+        api_key = self.config.get('api_key')
+        # The credential and the connection pools are shared by all the instances: no credential discovery nor TLS handshake per instance
+        token_provider = (self.config.get('token_provider') or get_token_provider()) if not api_key else None
         
         self.client = AzureOpenAI(
             azure_deployment=self.config['azure_deployment'], 
-            # api_key=self.config['api_key'], 
+            api_key=api_key or None, 
             azure_endpoint=self.config['azure_endpoint'], 
             api_version=self.config['api_version'],
-            azure_ad_token_provider=token_provider)
-        logger.debug("LLM initialized with AzureOpenAI client with token provider")
+            azure_ad_token_provider=token_provider,
+            http_client=self.config.get('http_client') or get_http_client(),
+            max_retries=0)
+        self.async_client = AsyncAzureOpenAI(
+            azure_deployment=self.config['azure_deployment'],
+            api_key=api_key or None,
+            azure_endpoint=self.config['azure_endpoint'],
+            api_version=self.config['api_version'],
+            azure_ad_token_provider=token_provider,
+            http_client=self.config.get('async_http_client') or get_async_http_client(),
+            max_retries=0)
+        self.parallel_tool_calls = self.config.get('parallel_tool_calls', True)
+        self.stream_coalesce_chars = self.config.get('stream_coalesce_chars', 0)
+        self.max_tool_iterations = self.config.get('max_tool_iterations', 10)
+        # Retries are handled by the retry policy, in coordination with the shared rate limiter, not by the OpenAI client
+        self.rate_limiter = get_rate_limiter(self.config['azure_endpoint'], self.config['azure_deployment'],
+                                             self.config.get('tokens_per_minute'), self.config.get('requests_per_minute'))
+        self.retry_policy = RetryPolicy(max_retries=self.config.get('max_retries', 5), rate_limiter=self.rate_limiter)
+        logger.debug("LLM initialized with AzureOpenAI client with %s", "API key" if api_key else "token provider")
+
+    def _completion_args(self, messages: list, tools: list, temperature: float, tool_iterations: int = 0) -> dict:
+        tool_choice = "auto" if tools else NOT_GIVEN
+        if tools and tool_iterations >= self.max_tool_iterations:
+            # Tool call budget exhausted: no more tools, the model must answer with the results it already has
+            logger.warning("Maximum tool iterations reached (%s), asking for a final answer", self.max_tool_iterations)
+            messages = messages + [{"role": "system", "content": TOOL_LIMIT_MESSAGE}]
+            tool_choice = "none"
+        return {
+            "messages": messages,
+            "model": self.config['azure_deployment'],
+            "tools": tools if tools and len(tools) > 0 else NOT_GIVEN,
+            "temperature": temperature,
+            "tool_choice": tool_choice,
+        }
         
+    def _complete(self, create: callable, estimated_tokens: int = None, **kwargs):
+        """
+        Call the completion API through the shared rate limiter and the retry policy.
+
+        The estimated tokens are reconciled with the usage of the response. The usage of a stream is only known once consumed:
+        the caller passes its estimate and reconciles it with _reconcile_stream.
+        """
+        if estimated_tokens is None:
+            estimated_tokens = estimate_tokens(kwargs["messages"], kwargs.get("tools"))
+        self.rate_limiter.acquire(estimated_tokens)
+        response = self.retry_policy.call(create, **kwargs)
+        if getattr(response, "usage", None) is not None:
+            self.rate_limiter.adjust(response.usage.total_tokens - estimated_tokens)
+        return response
+
+    async def _complete_async(self, create: callable, estimated_tokens: int = None, **kwargs):
+        if estimated_tokens is None:
+            estimated_tokens = estimate_tokens(kwargs["messages"], kwargs.get("tools"))
+        await self.rate_limiter.acquire_async(estimated_tokens)
+        response = await self.retry_policy.call_async(create, **kwargs)
+        if getattr(response, "usage", None) is not None:
+            self.rate_limiter.adjust(response.usage.total_tokens - estimated_tokens)
+        return response
+
+    def _reconcile_stream(self, accumulator: "StreamAccumulator", estimated_tokens: int):
+        """
+        Correct the rate limiter with the usage of a consumed stream, reported by its last chunk.
+        """
+        if accumulator.total_tokens is not None:
+            self.rate_limiter.adjust(accumulator.total_tokens - estimated_tokens)
+
     def ask(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN):
         # logger.debug("Received messages: %s", messages)
         
         if response_format is NOT_GIVEN:
-            response = self.client.chat.completions.create(
-                messages=messages,
-                model=self.config['azure_deployment'],
-                tools=tools if tools and len(tools) > 0 else NOT_GIVEN, 
-                temperature=temperature,
-                tool_choice="auto" if tools else None,
-            )
+            response = self._complete(self.client.chat.completions.create, **self._completion_args(messages, tools, temperature))
         else:
-            response = self.client.beta.chat.completions.parse(
-                messages=messages,
-                model=self.config['azure_deployment'],
-                tools=tools if tools and len(tools) > 0 else NOT_GIVEN, 
-                temperature=temperature,
-                tool_choice="auto" if tools else None,
-                response_format=response_format
-            )
-        
+            response = self._complete(self.client.beta.chat.completions.parse, **self._completion_args(messages, tools, temperature), response_format=response_format)
         
         response_message = response.choices[0].message
+        # Usage of all the completions, including the tool call iterations
+        usage = usage_to_dict(response.usage)
         logger.debug("Response message: %s", response_message)
         
         # Handle function calls (if any)
         # Must iterate until there are no more tool calls
-        while response_message.tool_calls:
+        tool_iterations = 0
+        while response_message.tool_calls and tool_iterations < self.max_tool_iterations:
             logger.debug("Tool calls detected: %s", response_message.tool_calls)
+            tool_iterations += 1
             messages.append(response.choices[0].message)
-            for tool_call in response_message.tool_calls:
-                function_args = json.loads(tool_call.function.arguments)
-                logger.debug("Function arguments: %s", function_args)
-
-                function_result = tools_function[tool_call.function.name](**function_args)
-                logger.debug("Function result: %s", function_result)
-
-                messages.append({
-                    "tool_call_id": tool_call.id,
-                    "role": "tool",
-                    "name": tool_call.function.name,
-                    "content": function_result,
-                })
-
+            function_results = execute_tool_calls(tools_function, [(tool_call.function.name, tool_call.function.arguments) for tool_call in response_message.tool_calls], parallel=self.parallel_tool_calls)
+            for tool_call, function_result in zip(response_message.tool_calls, function_results):
+                messages.append(tool_message(tool_call.id, tool_call.function.name, function_result))
             
             # Second API call: Get the next response from the model given the func call result
-            response = self.client.chat.completions.create(
-                messages=messages,
-                model=self.config['azure_deployment'],
-                tools=tools, 
-                temperature=temperature,
-                tool_choice="auto" if tools else None
-            )
+            response = self._complete(self.client.chat.completions.create, **self._completion_args(messages, tools, temperature, tool_iterations))
             response_message = response.choices[0].message
+            add_usage(usage, response.usage)
         
         logger.debug("Final response message: %s", response_message)
             
         # NOTE purposely not returning all the intermediate messages, only the final response
+
+        return response_message, usage
+
+    async def ask_async(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN):
+        if response_format is NOT_GIVEN:
+            response = await self._complete_async(self.async_client.chat.completions.create, **self._completion_args(messages, tools, temperature))
+        else:
+            response = await self._complete_async(self.async_client.beta.chat.completions.parse, **self._completion_args(messages, tools, temperature), response_format=response_format)
+
+        response_message = response.choices[0].message
+        usage = usage_to_dict(response.usage)
+        logger.debug("Response message: %s", response_message)
+
+        # Handle function calls (if any)
+        # Must iterate until there are no more tool calls
+        tool_iterations = 0
+        while response_message.tool_calls and tool_iterations < self.max_tool_iterations:
+            logger.debug("Tool calls detected: %s", response_message.tool_calls)
+            tool_iterations += 1
+            messages.append(response.choices[0].message)
+            function_results = await execute_tool_calls_async(tools_function, [(tool_call.function.name, tool_call.function.arguments) for tool_call in response_message.tool_calls], parallel=self.parallel_tool_calls)
+            for tool_call, function_result in zip(response_message.tool_calls, function_results):
+                messages.append(tool_message(tool_call.id, tool_call.function.name, function_result))
+
+            response = await self._complete_async(self.async_client.chat.completions.create, **self._completion_args(messages, tools, temperature, tool_iterations))
+            response_message = response.choices[0].message
+            add_usage(usage, response.usage)
+
+        logger.debug("Final response message: %s", response_message)
         
-        return response_message, {"completion_tokens": response.usage.completion_tokens, "prompt_tokens": response.usage.prompt_tokens, "total_tokens": response.usage.total_tokens}
+        return response_message, usage
         
     def ask_stream(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7):
         # Accumulate messages and usage
@@ -135,76 +255,51 @@ class AzureOpenAILLM(LLM):
         usage = {
             "completion_tokens": 0,
             "prompt_tokens": 0,
-            "total_tokens": 0
+            "total_tokens": 0,
+            "cached_tokens": 0
         }
         
         
+        tool_iterations = 0
         yield ["start", ""]
         while True:
-            response_message = {
-                "content": "",
-                "role": "assistant",
-                "function_call": None,
-                "tool_calls": defaultdict(
-                    lambda: {
-                        "function": {"arguments": "", "name": ""},
-                        "id": "",
-                        "type": "",
-                    }
-                )
-            }
+            accumulator = StreamAccumulator(usage, self.stream_coalesce_chars)
             
             # Call LLM with stream=True
-            completion: Stream[ChatCompletionChunk] = self.client.chat.completions.create(
-                messages=messages,
-                model=self.config['azure_deployment'],
-                tools=tools, 
-                temperature=temperature,
-                tool_choice="auto" if tools else None,
+            completion_args = self._completion_args(messages, tools, temperature, tool_iterations)
+            estimated_tokens = estimate_tokens(completion_args["messages"], completion_args["tools"])
+            completion: Stream[ChatCompletionChunk] = self._complete(self.client.chat.completions.create,
+                estimated_tokens=estimated_tokens,
+                **completion_args,
                 stream=True,
                 stream_options={"include_usage": True}
             )
             
             # Yield the intermediate updates
             for chunk in completion:
-                if len(chunk.choices) > 0:
-                    delta = json.loads(chunk.choices[0].delta.model_dump_json())
+                delta = accumulator.add(chunk)
+                if delta is not None:
                     yield ["delta", delta]
-                    delta.pop("role", None)
-                    delta.pop("name", None)
-                    # Update the accumulated response message
-                    merge_chunk(response_message, delta)
-                # Also accumulate usage, if any
-                if chunk.usage:
-                    usage["completion_tokens"] += chunk.usage.completion_tokens
-                    usage["prompt_tokens"] += chunk.usage.prompt_tokens
-                    usage["total_tokens"] += chunk.usage.total_tokens
+            self._reconcile_stream(accumulator, estimated_tokens)
+            delta = accumulator.flush()
+            if delta is not None:
+                yield ["delta", delta]
+            response_message = accumulator.message()
             
             logger.debug("Response message: %s", response_message)
             
             # Handle function calls (if any)            
-            if not response_message["tool_calls"] or len(response_message["tool_calls"]) == 0:
+            if not response_message["tool_calls"] or tool_iterations >= self.max_tool_iterations:
                 break
-            else:
-                response_message["tool_calls"] = list(
-                    response_message.get("tool_calls", {}).values())
             
             logger.debug("Tool calls detected: %s", response_message["tool_calls"])
+            tool_iterations += 1
             messages.append(response_message)
-            for tool_call in response_message["tool_calls"]:
-                function_args = json.loads(tool_call["function"]["arguments"])
-                logger.debug("Function arguments: %s", function_args)
-
-                function_result = tools_function[tool_call["function"]["name"]](**function_args)
-                logger.debug("Function result: %s", function_result)
+            function_results = execute_tool_calls(tools_function, [(tool_call["function"]["name"], tool_call["function"]["arguments"]) for tool_call in response_message["tool_calls"]], parallel=self.parallel_tool_calls)
+            for tool_call, function_result in zip(response_message["tool_calls"], function_results):
                 yield ["function_result", { "name": tool_call["function"]["name"], "result": function_result }]
 
-                messages.append({
-                    "tool_call_id": tool_call["id"],
-                    "role": "tool",
-                    "name": tool_call["function"]["name"],
-                    "content": function_result,
-                })
+                messages.append(tool_message(tool_call["id"], tool_call["function"]["name"], function_result))
             # NOTE: The loop will continue until there are no more tool calls
         
         # Strip the tool calls from the final response message
@@ -220,19 +315,257 @@ class AzureOpenAILLM(LLM):
         
         return [response_message, usage]
 
-def merge_fields(target, source):
-    for key, value in source.items():
-        if isinstance(value, str):
-            target[key] += value
-        elif value is not None and isinstance(value, dict):
-            merge_fields(target[key], value)
+    async def ask_stream_async(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7):
+        # Accumulate messages and usage
+        response_message = None
+        usage = {
+            "completion_tokens": 0,
+            "prompt_tokens": 0,
+            "total_tokens": 0,
+            "cached_tokens": 0
+        }
+
+        tool_iterations = 0
+        yield ["start", ""]
+        while True:
+            accumulator = StreamAccumulator(usage, self.stream_coalesce_chars)
+
+            # Call LLM with stream=True
+            completion_args = self._completion_args(messages, tools, temperature, tool_iterations)
+            estimated_tokens = estimate_tokens(completion_args["messages"], completion_args["tools"])
+            completion: AsyncStream[ChatCompletionChunk] = await self._complete_async(self.async_client.chat.completions.create,
+                estimated_tokens=estimated_tokens,
+                **completion_args,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+
+            # Yield the intermediate updates
+            async for chunk in completion:
+                delta = accumulator.add(chunk)
+                if delta is not None:
+                    yield ["delta", delta]
+            self._reconcile_stream(accumulator, estimated_tokens)
+            delta = accumulator.flush()
+            if delta is not None:
+                yield ["delta", delta]
+            response_message = accumulator.message()
+
+            logger.debug("Response message: %s", response_message)
+
+            # Handle function calls (if any)
+            if not response_message["tool_calls"] or tool_iterations >= self.max_tool_iterations:
+                break
+
+            logger.debug("Tool calls detected: %s", response_message["tool_calls"])
+            tool_iterations += 1
+            messages.append(response_message)
+            function_results = await execute_tool_calls_async(tools_function, [(tool_call["function"]["name"], tool_call["function"]["arguments"]) for tool_call in response_message["tool_calls"]], parallel=self.parallel_tool_calls)
+            for tool_call, function_result in zip(response_message["tool_calls"], function_results):
+                yield ["function_result", { "name": tool_call["function"]["name"], "result": function_result }]
+
+                messages.append(tool_message(tool_call["id"], tool_call["function"]["name"], function_result))
+            # NOTE: The loop will continue until there are no more tool calls
+
+        # Strip the tool calls from the final response message
+        response_message.pop("tool_calls", None)
+        response_message.pop("function_call", None)
+
+        logger.debug("Final response message: %s", response_message)
+
+        # Return the final response message and usage
+        yield ["response", [response_message, usage]]
+
+        yield ["end", ""]
+
+def execute_tool_call(tools_function: dict[str, callable], name: str, arguments: str):
+    """
+    Execute the tool function requested by the LLM, with the JSON encoded arguments.
+    """
+    function_args = json.loads(arguments)
+    logger.debug("Function arguments: %s", function_args)
+
+    function_result = tools_function[name](**function_args)
+    logger.debug("Function result: %s", function_result)
+    return function_result
+
+async def execute_tool_call_async(tools_function: dict[str, callable], name: str, arguments: str):
+    """
+    Execute the tool function requested by the LLM, with the JSON encoded arguments.
 
+    Async tool functions are awaited, blocking ones run in a worker thread to keep the event loop free.
+    """
+    function_args = json.loads(arguments)
+    logger.debug("Function arguments: %s", function_args)
+
+    function = tools_function[name]
+    if inspect.iscoroutinefunction(function):
+        function_result = await function(**function_args)
+    else:
+        function_result = await asyncio.to_thread(function, **function_args)
+    logger.debug("Function result: %s", function_result)
+    return function_result
+
+# Appended to the last completion request once max_tool_iterations is reached
+TOOL_LIMIT_MESSAGE = "The maximum number of tool calls for this request has been reached. Do not call any more tools: answer now with the information gathered so far, and state what could not be retrieved."
+
+# Tools are I/O bound (Cosmos DB, AI Search, HTTP), a shared bounded pool is enough for all the LLM instances
+TOOL_CALLS_MAX_WORKERS = 16
+_tool_executor = None
+_tool_executor_lock = threading.Lock()
 
-def merge_chunk(source: dict, delta: dict) -> None:
-    delta.pop("role", None)
-    merge_fields(source, delta)
+def _get_tool_executor() -> ThreadPoolExecutor:
+    global _tool_executor
+    if _tool_executor is None:
+        with _tool_executor_lock:
+            if _tool_executor is None:
+                _tool_executor = ThreadPoolExecutor(max_workers=TOOL_CALLS_MAX_WORKERS, thread_name_prefix="tool-call")
+    return _tool_executor
 
-    tool_calls = delta.get("tool_calls")
-    if tool_calls and len(tool_calls) > 0:
-        index = tool_calls[0].pop("index")
-        merge_fields(source["tool_calls"][index], tool_calls[0])
\ No newline at end of file
+def execute_tool_calls(tools_function: dict[str, callable], tool_calls: list[tuple[str, str]], parallel: bool = True) -> list:
+    """
+    Execute the (name, arguments) tool calls of a single LLM turn, returning the results in the same order.
+    
+    When there is more than one call and parallel is set, the calls run concurrently on a shared bounded executor.
+    """
+    if not parallel or len(tool_calls) <= 1:
+        return [execute_tool_call(tools_function, name, arguments) for name, arguments in tool_calls]
+    
+    logger.debug("Executing %s tool calls in parallel", len(tool_calls))
+    # Each call runs in a copy of the caller context, to keep the run context (e.g. the tool memo) in the worker threads
+    futures = [_get_tool_executor().submit(contextvars.copy_context().run, execute_tool_call, tools_function, name, arguments) for name, arguments in tool_calls]
+    return [future.result() for future in futures]
+
+async def execute_tool_calls_async(tools_function: dict[str, callable], tool_calls: list[tuple[str, str]], parallel: bool = True) -> list:
+    """
+    Async version of execute_tool_calls, the calls are gathered on the event loop.
+    """
+    if not parallel or len(tool_calls) <= 1:
+        return [await execute_tool_call_async(tools_function, name, arguments) for name, arguments in tool_calls]
+    
+    logger.debug("Executing %s tool calls in parallel", len(tool_calls))
+    return list(await asyncio.gather(*[execute_tool_call_async(tools_function, name, arguments) for name, arguments in tool_calls]))
+
+def tool_message(tool_call_id: str, name: str, function_result) -> dict:
+    return {
+        "tool_call_id": tool_call_id,
+        "role": "tool",
+        "name": name,
+        "content": function_result,
+    }
+
+def cached_tokens(usage) -> int:
+    """
+    The prompt tokens served from the prompt cache, 0 when not reported.
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
+
+def usage_to_dict(usage) -> dict:
+    return {
+        "completion_tokens": usage.completion_tokens,
+        "prompt_tokens": usage.prompt_tokens,
+        "total_tokens": usage.total_tokens,
+        "cached_tokens": cached_tokens(usage),
+    }
+
+def add_usage(total: dict, usage):
+    """
+    Add the usage of a completion to the total usage dict.
+    """
+    total["completion_tokens"] += usage.completion_tokens
+    total["prompt_tokens"] += usage.prompt_tokens
+    total["total_tokens"] += usage.total_tokens
+    total["cached_tokens"] += cached_tokens(usage)
+
+class StreamAccumulator:
+    """
+    Accumulates the chunks of a streamed completion into the response message and the usage.
+    
+    The delta fields are read directly from the chunks, content and tool call arguments are buffered in lists and joined once.
+    Content deltas are coalesced until at least coalesce_chars characters are pending (0 emits a delta per chunk).
+    The tokens of this completion alone are kept in total_tokens, None until the usage chunk is received.
+    """
+    def __init__(self, usage: dict, coalesce_chars: int = 0):
+        self.usage = usage
+        self.total_tokens = None
+        self.coalesce_chars = coalesce_chars
+        self.content_parts = []
+        self.pending_parts = []
+        self.pending_chars = 0
+        self.tool_calls = {}
+        
+    def add(self, chunk: ChatCompletionChunk) -> dict:
+        """
+        Accumulate a chunk. Returns the delta to emit, or None when there is nothing to emit yet.
+        """
+        event = None
+        if chunk.choices:
+            delta = chunk.choices[0].delta
+            content = delta.content
+            if content:
+                self.content_parts.append(content)
+                self.pending_parts.append(content)
+                self.pending_chars += len(content)
+                if self.pending_chars >= self.coalesce_chars:
+                    event = self.flush()
+            if delta.tool_calls:
+                event = self.flush() or {}
+                event["tool_calls"] = [self._add_tool_call(tool_call) for tool_call in delta.tool_calls]
+        # Also accumulate usage, if any
+        usage = chunk.usage
+        if usage:
+            add_usage(self.usage, usage)
+            self.total_tokens = (self.total_tokens or 0) + usage.total_tokens
+        return event
+    
+    def _add_tool_call(self, tool_call) -> dict:
+        accumulated = self.tool_calls.get(tool_call.index)
+        if accumulated is None:
+            accumulated = self.tool_calls[tool_call.index] = {"id": "", "type": "", "name": [], "arguments": []}
+        delta = {"index": tool_call.index}
+        if tool_call.id:
+            accumulated["id"] += tool_call.id
+            delta["id"] = tool_call.id
+        if tool_call.type:
+            accumulated["type"] += tool_call.type
+            delta["type"] = tool_call.type
+        function = tool_call.function
+        if function is not None:
+            delta["function"] = {}
+            if function.name:
+                accumulated["name"].append(function.name)
+                delta["function"]["name"] = function.name
+            if function.arguments:
+                accumulated["arguments"].append(function.arguments)
+                delta["function"]["arguments"] = function.arguments
+        return delta
+    
+    def flush(self) -> dict:
+        """
+        Returns the pending content delta, if any.
+        """
+        if not self.pending_parts:
+            return None
+        content = self.pending_parts[0] if len(self.pending_parts) == 1 else "".join(self.pending_parts)
+        self.pending_parts = []
+        self.pending_chars = 0
+        return {"content": content}
+    
+    def message(self) -> dict:
+        """
+        The accumulated response message, with the tool calls (if any) in index order.
+        """
+        return {
+            "content": "".join(self.content_parts),
+            "role": "assistant",
+            "function_call": None,
+            "tool_calls": [
+                {
+                    "id": tool_call["id"],
+                    "type": tool_call["type"],
+                    "function": {"name": "".join(tool_call["name"]), "arguments": "".join(tool_call["arguments"])},
+                }
+                for _, tool_call in sorted(self.tool_calls.items())
+            ]
+        }
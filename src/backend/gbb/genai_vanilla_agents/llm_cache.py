@@ -0,0 +1,446 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import math
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Awaitable, Callable, Generator, Optional, Union
+
+from openai import NOT_GIVEN, AzureOpenAI
+from openai.types.chat import ChatCompletionMessage, ParsedChatCompletionMessage
+
+from .llm import LLM
+from .shared_clients import get_http_client, get_token_provider
+
+import logging
+logger = logging.getLogger(__name__)
+
+class CacheMetrics:
+    """
+    Hit-rate counters of an LLM cache, shared by all the CachedLLM using the same cache.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def record(self, kind: str):
+        with self.lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return (self.hits + self.semantic_hits) / lookups if lookups else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+class LLMCache(ABC):
+    """
+    Storage of the cached LLM responses.
+
+    Entries are stored under an exact key, and grouped by scope (everything in the request but the last message content)
+    for the embedding-similarity lookups.
+
+    Args:
+        max_size (int): The maximum number of entries, the least recently used ones are evicted first.
+        ttl (float): The time to live of an entry in seconds, None to never expire.
+    """
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = 24 * 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.metrics = CacheMetrics()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, scope: str, value: dict, embedding: list[float] = None):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def embeddings(self, scope: str) -> list[tuple[str, list[float]]]:
+        """
+        The (key, embedding) of the entries in the given scope.
+        """
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+class InMemoryLLMCache(LLMCache):
+    """
+    Process-local LRU cache.
+    """
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = 24 * 3600):
+        super().__init__(max_size, ttl)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry["created_at"]):
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry["value"]
+
+    def set(self, key: str, scope: str, value: dict, embedding: list[float] = None):
+        with self.lock:
+            self.entries[key] = {"scope": scope, "value": value, "embedding": embedding, "created_at": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def embeddings(self, scope: str) -> list[tuple[str, list[float]]]:
+        with self.lock:
+            return [(key, entry["embedding"]) for key, entry in self.entries.items()
+                    if entry["scope"] == scope and entry["embedding"] is not None and not self._expired(entry["created_at"])]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class SQLiteLLMCache(LLMCache):
+    """
+    Disk cache backed by SQLite, shared by the processes of the same host and surviving restarts.
+
+    Args:
+        path (str): The SQLite database file.
+        max_size (int): The maximum number of entries, the least recently used ones are evicted first.
+        ttl (float): The time to live of an entry in seconds, None to never expire.
+    """
+    def __init__(self, path: str, max_size: int = 10000, ttl: Optional[float] = 24 * 3600):
+        super().__init__(max_size, ttl)
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                value TEXT NOT NULL,
+                embedding TEXT,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_scope ON llm_cache (scope)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache (accessed_at)")
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            row = self.connection.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[1]):
+                self.connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            self.connection.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+
+    def set(self, key: str, scope: str, value: dict, embedding: list[float] = None):
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, scope, value, embedding, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, scope, json.dumps(value), json.dumps(embedding) if embedding is not None else None, now, now))
+            self.connection.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,))
+
+    def delete(self, key: str):
+        with self.lock:
+            self.connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def embeddings(self, scope: str) -> list[tuple[str, list[float]]]:
+        min_created_at = time.time() - self.ttl if self.ttl is not None else 0
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT key, embedding FROM llm_cache WHERE scope = ? AND embedding IS NOT NULL AND created_at >= ?",
+                (scope, min_created_at)).fetchall()
+        return [(key, json.loads(embedding)) for key, embedding in rows]
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM llm_cache")
+
+class CachedLLM(LLM):
+    """
+    LLM wrapper that serves repeated requests from a cache.
+
+    Requests are keyed on the normalized messages, tools, temperature and response_format. Requests with tools are never cached,
+    as the tool results must be fresh. Sampled requests (temperature > 0) are not cached either unless cache_sampled is set:
+    their answer is not meant to be reused. Cache hits report zero usage.
+
+    Callers rejecting a cached answer (e.g. an invalid next speaker) must call invalidate (invalidate_async from async code, as it
+    may compute an embedding) before asking again, otherwise the retry is served the same answer.
+
+    Args:
+        llm (LLM): The wrapped language model.
+        cache (LLMCache): The cache storage, usually shared by all the CachedLLM of the process.
+        embedding_function (Callable[[str], list[float]]): Enables the embedding-similarity tier: on exact miss, a response cached for a request
+            differing only by the last message content is reused when the contents are similar enough. Sync or async, the sync ones
+            are run in a worker thread by the async calls.
+        similarity_threshold (float): The minimum cosine similarity of the embedding-similarity tier.
+        cache_sampled (bool): Whether to also cache the requests with a temperature above 0.
+    """
+    def __init__(self, llm: LLM, cache: LLMCache, embedding_function: Callable[[str], Union[list[float], Awaitable[list[float]]]] = None,
+                 similarity_threshold: float = 0.95, cache_sampled: bool = False):
+        super().__init__(llm.config)
+        self.llm = llm
+        self.cache = cache
+        self.embedding_function = embedding_function
+        self.similarity_threshold = similarity_threshold
+        self.cache_sampled = cache_sampled
+
+    def _bypass(self, tools: list, temperature: float) -> bool:
+        if tools or (temperature and not self.cache_sampled):
+            self.cache.metrics.record("bypassed")
+            return True
+        return False
+
+    def ask(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN):
+        kwargs = {} if response_format is NOT_GIVEN else {"response_format": response_format}
+        if self._bypass(tools, temperature):
+            return self.llm.ask(messages=messages, tools=tools, tools_function=tools_function, temperature=temperature, **kwargs)
+
+        key, scope, text = self._cache_key(messages, temperature, response_format)
+        cached = self._lookup(key)
+        embedding = None
+        if cached is None and self.embedding_function is not None and text:
+            embedding = self._embed(text)
+            cached = self._semantic_lookup(scope, embedding)
+        if cached is not None:
+            return message_from_dict(cached, response_format), cached_usage()
+        self.cache.metrics.record("misses")
+
+        response, usage = self.llm.ask(messages=messages, tools=tools, tools_function=tools_function, temperature=temperature, **kwargs)
+        self.cache.set(key, scope, message_to_dict(response), embedding)
+        return response, usage
+
+    async def ask_async(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN):
+        kwargs = {} if response_format is NOT_GIVEN else {"response_format": response_format}
+        if self._bypass(tools, temperature):
+            return await self.llm.ask_async(messages=messages, tools=tools, tools_function=tools_function, temperature=temperature, **kwargs)
+
+        key, scope, text = self._cache_key(messages, temperature, response_format)
+        cached = self._lookup(key)
+        embedding = None
+        if cached is None and self.embedding_function is not None and text:
+            # The embedding is an HTTP call, keep it off the event loop
+            embedding = await self._embed_async(text)
+            cached = self._semantic_lookup(scope, embedding)
+        if cached is not None:
+            return message_from_dict(cached, response_format), cached_usage()
+        self.cache.metrics.record("misses")
+
+        response, usage = await self.llm.ask_async(messages=messages, tools=tools, tools_function=tools_function, temperature=temperature, **kwargs)
+        self.cache.set(key, scope, message_to_dict(response), embedding)
+        return response, usage
+
+    def ask_stream(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7) -> Generator[tuple[str, any], None, tuple[dict, any]]:
+        if self._bypass(tools, temperature):
+            return (yield from self.llm.ask_stream(messages=messages, tools=tools, tools_function=tools_function, temperature=temperature))
+
+        key, scope, text = self._cache_key(messages, temperature, NOT_GIVEN)
+        cached = self._lookup(key)
+        embedding = None
+        if cached is None and self.embedding_function is not None and text:
+            embedding = self._embed(text)
+            cached = self._semantic_lookup(scope, embedding)
+        if cached is not None:
+            # Replay the cached response as a single delta
+            response_message = {"content": cached.get("content") or "", "role": "assistant"}
+            yield ["start", ""]
+            yield ["delta", {"content": response_message["content"]}]
+            yield ["response", [response_message, cached_usage()]]
+            yield ["end", ""]
+            return [response_message, cached_usage()]
+        self.cache.metrics.record("misses")
+
+        result = None
+        for mark, content in self.llm.ask_stream(messages=messages, tools=tools, tools_function=tools_function, temperature=temperature):
+            if mark == "response" and content is not None:
+                result = content
+                self.cache.set(key, scope, message_to_dict(content[0]), embedding)
+            yield [mark, content]
+        return result
+
+    def invalidate(self, messages: list, temperature: float = 0.7, response_format = NOT_GIVEN):
+        """
+        Drop the response cached for this request: the exact entry and, with the embedding-similarity tier, the similar entries that would serve it.
+        """
+        key, scope, text = self._cache_key(messages, temperature, response_format)
+        self._delete(key, scope, self._embed(text) if self.embedding_function is not None and text else None)
+
+    async def invalidate_async(self, messages: list, temperature: float = 0.7, response_format = NOT_GIVEN):
+        key, scope, text = self._cache_key(messages, temperature, response_format)
+        self._delete(key, scope, await self._embed_async(text) if self.embedding_function is not None and text else None)
+
+    def _delete(self, key: str, scope: str, embedding: Optional[list[float]]):
+        self.cache.delete(key)
+        if embedding is not None:
+            for candidate_key, candidate in self.cache.embeddings(scope):
+                if cosine_similarity(embedding, candidate) >= self.similarity_threshold:
+                    self.cache.delete(candidate_key)
+        logger.debug("LLM cache entry invalidated: %s", key)
+
+    def _cache_key(self, messages: list, temperature: float, response_format) -> tuple[str, str, str]:
+        """
+        Returns the exact key, the scope (the request without the last message content) and the last message content.
+        """
+        normalized = [normalize_message(message) for message in messages]
+        text = content_text(normalized[-1].get("content")) if normalized else ""
+        scope_request = {
+            "model": self.config.get("azure_deployment"),
+            "messages": normalized[:-1] + [{k: v for k, v in normalized[-1].items() if k != "content"}] if normalized else [],
+            "temperature": temperature,
+            "response_format": response_format_key(response_format),
+        }
+        scope = sha256(scope_request)
+        return sha256({"scope": scope, "content": text}), scope, text
+
+    def _embed(self, text: str) -> list[float]:
+        if inspect.iscoroutinefunction(self.embedding_function):
+            raise TypeError("An async embedding function can only be used by ask_async")
+        return self.embedding_function(text)
+
+    async def _embed_async(self, text: str) -> list[float]:
+        if inspect.iscoroutinefunction(self.embedding_function):
+            return await self.embedding_function(text)
+        return await asyncio.to_thread(self.embedding_function, text)
+
+    def _lookup(self, key: str) -> Optional[dict]:
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.debug("LLM cache hit: %s", key)
+            self.cache.metrics.record("hits")
+        return cached
+
+    def _semantic_lookup(self, scope: str, embedding: list[float]) -> Optional[dict]:
+        """
+        The response cached for the most similar request of the scope, if similar enough.
+        """
+        best_key, best_similarity = None, self.similarity_threshold
+        for candidate_key, candidate in self.cache.embeddings(scope):
+            similarity = cosine_similarity(embedding, candidate)
+            if similarity >= best_similarity:
+                best_key, best_similarity = candidate_key, similarity
+        if best_key is None:
+            return None
+        cached = self.cache.get(best_key)
+        if cached is not None:
+            logger.debug("LLM cache semantic hit: %s (similarity %.4f)", best_key, best_similarity)
+            self.cache.metrics.record("semantic_hits")
+        return cached
+
+def normalize_message(message) -> dict:
+    """
+    Reduce a message (dict or OpenAI message object) to the fields relevant for the completion, with stripped text.
+    """
+    if not isinstance(message, dict):
+        message = message.model_dump(exclude_none=True)
+    normalized = {key: message[key] for key in ("role", "name", "content", "tool_calls", "tool_call_id") if message.get(key) is not None}
+    if isinstance(normalized.get("content"), str):
+        normalized["content"] = normalized["content"].strip()
+    return normalized
+
+def content_text(content) -> str:
+    if isinstance(content, list):
+        return json.dumps(content, sort_keys=True)
+    return content or ""
+
+def response_format_key(response_format):
+    if response_format is NOT_GIVEN or response_format is None:
+        return None
+    if hasattr(response_format, "model_json_schema"):
+        return {"name": response_format.__name__, "schema": response_format.model_json_schema()}
+    return response_format
+
+def sha256(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+def cosine_similarity(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+def cached_usage() -> dict:
+    return {"completion_tokens": 0, "prompt_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+
+def message_to_dict(message) -> dict:
+    """
+    Serialize a response message (OpenAI message object or streamed dict) to JSON-compatible data.
+    """
+    if isinstance(message, dict):
+        return json.loads(json.dumps(message, default=str))
+    return message.model_dump(mode="json")
+
+def message_from_dict(data: dict, response_format = NOT_GIVEN):
+    """
+    Rebuild the response message returned by AzureOpenAILLM.ask, with the parsed structured output when response_format is given.
+    """
+    if response_format is NOT_GIVEN or response_format is None:
+        return ChatCompletionMessage.model_validate(data)
+    return ParsedChatCompletionMessage[response_format].model_validate(data)
+
+def create_azure_openai_embedding_function(config: dict) -> Callable[[str], list[float]]:
+    """
+    Embedding function for the embedding-similarity tier of CachedLLM.
+
+    Args:
+    - config: dict with the following
+        - azure_deployment: str, Azure embedding deployment name
+        - azure_endpoint: str, Azure endpoint
+        - api_version: str, API version
+        - dimensions: int, optional, the embedding dimensions
+    """
+    client = AzureOpenAI(
+        azure_endpoint=config['azure_endpoint'],
+        api_version=config['api_version'],
+        azure_ad_token_provider=get_token_provider(),
+        http_client=get_http_client())
+
+    def embed(text: str) -> list[float]:
+        response = client.embeddings.create(input=[text], model=config['azure_deployment'], dimensions=config.get('dimensions') or NOT_GIVEN)
+        return response.data[0].embedding
+
+    return embed
+
+def create_llm_cache(path: str = None, max_size: int = 10000, ttl: Optional[float] = 24 * 3600) -> LLMCache:
+    """
+    Create a SQLite cache at path, or an in-memory cache when no path is given.
+    """
+    if path:
+        return SQLiteLLMCache(path, max_size=max_size, ttl=ttl)
+    return InMemoryLLMCache(max_size=max_size, ttl=ttl)
@@ -0,0 +1,350 @@
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Generator, Optional
+
+from openai import NOT_GIVEN
+
+from .llm import LLM, AzureOpenAILLM
+from .throttling import RetryPolicy, get_rate_limiter
+
+import logging
+logger = logging.getLogger(__name__)
+
+class PoolEndpoint:
+    """
+    A deployment of the pool, with its health and performance statistics.
+
+    Args:
+        name (str): The name of the endpoint, used in logs.
+        config (dict): The endpoint configuration (azure_endpoint, azure_deployment, api_version, tokens_per_minute, ...).
+        weight (float): The relative share of traffic of the endpoint.
+        target (Any): What the pool users call, e.g. an LLM or a Semantic Kernel chat completion service.
+    """
+    def __init__(self, name: str, config: dict, weight: float = 1.0, target: Any = None):
+        self.name = name
+        self.config = config
+        self.weight = weight
+        self.target = target
+        self.rate_limiter = get_rate_limiter(config.get('azure_endpoint'), config.get('azure_deployment'),
+                                             config.get('tokens_per_minute'), config.get('requests_per_minute'))
+        self.latency = None
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.probing = False
+
+    def quota_factor(self) -> float:
+        """
+        The fraction of the TPM quota still available, 1 when the quota is unknown.
+        """
+        tokens_per_minute = self.rate_limiter.tokens_per_minute
+        if not tokens_per_minute:
+            return 1.0
+        remaining = self.rate_limiter.remaining()["tokens"]
+        # Never zero, an endpoint out of quota is still better than no endpoint at all
+        return max(remaining / tokens_per_minute, 0.01)
+
+    def score(self, default_latency: float) -> float:
+        return self.weight * self.quota_factor() / (self.latency or default_latency)
+
+class EndpointPool:
+    """
+    Spreads calls across a pool of deployments, using their weights, observed latency (EWMA) and remaining quota.
+
+    An endpoint failing max_failures times in a row is ejected for ejection_seconds (doubled at every new ejection, up to max_ejection_seconds);
+    once the ejection expires a single probe call is let through, and the endpoint is readmitted when the probe succeeds.
+
+    Only the endpoint failures (throttling, 5xx, timeouts, connection errors) count and fail over. The other errors (e.g. 400 BadRequest,
+    content filter, parsing errors, exceptions raised by the tools) are raised immediately: another endpoint would fail the same way,
+    and the tools would run again.
+
+    Args:
+        endpoints (list[PoolEndpoint]): The endpoints of the pool.
+        max_failures (int): The consecutive failures ejecting an endpoint.
+        ejection_seconds (float): The first ejection duration.
+        max_ejection_seconds (float): The maximum ejection duration.
+        latency_alpha (float): The smoothing factor of the latency EWMA.
+        retry_policy (RetryPolicy): Classifies the errors, those it retries are endpoint failures.
+    """
+    def __init__(self, endpoints: list[PoolEndpoint], max_failures: int = 3, ejection_seconds: float = 10.0, max_ejection_seconds: float = 300.0, latency_alpha: float = 0.2,
+                 retry_policy: RetryPolicy = None):
+        if not endpoints:
+            raise ValueError("The pool requires at least one endpoint.")
+        self.endpoints = endpoints
+        self.max_failures = max_failures
+        self.ejection_seconds = ejection_seconds
+        self.max_ejection_seconds = max_ejection_seconds
+        self.latency_alpha = latency_alpha
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.lock = threading.Lock()
+
+    def select(self, exclude: list[PoolEndpoint] = ()) -> PoolEndpoint:
+        """
+        Pick an endpoint, weighted random by score among the healthy ones. Falls back to the endpoint closest to readmission when all are ejected.
+        """
+        with self.lock:
+            now = time.monotonic()
+            candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+            if not candidates:
+                candidates = list(self.endpoints)
+
+            # An ejected endpoint whose ejection has expired gets a single probe
+            for endpoint in candidates:
+                if endpoint.ejected_until and endpoint.ejected_until <= now and not endpoint.probing:
+                    endpoint.probing = True
+                    logger.info("[Pool] probing endpoint %s", endpoint.name)
+                    return endpoint
+
+            healthy = [endpoint for endpoint in candidates if not endpoint.ejected_until]
+            if not healthy:
+                endpoint = min(candidates, key=lambda e: e.ejected_until)
+                logger.warning("[Pool] all endpoints ejected, falling back to %s", endpoint.name)
+                return endpoint
+
+            latencies = [endpoint.latency for endpoint in healthy if endpoint.latency]
+            default_latency = sum(latencies) / len(latencies) if latencies else 1.0
+            scores = [endpoint.score(default_latency) for endpoint in healthy]
+            return random.choices(healthy, weights=scores)[0]
+
+    def report_success(self, endpoint: PoolEndpoint, latency: Optional[float] = None):
+        with self.lock:
+            if endpoint.ejected_until:
+                logger.info("[Pool] endpoint %s readmitted", endpoint.name)
+            endpoint.failures = 0
+            endpoint.ejected_until = 0.0
+            endpoint.probing = False
+            if latency is not None:
+                endpoint.latency = latency if endpoint.latency is None else self.latency_alpha * latency + (1 - self.latency_alpha) * endpoint.latency
+
+    def is_endpoint_failure(self, error: Exception) -> bool:
+        """
+        Whether the error is caused by the endpoint, including when wrapped by another exception (e.g. by Semantic Kernel).
+        """
+        seen = set()
+        while error is not None and id(error) not in seen:
+            if self.retry_policy.is_retryable(error):
+                return True
+            seen.add(id(error))
+            error = error.__cause__ or error.__context__
+        return False
+
+    def report_error(self, endpoint: PoolEndpoint, error: Exception) -> bool:
+        """
+        Report the error of a call: a failure of the endpoint, or a success when the endpoint answered and the error is not its own.
+        Returns whether the error is an endpoint failure, to fail over.
+        """
+        if self.is_endpoint_failure(error):
+            self.report_failure(endpoint, error)
+            return True
+        # The endpoint is up (this also ends a probe), no latency sample
+        self.report_success(endpoint)
+        return False
+
+    def report_failure(self, endpoint: PoolEndpoint, error: Exception = None):
+        with self.lock:
+            endpoint.failures += 1
+            if endpoint.probing or endpoint.failures >= self.max_failures:
+                previous = endpoint.ejected_until
+                duration = min(self.ejection_seconds * 2 ** max(endpoint.failures - self.max_failures, 0), self.max_ejection_seconds)
+                endpoint.ejected_until = time.monotonic() + duration
+                endpoint.probing = False
+                if not previous:
+                    logger.warning("[Pool] endpoint %s ejected for %.0fs after %s failures: %s", endpoint.name, duration, endpoint.failures, error)
+
+    def call(self, func: Callable[[PoolEndpoint], Any], max_attempts: int = None, can_fail_over: Callable[[], bool] = None):
+        """
+        Call func with a selected endpoint, failing over to the other endpoints on endpoint failures.
+
+        Args:
+            func (Callable[[PoolEndpoint], Any]): The call.
+            max_attempts (int): The maximum number of endpoints tried, defaults to all of them.
+            can_fail_over (Callable[[], bool]): Whether the failed call can still be replayed on another endpoint, e.g. not once it had side effects.
+        """
+        max_attempts = max_attempts or len(self.endpoints)
+        tried = []
+        while True:
+            endpoint = self.select(exclude=tried)
+            started = time.perf_counter()
+            try:
+                result = func(endpoint)
+            except Exception as e:
+                if not self.report_error(endpoint, e):
+                    raise
+                tried.append(endpoint)
+                if len(tried) >= max_attempts or not self._can_fail_over(endpoint, can_fail_over):
+                    raise
+                logger.warning("[Pool] call to endpoint %s failed, failing over: %s", endpoint.name, e)
+                continue
+            self.report_success(endpoint, time.perf_counter() - started)
+            return result
+
+    async def call_async(self, func: Callable[[PoolEndpoint], Any], max_attempts: int = None, can_fail_over: Callable[[], bool] = None):
+        max_attempts = max_attempts or len(self.endpoints)
+        tried = []
+        while True:
+            endpoint = self.select(exclude=tried)
+            started = time.perf_counter()
+            try:
+                result = await func(endpoint)
+            except Exception as e:
+                if not self.report_error(endpoint, e):
+                    raise
+                tried.append(endpoint)
+                if len(tried) >= max_attempts or not self._can_fail_over(endpoint, can_fail_over):
+                    raise
+                logger.warning("[Pool] call to endpoint %s failed, failing over: %s", endpoint.name, e)
+                continue
+            self.report_success(endpoint, time.perf_counter() - started)
+            return result
+
+    def _can_fail_over(self, endpoint: PoolEndpoint, can_fail_over: Optional[Callable[[], bool]]) -> bool:
+        if can_fail_over is None or can_fail_over():
+            return True
+        logger.warning("[Pool] call to endpoint %s failed after side effects, not failing over", endpoint.name)
+        return False
+
+    def stats(self) -> list[dict]:
+        with self.lock:
+            now = time.monotonic()
+            return [{
+                "name": endpoint.name,
+                "weight": endpoint.weight,
+                "latency": endpoint.latency,
+                "failures": endpoint.failures,
+                "ejected_for": max(endpoint.ejected_until - now, 0) if endpoint.ejected_until else 0,
+                "remaining": endpoint.rate_limiter.remaining(),
+            } for endpoint in self.endpoints]
+
+class PooledLLM(LLM):
+    """
+    LLM spreading the calls across a pool of Azure OpenAI deployments, with failover.
+
+    A call fails over only while no tool has run: replaying it on another endpoint would run the tools again.
+    Streamed calls fail over only until the first delta has been produced (the tool calls are streamed before they run).
+
+    Args:
+    - pool: EndpointPool whose endpoint targets are LLM instances, see create_llm_pool
+    """
+    def __init__(self, pool: EndpointPool):
+        super().__init__(pool.endpoints[0].config)
+        self.pool = pool
+
+    def ask(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN):
+        kwargs = {} if response_format is NOT_GIVEN else {"response_format": response_format}
+        tool_calls = []
+        tools_function = self._tracking_tools(tools_function, tool_calls)
+        return self.pool.call(lambda endpoint: endpoint.target.ask(
+            messages=list(messages), tools=tools, tools_function=tools_function, temperature=temperature, **kwargs),
+            can_fail_over=lambda: not tool_calls)
+
+    async def ask_async(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN):
+        kwargs = {} if response_format is NOT_GIVEN else {"response_format": response_format}
+        tool_calls = []
+        tools_function = self._tracking_tools(tools_function, tool_calls)
+        return await self.pool.call_async(lambda endpoint: endpoint.target.ask_async(
+            messages=list(messages), tools=tools, tools_function=tools_function, temperature=temperature, **kwargs),
+            can_fail_over=lambda: not tool_calls)
+
+    def _tracking_tools(self, tools_function: dict[str, callable], tool_calls: list) -> Optional[dict[str, callable]]:
+        """
+        The tool functions, appending their name to tool_calls when they start. Async functions stay async.
+        """
+        if not tools_function:
+            return tools_function
+
+        def track(name, function):
+            if inspect.iscoroutinefunction(function):
+                async def tracked_async(**kwargs):
+                    tool_calls.append(name)
+                    return await function(**kwargs)
+                return tracked_async
+
+            def tracked(**kwargs):
+                tool_calls.append(name)
+                return function(**kwargs)
+            return tracked
+
+        return {name: track(name, function) for name, function in tools_function.items()}
+
+    def ask_stream(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7) -> Generator[tuple[str, any], None, tuple[dict, any]]:
+        tried = []
+        while True:
+            endpoint = self.pool.select(exclude=tried)
+            started = time.perf_counter()
+            start = None
+            answered = False
+            try:
+                for mark, content in endpoint.target.ask_stream(messages=list(messages), tools=tools, tools_function=tools_function, temperature=temperature):
+                    if not answered:
+                        if mark == "start":
+                            # Hold the start mark until the endpoint has actually answered, so that the call can still fail over
+                            start = [mark, content]
+                            continue
+                        answered = True
+                        self.pool.report_success(endpoint, time.perf_counter() - started)
+                        if start is not None:
+                            yield start
+                    yield [mark, content]
+            except Exception as e:
+                if not self.pool.report_error(endpoint, e):
+                    raise
+                tried.append(endpoint)
+                if answered or len(tried) >= len(self.pool.endpoints):
+                    raise
+                logger.warning("[Pool] stream from endpoint %s failed, failing over: %s", endpoint.name, e)
+                continue
+            return
+
+def endpoint_configs_from_env() -> list[dict]:
+    """
+    The endpoint configurations of the pool, from AZURE_OPENAI_ENDPOINTS, a JSON list of objects with:
+    endpoint, deployment, api_version (optional), api_key (optional, defaults to Entra ID authentication), weight (optional), tpm (optional), rpm (optional), max_retries (optional, defaults to 1
+    to fail over quickly).
+
+    Falls back to the single AZURE_OPENAI_ENDPOINT/AZURE_OPENAI_DEPLOYMENT_NAME deployment.
+    """
+    api_version = os.getenv("AZURE_OPENAI_API_VERSION")
+    tokens_per_minute = int(os.getenv("AZURE_OPENAI_TPM", "0")) or None
+    requests_per_minute = int(os.getenv("AZURE_OPENAI_RPM", "0")) or None
+    endpoints = os.getenv("AZURE_OPENAI_ENDPOINTS")
+    if not endpoints:
+        return [{
+            "azure_endpoint": os.getenv("AZURE_OPENAI_ENDPOINT"),
+            "azure_deployment": os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+            "api_version": api_version,
+            "api_key": os.getenv("AZURE_OPENAI_KEY") or None,
+            "tokens_per_minute": tokens_per_minute,
+            "requests_per_minute": requests_per_minute,
+            "max_retries": int(os.getenv("AZURE_OPENAI_MAX_RETRIES", "5")),
+            "weight": 1.0,
+        }]
+    return [{
+        "azure_endpoint": endpoint["endpoint"],
+        "azure_deployment": endpoint["deployment"],
+        "api_version": endpoint.get("api_version", api_version),
+        "api_key": endpoint.get("api_key"),
+        "tokens_per_minute": endpoint.get("tpm"),
+        "requests_per_minute": endpoint.get("rpm"),
+        "max_retries": int(endpoint.get("max_retries", 1)),
+        "weight": float(endpoint.get("weight", 1.0)),
+    } for endpoint in json.loads(endpoints)]
+
+def create_endpoint_pool(configs: list[dict], create_target: Callable[[dict], Any], **kwargs) -> EndpointPool:
+    """
+    Create a pool with one endpoint per configuration, the target of each endpoint being created by create_target(config).
+    """
+    endpoints = [PoolEndpoint(name=f"{config['azure_deployment']}@{config['azure_endpoint']}",
+                              config=config,
+                              weight=config.get("weight", 1.0),
+                              target=create_target(config))
+                 for config in configs]
+    return EndpointPool(endpoints, **kwargs)
+
+def create_llm_pool(configs: list[dict], **kwargs) -> EndpointPool:
+    """
+    Create a pool of AzureOpenAILLM, to be used with PooledLLM.
+    """
+    return create_endpoint_pool(configs, AzureOpenAILLM, **kwargs)
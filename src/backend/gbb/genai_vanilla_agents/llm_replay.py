@@ -0,0 +1,253 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Generator, Optional
+
+from openai import NOT_GIVEN
+
+from .llm import LLM, execute_tool_call
+from .llm_cache import message_from_dict, message_to_dict, normalize_message, response_format_key, sha256
+
+import logging
+logger = logging.getLogger(__name__)
+
+def request_key(messages: list, tools: list = None, temperature: float = 0.7, response_format = NOT_GIVEN) -> str:
+    """
+    The key matching a replayed exchange to a request. The deployment is not part of the key, so that cassettes can be replayed with any configuration.
+    """
+    return sha256({
+        "messages": [normalize_message(message) for message in messages],
+        "tools": [tool["function"]["name"] for tool in tools] if tools else None,
+        "temperature": temperature,
+        "response_format": response_format_key(response_format),
+    })
+
+class Cassette:
+    """
+    A JSONL file of recorded LLM exchanges, one per line.
+
+    Each exchange has: key, kind ("ask" or "stream"), response (the final message), usage, latency (seconds),
+    tool_calls (name, arguments and result of the tools executed during the exchange) and, for streams, the updates with their time offsets.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def append(self, exchange: dict):
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(exchange, ensure_ascii=False, default=str))
+                file.write("\n")
+
+    def load(self) -> list[dict]:
+        with open(self.path, "r", encoding="utf-8") as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+class RecordingLLM(LLM):
+    """
+    LLM wrapper recording every exchange with the wrapped LLM to a cassette, including tool calls, chunk timing and usage.
+
+    Args:
+        llm (LLM): The recorded language model, usually an AzureOpenAILLM.
+        cassette (Cassette): Where the exchanges are appended.
+    """
+    def __init__(self, llm: LLM, cassette: Cassette):
+        super().__init__(llm.config)
+        self.llm = llm
+        self.cassette = cassette
+
+    def _recording_tools(self, tools_function: dict[str, callable], tool_calls: list) -> Optional[dict[str, callable]]:
+        if tools_function is None:
+            return None
+        lock = threading.Lock()
+
+        def record(name, function):
+            def recorded(**kwargs):
+                result = function(**kwargs)
+                with lock:
+                    tool_calls.append({"name": name, "arguments": kwargs, "result": result})
+                return result
+            return recorded
+
+        return {name: record(name, function) for name, function in tools_function.items()}
+
+    def _exchange(self, kind: str, key: str, response, usage, latency: float, tool_calls: list, updates: list = None) -> dict:
+        exchange = {
+            "key": key,
+            "kind": kind,
+            "response": message_to_dict(response) if response is not None else None,
+            "usage": usage,
+            "latency": latency,
+            "tool_calls": tool_calls,
+        }
+        if updates is not None:
+            exchange["updates"] = updates
+        return exchange
+
+    def ask(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN):
+        kwargs = {} if response_format is NOT_GIVEN else {"response_format": response_format}
+        key = request_key(messages, tools, temperature, response_format)
+        tool_calls = []
+        started = time.perf_counter()
+        response, usage = self.llm.ask(messages=messages, tools=tools, tools_function=self._recording_tools(tools_function, tool_calls), temperature=temperature, **kwargs)
+        self.cassette.append(self._exchange("ask", key, response, usage, time.perf_counter() - started, tool_calls))
+        return response, usage
+
+    async def ask_async(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN):
+        kwargs = {} if response_format is NOT_GIVEN else {"response_format": response_format}
+        key = request_key(messages, tools, temperature, response_format)
+        tool_calls = []
+        started = time.perf_counter()
+        response, usage = await self.llm.ask_async(messages=messages, tools=tools, tools_function=self._recording_tools(tools_function, tool_calls), temperature=temperature, **kwargs)
+        self.cassette.append(self._exchange("ask", key, response, usage, time.perf_counter() - started, tool_calls))
+        return response, usage
+
+    def ask_stream(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7) -> Generator[tuple[str, any], None, tuple[dict, any]]:
+        key = request_key(messages, tools, temperature)
+        tool_calls = []
+        updates = []
+        response, usage = None, None
+        started = time.perf_counter()
+        for mark, content in self.llm.ask_stream(messages=messages, tools=tools, tools_function=self._recording_tools(tools_function, tool_calls), temperature=temperature):
+            updates.append({"offset": time.perf_counter() - started, "mark": mark, "content": content})
+            if mark == "response" and content is not None:
+                response, usage = content
+            yield [mark, content]
+        self.cassette.append(self._exchange("stream", key, response, usage, time.perf_counter() - started, tool_calls, json.loads(json.dumps(updates, default=str))))
+        return [response, usage]
+
+class ReplayLLM(LLM):
+    """
+    LLM serving the exchanges of a cassette, deterministically and without network access. Used for offline benchmarks and regression tests.
+
+    Exchanges are matched on the request (messages, tools, temperature, response_format); exchanges recorded several times for the same request
+    are served in order, cycling when exhausted.
+
+    Args:
+        cassette (Cassette): The recorded exchanges.
+        latency (str): The latency profile:
+            - "none": no delay.
+            - "fixed": fixed_latency seconds per call (streams: before the first update).
+            - "recorded": the recorded latency, and for streams the recorded timing of each update.
+            - "percentile": the given percentile of all the recorded latencies, or a latency sampled from them when percentile is None.
+        fixed_latency (float): The latency of the "fixed" profile.
+        percentile (float): The percentile (0-100) of the "percentile" profile.
+        seed (int): The random seed of the sampled latencies.
+        match (str): "request" to match exchanges on the request, "sequence" to serve them in recording order regardless of the request.
+        execute_tools (list[str]): Tools executed again with the recorded arguments, for those updating local state (e.g. conversation variables).
+            The other tools are not called, their recorded results are reported.
+    """
+    def __init__(self, cassette: Cassette, latency: str = "none", fixed_latency: float = 1.0, percentile: Optional[float] = None, seed: int = 42,
+                 match: str = "request", execute_tools: list[str] = ("update_conversation_variable",)):
+        super().__init__({"cassette": cassette.path})
+        if latency not in ("none", "fixed", "recorded", "percentile"):
+            raise ValueError(f"Unknown latency profile: {latency}")
+        if match not in ("request", "sequence"):
+            raise ValueError(f"Unknown match mode: {match}")
+        self.latency = latency
+        self.fixed_latency = fixed_latency
+        self.percentile = percentile
+        self.random = random.Random(seed)
+        self.match = match
+        self.execute_tools = set(execute_tools or [])
+        self.lock = threading.Lock()
+
+        self.exchanges = cassette.load()
+        self.by_key = defaultdict(list)
+        for exchange in self.exchanges:
+            self.by_key[exchange["key"]].append(exchange)
+        self.positions = defaultdict(int)
+        self.sequence = deque(self.exchanges)
+        self.latencies = sorted(exchange["latency"] for exchange in self.exchanges)
+        logger.debug("ReplayLLM loaded %s exchanges from %s", len(self.exchanges), cassette.path)
+
+    def _next_exchange(self, key: str) -> dict:
+        with self.lock:
+            if self.match == "sequence":
+                exchange = self.sequence.popleft()
+                self.sequence.append(exchange)
+                return exchange
+            exchanges = self.by_key.get(key)
+            if not exchanges:
+                raise KeyError(f"No recorded exchange for request {key}")
+            exchange = exchanges[self.positions[key] % len(exchanges)]
+            self.positions[key] += 1
+            return exchange
+
+    def _latency(self, exchange: dict) -> float:
+        if self.latency == "fixed":
+            return self.fixed_latency
+        if self.latency == "recorded":
+            return exchange["latency"]
+        if self.latency == "percentile" and self.latencies:
+            with self.lock:
+                if self.percentile is None:
+                    return self.random.choice(self.latencies)
+            index = min(len(self.latencies) - 1, int(round(self.percentile / 100 * (len(self.latencies) - 1))))
+            return self.latencies[index]
+        return 0.0
+
+    def _replay_tools(self, exchange: dict, tools_function: dict[str, callable]):
+        for tool_call in exchange.get("tool_calls") or []:
+            if tools_function and tool_call["name"] in self.execute_tools and tool_call["name"] in tools_function:
+                execute_tool_call(tools_function, tool_call["name"], json.dumps(tool_call["arguments"]))
+
+    def ask(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN):
+        exchange = self._next_exchange(request_key(messages, tools, temperature, response_format))
+        time.sleep(self._latency(exchange))
+        self._replay_tools(exchange, tools_function)
+        return message_from_dict(exchange["response"], response_format), exchange["usage"]
+
+    async def ask_async(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN):
+        exchange = self._next_exchange(request_key(messages, tools, temperature, response_format))
+        await asyncio.sleep(self._latency(exchange))
+        self._replay_tools(exchange, tools_function)
+        return message_from_dict(exchange["response"], response_format), exchange["usage"]
+
+    def _updates(self, exchange: dict) -> list[dict]:
+        updates = exchange.get("updates")
+        if updates is None:
+            # Exchange recorded with ask, replayed as a stream with a single delta
+            response = exchange["response"]
+            updates = [
+                {"offset": 0.0, "mark": "start", "content": ""},
+                {"offset": exchange["latency"], "mark": "delta", "content": {"content": response.get("content") or ""}},
+                {"offset": exchange["latency"], "mark": "response", "content": [{"content": response.get("content") or "", "role": "assistant"}, exchange["usage"]]},
+                {"offset": exchange["latency"], "mark": "end", "content": ""},
+            ]
+        return updates
+
+    def _delays(self, exchange: dict, updates: list[dict]) -> list[float]:
+        """
+        The delay before each update, according to the latency profile.
+        """
+        if self.latency == "recorded":
+            offsets = [update["offset"] for update in updates]
+            return [max(offset - previous, 0) for previous, offset in zip([0.0] + offsets[:-1], offsets)]
+        delays = [0.0] * len(updates)
+        # The whole latency is spent waiting for the first update after "start"
+        if len(updates) > 1:
+            delays[1] = self._latency(exchange)
+        return delays
+
+    def ask_stream(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7) -> Generator[tuple[str, any], None, tuple[dict, any]]:
+        exchange = self._next_exchange(request_key(messages, tools, temperature))
+        self._replay_tools(exchange, tools_function)
+        updates = self._updates(exchange)
+        for delay, update in zip(self._delays(exchange, updates), updates):
+            if delay > 0:
+                time.sleep(delay)
+            yield [update["mark"], update["content"]]
+        return [exchange["response"], exchange["usage"]]
+
+    async def ask_stream_async(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7):
+        exchange = self._next_exchange(request_key(messages, tools, temperature))
+        self._replay_tools(exchange, tools_function)
+        updates = self._updates(exchange)
+        for delay, update in zip(self._delays(exchange, updates), updates):
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield [update["mark"], update["content"]]
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Generator
+
+from openai import NOT_GIVEN
+
+from .llm import LLM
+
+import logging
+logger = logging.getLogger(__name__)
+
+# The call purposes, each can be served by its own deployment
+LLM_PURPOSES = ("router", "planner", "summarizer", "answerer")
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+class PurposeMetrics:
+    """
+    Process-wide latency and token metrics of the LLM calls, by call purpose.
+
+    Args:
+        window (int): The number of latency samples kept per purpose for the percentiles.
+    """
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.counters = defaultdict(lambda: {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0})
+        self.latencies = defaultdict(lambda: deque(maxlen=self.window))
+        self.first_token_latencies = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, purpose: str, latency: float, usage: dict = None, first_token_latency: float = None, error: bool = False):
+        with self.lock:
+            counters = self.counters[purpose]
+            counters["calls"] += 1
+            if error:
+                counters["errors"] += 1
+            if usage is not None:
+                for key in ("prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens"):
+                    counters[key] += usage.get(key, 0)
+            self.latencies[purpose].append(latency)
+            if first_token_latency is not None:
+                self.first_token_latencies[purpose].append(first_token_latency)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self.lock:
+            return {purpose: {
+                **counters,
+                "latency_p50": percentile(self.latencies[purpose], 50),
+                "latency_p95": percentile(self.latencies[purpose], 95),
+                "first_token_latency_p50": percentile(self.first_token_latencies[purpose], 50),
+            } for purpose, counters in self.counters.items()}
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.latencies.clear()
+            self.first_token_latencies.clear()
+
+purpose_metrics = PurposeMetrics()
+
+class PurposeLLM(LLM):
+    """
+    LLM wrapper tagging the calls with their purpose (router, planner, summarizer, answerer) and recording their latency and usage in PurposeMetrics.
+
+    Args:
+        llm (LLM): The language model serving the purpose, usually configured with a deployment sized for it.
+        purpose (str): The call purpose, see LLM_PURPOSES.
+        metrics (PurposeMetrics): Where the calls are recorded, defaults to the process-wide purpose_metrics.
+    """
+    def __init__(self, llm: LLM, purpose: str, metrics: PurposeMetrics = None):
+        if purpose not in LLM_PURPOSES:
+            raise ValueError(f"Unknown LLM purpose: {purpose}")
+        super().__init__(llm.config)
+        self.llm = llm
+        self.purpose = purpose
+        self.metrics = metrics or purpose_metrics
+
+    def ask(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN):
+        kwargs = {} if response_format is NOT_GIVEN else {"response_format": response_format}
+        started = time.perf_counter()
+        try:
+            response, usage = self.llm.ask(messages=messages, tools=tools, tools_function=tools_function, temperature=temperature, **kwargs)
+        except Exception:
+            self.metrics.record(self.purpose, time.perf_counter() - started, error=True)
+            raise
+        self.metrics.record(self.purpose, time.perf_counter() - started, usage)
+        return response, usage
+
+    async def ask_async(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7, response_format = NOT_GIVEN):
+        kwargs = {} if response_format is NOT_GIVEN else {"response_format": response_format}
+        started = time.perf_counter()
+        try:
+            response, usage = await self.llm.ask_async(messages=messages, tools=tools, tools_function=tools_function, temperature=temperature, **kwargs)
+        except Exception:
+            self.metrics.record(self.purpose, time.perf_counter() - started, error=True)
+            raise
+        self.metrics.record(self.purpose, time.perf_counter() - started, usage)
+        return response, usage
+
+    def invalidate(self, messages: list, temperature: float = 0.7, response_format = NOT_GIVEN):
+        self.llm.invalidate(messages, temperature=temperature, response_format=response_format)
+
+    async def invalidate_async(self, messages: list, temperature: float = 0.7, response_format = NOT_GIVEN):
+        await self.llm.invalidate_async(messages, temperature=temperature, response_format=response_format)
+
+    def ask_stream(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7) -> Generator[tuple[str, any], None, tuple[dict, any]]:
+        started = time.perf_counter()
+        first_token_latency = None
+        usage = None
+        try:
+            for mark, content in self.llm.ask_stream(messages=messages, tools=tools, tools_function=tools_function, temperature=temperature):
+                if mark == "delta" and first_token_latency is None:
+                    first_token_latency = time.perf_counter() - started
+                if mark == "response" and content is not None:
+                    usage = content[1]
+                yield [mark, content]
+        except Exception:
+            self.metrics.record(self.purpose, time.perf_counter() - started, error=True)
+            raise
+        self.metrics.record(self.purpose, time.perf_counter() - started, usage, first_token_latency)
+
+    async def ask_stream_async(self, messages: list, tools: list = None, tools_function: dict[str, callable] = None, temperature: float = 0.7):
+        started = time.perf_counter()
+        first_token_latency = None
+        usage = None
+        try:
+            async for mark, content in self.llm.ask_stream_async(messages=messages, tools=tools, tools_function=tools_function, temperature=temperature):
+                if mark == "delta" and first_token_latency is None:
+                    first_token_latency = time.perf_counter() - started
+                if mark == "response" and content is not None:
+                    usage = content[1]
+                yield [mark, content]
+        except Exception:
+            self.metrics.record(self.purpose, time.perf_counter() - started, error=True)
+            raise
+        self.metrics.record(self.purpose, time.perf_counter() - started, usage, first_token_latency)
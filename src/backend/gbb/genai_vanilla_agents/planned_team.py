@@ -6,6 +6,8 @@ from pydantic import BaseModel
 from .conversation import Conversation, ConversationReadingStrategy
 from .askable import Askable
 from .llm import LLM
+from .run_context import get_run_context
+from .team import roster_version
 
 import logging
 logger = logging.getLogger(__name__)
@@ -25,22 +27,28 @@ class PlannedTeam(Askable):
         fork_conversation (bool): Whether to fork the conversation and avoid writing the messages to the main conversation.
         fork_strategy (ConversationReadingStrategy): The reading strategy to use to select the messages to report output back to the main conversation.
         include_tools_descriptions (bool): Whether to include the tools descriptions in the system prompt to help the orchestrator decide.
+        prompt_layout (str): "default" to send the inquiry in the system prompt, "cache" to keep the system prompt byte-identical across calls
+            (prompt cache friendly) and send the inquiry in the user message instead.
     """
     
     def __init__(self, llm: LLM, description: str, id: str, members: list[Askable], stop_callback: Callable[[list[dict]], bool] = None, 
                  fork_conversation: bool = False,
                  fork_strategy: ConversationReadingStrategy = None,
-                 include_tools_descriptions: bool = False):
+                 include_tools_descriptions: bool = False,
+                 prompt_layout: str = "default"):
         super().__init__(id, description)
         self.agents = members
-        self.plan = None
         self.stop_callback = stop_callback
         self.fork_conversation = fork_conversation
         self.fork_strategy = fork_strategy
         self.include_tools_descriptions = include_tools_descriptions
+        if prompt_layout not in ("default", "cache"):
+            raise ValueError(f"Unknown prompt layout: {prompt_layout}")
+        self.prompt_layout = prompt_layout
         
-        self.current_agent = None
         self.agents_dict = {agent.id: agent for agent in members}
+        # The rendered roster and cache layout prompt, with the roster version they were rendered for
+        self._compiled_prompt = None
         
         self.llm = llm
         
@@ -57,51 +65,107 @@ class PlannedTeam(Askable):
             stream (bool): Whether to stream the conversation updates.
         """
         
-        if self.plan is None:
-            self.plan = self._create_plan(conversation)
-            logger.debug("[PlannedTeam %s] created plan: %s", self.id, self.plan)
+        state = self._run_state()
+        if state.get("plan") is None:
+            state["plan"] = self._create_plan(conversation)
+            logger.debug("[PlannedTeam %s] created plan: %s", self.id, state["plan"])
         
         execution_result = None
         local_conversation = conversation.fork() if self.fork_conversation else conversation
         
         if stream:
             conversation.update(["start", self.id])
-        for step in self.plan:
-            self.current_agent = self.agents_dict[step.agent_id]
-            logger.debug("[PlannedTeam %s] current agent: %s", self.id, self.current_agent.id)
+        for step in state["plan"]:
+            current_agent = self._start_step(local_conversation, step)
             
-            # TODO check behavior
-            local_conversation.messages.append({"role": "assistant", "name": self.id, "content": step.instructions})
-            
-            agent_result = self.current_agent.ask(local_conversation, stream=stream)
+            agent_result = current_agent.ask(local_conversation, stream=stream)
             logger.debug("[PlannedTeam %s] asked current agent with messages: %s", self.id, agent_result)
             
-            if agent_result == "stop":
-                logger.debug("[PlannedTeam %s] stop signal received, ending workflow.", self.id)
-                conversation.log.append(("info", "plannedteam/stop", self.id))
-                execution_result = "agent-stop"
-                break
-            elif agent_result == "error":
-                logger.error("[PlannedTeam %s] error signal received, ending workflow.", self.id)
-                conversation.log.append(("error", "plannedteam/error", self.id))
-                execution_result = "agent-error"
+            execution_result = self._handle_agent_result(conversation, local_conversation, agent_result)
+            if execution_result is not None:
                 break
             
-            if self.stop_callback is not None and self.stop_callback(local_conversation.messages):
-                logger.debug("[PlannedTeam %s] stop callback triggered, ending workflow.", self.id)
-                conversation.log.append(("info", "plannedteam/callback-stop", self.id))
-                execution_result = "callback-stop"
+        self._end_execution(conversation, local_conversation, stream)
+            
+        return execution_result
+
+    async def ask_async(self, conversation: Conversation, stream = False):
+        """
+        Async version of ask: the plan is created and the agents are asked through their async interfaces.
+        
+        Args:
+            conversation (Conversation): The conversation to use for the execution.
+            stream (bool): Whether to stream the conversation updates.
+        """
+        
+        state = self._run_state()
+        if state.get("plan") is None:
+            state["plan"] = await self._create_plan_async(conversation)
+            logger.debug("[PlannedTeam %s] created plan: %s", self.id, state["plan"])
+        
+        execution_result = None
+        local_conversation = conversation.fork() if self.fork_conversation else conversation
+        
+        if stream:
+            conversation.update(["start", self.id])
+        for step in state["plan"]:
+            current_agent = self._start_step(local_conversation, step)
+            
+            agent_result = await current_agent.ask_async(local_conversation, stream=stream)
+            logger.debug("[PlannedTeam %s] asked current agent with messages: %s", self.id, agent_result)
+            
+            execution_result = self._handle_agent_result(conversation, local_conversation, agent_result)
+            if execution_result is not None:
                 break
                 
+        self._end_execution(conversation, local_conversation, stream)
+            
+        return execution_result
+
+    def _run_state(self) -> dict:
+        """
+        The execution state of the team (the plan) in the current run, or of this call only outside of a Workflow run.
+        The team itself holds no execution state, so that it can be shared by concurrent runs.
+        """
+        run = get_run_context()
+        return run.state(self.id) if run is not None else {}
+
+    def _start_step(self, local_conversation: Conversation, step: "TeamPlanStep") -> Askable:
+        current_agent = self.agents_dict[step.agent_id]
+        logger.debug("[PlannedTeam %s] current agent: %s", self.id, current_agent.id)
+        
+        # TODO check behavior
+        local_conversation.messages.append({"role": "assistant", "name": self.id, "content": step.instructions})
+        return current_agent
+
+    def _handle_agent_result(self, conversation: Conversation, local_conversation: Conversation, agent_result: str):
+        """
+        Returns the team execution result when the plan execution must end, None to continue with the next step.
+        """
+        if agent_result == "stop":
+            logger.debug("[PlannedTeam %s] stop signal received, ending workflow.", self.id)
+            conversation.log.append(("info", "plannedteam/stop", self.id))
+            return "agent-stop"
+        elif agent_result == "error":
+            logger.error("[PlannedTeam %s] error signal received, ending workflow.", self.id)
+            conversation.log.append(("error", "plannedteam/error", self.id))
+            return "agent-error"
+        
+        if self.stop_callback is not None and self.stop_callback(local_conversation.messages):
+            logger.debug("[PlannedTeam %s] stop callback triggered, ending workflow.", self.id)
+            conversation.log.append(("info", "plannedteam/callback-stop", self.id))
+            return "callback-stop"
+        
+        return None
+
+    def _end_execution(self, conversation: Conversation, local_conversation: Conversation, stream: bool):
         if stream:
             local_conversation.update(["end", self.id])
             
         if self.fork_conversation:
             conversation.messages.extend(self.fork_strategy.get_messages(local_conversation))
             
-        return execution_result
-
-    def _create_plan(self, conversation: Conversation):
+    def _prepare_plan_messages(self, conversation: Conversation):
         system_prompt = """
 You are a team orchestrator that must create a plan to solve the user inquiry by using the available agents.
 Your task is to create a plan that includes only the agents suitable to help, based on their descriptions.
@@ -131,26 +195,54 @@ You MUST return the plan in the format specified above. DO NOT return anything e
 BE SURE TO READ AGAIN THE INSTUCTIONS ABOVE BEFORE PROCEEDING.
 """
         local_messages = []
-        agents_info = self._generate_agents_info()
+        agents_info, cache_layout_prompt = self._compile_prompt()
         inquiry = conversation.messages[-1]["content"] # TODO pick the first user message
         
+        if self.prompt_layout == "cache":
+            # Static prefix first (instructions and agents), volatile inquiry last
+            local_messages.append({"role": "system", "content": cache_layout_prompt})
+            local_messages.append({"role": "user", "content": f"# INQUIRY\n\n{inquiry}\n\nDefine the plan based on the provided agents and the inquiry."})
+            return local_messages
+        
         local_messages.append({"role": "system", "content": system_prompt.format(agents=agents_info, inquiry=inquiry)})
         local_messages.append({"role": "user", "content": "Define the plan based on the provided agents and the inquiry."})
+        return local_messages
+
+    def _create_plan(self, conversation: Conversation):
+        local_messages = self._prepare_plan_messages(conversation)
         
         # logger.debug("[Team %s] messages for selecting next agent: %s", self.id, local_messages)
         
-        result, usage = self.llm.ask(messages=local_messages, response_format=TeamPlan)
+        result, usage = self.llm.ask(messages=local_messages, temperature=0, response_format=TeamPlan)
+        return self._parse_plan(conversation, result, usage)
+
+    async def _create_plan_async(self, conversation: Conversation):
+        local_messages = self._prepare_plan_messages(conversation)
+        
+        result, usage = await self.llm.ask_async(messages=local_messages, temperature=0, response_format=TeamPlan)
+        return self._parse_plan(conversation, result, usage)
+
+    def _parse_plan(self, conversation: Conversation, result, usage):
         logger.debug("[PlannedTeam %s] result from Azure OpenAI: %s", self.id, result)
         
-        if usage is not None:
-            # Update conversation metrics with response usage
-            conversation.metrics.total_tokens += usage["total_tokens"]
-            conversation.metrics.prompt_tokens += usage["prompt_tokens"]
-            conversation.metrics.completion_tokens += usage["completion_tokens"]
+        # Update conversation metrics with response usage
+        conversation.metrics.add_usage(usage, self.id, getattr(self.llm, "purpose", "planner"))
         
         output = TeamPlan.model_validate(result.parsed)
         return output.plan
     
+    def _compile_prompt(self) -> tuple[str, str]:
+        """
+        The agents info and the cache layout system prompt, rendered again only when the roster changes.
+        """
+        version = roster_version(self.agents)
+        compiled = self._compiled_prompt
+        if compiled is None or compiled[0] != version:
+            agents_info = self._generate_agents_info()
+            compiled = (version, agents_info, CACHE_LAYOUT_PLAN_PROMPT.format(agents=agents_info))
+            self._compiled_prompt = compiled
+        return compiled[1], compiled[2]
+
     def _generate_agents_info(self):
         agents_info = []
         for agent in self.agents:
@@ -167,6 +259,32 @@ BE SURE TO READ AGAIN THE INSTUCTIONS ABOVE BEFORE PROCEEDING.
         
         return "\n".join(agents_info)
     
+CACHE_LAYOUT_PLAN_PROMPT = """
+You are a team orchestrator that must create a plan to solve the user inquiry by using the available agents.
+Your task is to create a plan that includes only the agents suitable to help, based on their descriptions.
+The plan must be a list of agent_id values, in the order they should be executed, along with the proper instructions for each agent.
+The plan must be returned as JSON, with the following structure:
+
+{{
+    "plan": [
+        {{
+            "agent_id": "agent_id",
+            "instructions": "instructions"
+        }},
+        ...
+    ]
+}}
+
+You MUST return the plan in the format specified above. DO NOT return anything else.
+The inquiry is provided in the user message.
+
+# AVAILABLE AGENTS
+
+{agents}
+
+BE SURE TO READ AGAIN THE INSTUCTIONS ABOVE BEFORE PROCEEDING.
+"""
+
 class TeamPlanStep(BaseModel):
     agent_id: Annotated[str, "The agent_id of the agent to execute"]
     instructions: Annotated[str, "The instructions for the agent"]
@@ -78,11 +78,11 @@ class RESTConnection(Connection):
         return result
 
 class RemoteAskable(Askable):
-    def __init__(self, id: str, connection: Connection, reading_strategy: ConversationReadingStrategy = AllMessagesStrategy()):
+    def __init__(self, id: str, connection: Connection, reading_strategy: ConversationReadingStrategy = None):
         super().__init__("", "")
         self.connection = connection
         self.id = id
-        self.reading_strategy = reading_strategy
+        self.reading_strategy = reading_strategy or AllMessagesStrategy()
         
         response = self.connection.send(self.id, "describe", {})
         self.description = response["description"]        
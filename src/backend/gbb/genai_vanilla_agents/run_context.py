@@ -0,0 +1,123 @@
+import contextvars
+import functools
+import inspect
+import json
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+from pydantic import BaseModel
+
+import logging
+logger = logging.getLogger(__name__)
+
+def canonical_arguments(arguments: dict) -> str:
+    """
+    The canonical JSON of tool arguments: sorted keys, no whitespace, pydantic models dumped.
+    """
+    return json.dumps(arguments, sort_keys=True, separators=(",", ":"),
+                      default=lambda value: value.model_dump() if isinstance(value, BaseModel) else str(value))
+
+class ToolMemo:
+    """
+    Results of the tool calls of a run, keyed by tool name and canonical arguments, so that a call repeated
+    with the same arguments (by the same agent or by another one) is served without a Cosmos DB / AI Search round-trip.
+
+    Failed calls are not memoized.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str, arguments: dict) -> tuple[bool, Any]:
+        key = (name, canonical_arguments(arguments))
+        with self.lock:
+            if key in self.results:
+                self.hits += 1
+                return True, self.results[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, name: str, arguments: dict, result: Any):
+        with self.lock:
+            self.results[(name, canonical_arguments(arguments))] = result
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+class RunContext:
+    """
+    State scoped to a single Workflow run and shared by all the agents taking part in it.
+
+    The execution state of the teams lives here, not on the team instances, so that the teams and agents can be shared by concurrent runs.
+    """
+    def __init__(self):
+        self.tool_memo = ToolMemo()
+        self.lock = threading.Lock()
+        self.states = {}
+
+    def state(self, owner_id: str) -> dict:
+        """
+        The execution state of an askable in this run (e.g. the plan of a PlannedTeam), by askable id.
+        """
+        with self.lock:
+            return self.states.setdefault(owner_id, {})
+
+_current_run: contextvars.ContextVar[Optional[RunContext]] = contextvars.ContextVar("current_run", default=None)
+
+def get_run_context() -> Optional[RunContext]:
+    """
+    The context of the current run, None outside of a Workflow run.
+    """
+    return _current_run.get()
+
+@contextmanager
+def run_scope(run: Optional[RunContext] = None):
+    """
+    Set the run context for the code in the block, a new one if not provided.
+
+    NOTE the context follows the asyncio tasks and asyncio.to_thread, threads started otherwise must copy it (contextvars.copy_context).
+    """
+    run = run or RunContext()
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+        logger.debug("Run ended, tool memo hits: %s, misses: %s", run.tool_memo.hits, run.tool_memo.misses)
+
+def memoize_tool(name: str, func: Callable) -> Callable:
+    """
+    Wrap a tool function to serve its results from the tool memo of the current run, if any.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def _a_memoized(**kwargs):
+            run = get_run_context()
+            if run is None:
+                return await func(**kwargs)
+            found, result = run.tool_memo.get(name, kwargs)
+            if found:
+                logger.debug("Tool %s served from the run memo", name)
+                return result
+            result = await func(**kwargs)
+            run.tool_memo.put(name, kwargs, result)
+            return result
+        return _a_memoized
+
+    @functools.wraps(func)
+    def _memoized(**kwargs):
+        run = get_run_context()
+        if run is None:
+            return func(**kwargs)
+        found, result = run.tool_memo.get(name, kwargs)
+        if found:
+            logger.debug("Tool %s served from the run memo", name)
+            return result
+        result = func(**kwargs)
+        run.tool_memo.put(name, kwargs, result)
+        return result
+    return _memoized
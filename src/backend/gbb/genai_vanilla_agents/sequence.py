@@ -27,16 +27,38 @@ class Sequence(Askable):
             agent_result = step.ask(conversation, stream=stream)
             logger.debug("[Sequence %s] asked step '%s' with messages: %s", self.id, step.id, agent_result)
             
-            if agent_result == "stop":
-                logger.debug("[Sequence %s] stop signal received, ending workflow.", self.id)
-                execution_result = "agent-stop"
+            execution_result = self._handle_step_result(agent_result)
+            if execution_result is not None:
                 break
-            elif agent_result == "error":
-                logger.error("[Sequence %s] error signal received, ending workflow.", self.id)
-                execution_result = "agent-error"
+                
+        if stream:
+            conversation.update(["end", self.id])
+            
+        return execution_result
+
+    async def ask_async(self, conversation: Conversation, stream = False):
+        
+        execution_result = None
+        if stream:
+            conversation.update(["start", self.id])
+        for step in self.steps:
+            agent_result = await step.ask_async(conversation, stream=stream)
+            logger.debug("[Sequence %s] asked step '%s' with messages: %s", self.id, step.id, agent_result)
+            
+            execution_result = self._handle_step_result(agent_result)
+            if execution_result is not None:
                 break
                 
         if stream:
             conversation.update(["end", self.id])
             
-        return execution_result
\ No newline at end of file
+        return execution_result
+
+    def _handle_step_result(self, agent_result: str):
+        if agent_result == "stop":
+            logger.debug("[Sequence %s] stop signal received, ending workflow.", self.id)
+            return "agent-stop"
+        elif agent_result == "error":
+            logger.error("[Sequence %s] error signal received, ending workflow.", self.id)
+            return "agent-error"
+        return None
\ No newline at end of file
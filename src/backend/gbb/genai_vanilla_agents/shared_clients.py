@@ -0,0 +1,190 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Callable
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core.credentials import AccessToken, TokenCredential
+from azure.core.pipeline.transport import RequestsTransport
+from azure.identity import DefaultAzureCredential
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+# Connection pool sizing of the shared HTTP clients
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+class CachedTokenCredential(TokenCredential):
+    """
+    Credential caching the tokens of the wrapped credential by scopes, refreshed in the background before they expire,
+    so that the requests never wait for a token once the first one has been fetched.
+
+    Args:
+        credential (TokenCredential): The wrapped credential, e.g. DefaultAzureCredential.
+        refresh_margin (float): Seconds before the expiry when the token is refreshed in the background.
+        min_validity (float): Seconds of validity under which the token is refreshed synchronously.
+    """
+    def __init__(self, credential: TokenCredential, refresh_margin: float = 300.0, min_validity: float = 30.0):
+        self.credential = credential
+        self.refresh_margin = refresh_margin
+        self.min_validity = min_validity
+        self.lock = threading.Lock()
+        self.tokens = {}
+        self.refreshing = set()
+
+    def get_token(self, *scopes: str, **kwargs) -> AccessToken:
+        if kwargs:
+            # Claims challenges or tenant overrides are not cached
+            return self.credential.get_token(*scopes, **kwargs)
+        token = self.tokens.get(scopes)
+        remaining = token.expires_on - time.time() if token is not None else 0
+        if remaining > self.refresh_margin:
+            return token
+        if remaining > self.min_validity:
+            self._refresh_in_background(scopes)
+            return token
+        with self.lock:
+            token = self.tokens.get(scopes)
+            if token is None or token.expires_on - time.time() <= self.min_validity:
+                token = self._fetch(scopes)
+            return token
+
+    def _fetch(self, scopes: tuple) -> AccessToken:
+        token = self.credential.get_token(*scopes)
+        self.tokens[scopes] = token
+        logger.debug("Token fetched for %s, expires in %.0fs", scopes, token.expires_on - time.time())
+        return token
+
+    def _refresh_in_background(self, scopes: tuple):
+        with self.lock:
+            if scopes in self.refreshing:
+                return
+            self.refreshing.add(scopes)
+
+        def refresh():
+            try:
+                with self.lock:
+                    self._fetch(scopes)
+            except Exception as e:
+                # The current token is still valid, the next call tries again
+                logger.warning("Background token refresh failed for %s: %s", scopes, e)
+            finally:
+                with self.lock:
+                    self.refreshing.discard(scopes)
+
+        threading.Thread(target=refresh, name="token-refresh", daemon=True).start()
+
+    def close(self):
+        self.credential.close()
+
+class AsyncCachedTokenCredential:
+    """
+    Async TokenCredential facade of CachedTokenCredential, for the async Azure SDK clients (e.g. azure.ai.inference.aio).
+    The token fetches, if any, run in a worker thread.
+    """
+    def __init__(self, credential: CachedTokenCredential):
+        self.credential = credential
+
+    async def get_token(self, *scopes: str, **kwargs) -> AccessToken:
+        token = self.credential.tokens.get(scopes)
+        if not kwargs and token is not None and token.expires_on - time.time() > self.credential.refresh_margin:
+            return token
+        return await asyncio.to_thread(self.credential.get_token, *scopes, **kwargs)
+
+    async def close(self):
+        # Shared by the whole process, never closed by the clients
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+_lock = threading.Lock()
+_credential = None
+_http_client = None
+_async_http_client = None
+_requests_session = None
+
+def get_credential() -> CachedTokenCredential:
+    """
+    The process-wide credential (DefaultAzureCredential, discovered once), with a token cache refreshed proactively.
+    """
+    global _credential
+    with _lock:
+        if _credential is None:
+            _credential = CachedTokenCredential(DefaultAzureCredential())
+        return _credential
+
+def get_async_credential() -> AsyncCachedTokenCredential:
+    return AsyncCachedTokenCredential(get_credential())
+
+def get_token_provider(scope: str = COGNITIVE_SERVICES_SCOPE) -> Callable[[], str]:
+    """
+    Bearer token provider of the process-wide credential, e.g. for the azure_ad_token_provider of the OpenAI clients.
+    """
+    credential = get_credential()
+
+    def token_provider() -> str:
+        return credential.get_token(scope).token
+
+    return token_provider
+
+def _httpx_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+
+def get_http_client() -> httpx.Client:
+    """
+    The process-wide httpx client of the OpenAI clients: keep-alive connection pool, HTTP/2 when the h2 package is installed.
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=_httpx_limits(), http2=h2 is not None,
+                                        timeout=httpx.Timeout(600.0, connect=10.0), follow_redirects=True)
+        return _http_client
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    The process-wide httpx async client of the OpenAI async clients. NOTE it must be used from a single event loop.
+    """
+    global _async_http_client
+    with _lock:
+        if _async_http_client is None:
+            _async_http_client = httpx.AsyncClient(limits=_httpx_limits(), http2=h2 is not None,
+                                                   timeout=httpx.Timeout(600.0, connect=10.0), follow_redirects=True)
+        return _async_http_client
+
+def get_requests_session() -> requests.Session:
+    """
+    The process-wide requests session, with a keep-alive connection pool per host.
+    """
+    global _requests_session
+    with _lock:
+        if _requests_session is None:
+            _requests_session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS, pool_maxsize=HTTP_MAX_CONNECTIONS)
+            _requests_session.mount("https://", adapter)
+            _requests_session.mount("http://", adapter)
+        return _requests_session
+
+def get_azure_transport() -> RequestsTransport:
+    """
+    Azure SDK transport (AI Search, Cosmos DB) on the shared requests session. The clients do not close the shared session.
+    """
+    return RequestsTransport(session=get_requests_session(), session_owner=False)
@@ -1,4 +1,4 @@
-from typing import Annotated, Callable
+from typing import Annotated, Callable, Optional
 
 from pydantic import BaseModel
 
@@ -7,6 +7,8 @@ from .conversation import AllMessagesStrategy, Conversation, ConversationReading
 from .agent import Agent
 from .askable import Askable
 from .llm import LLM
+from .run_context import get_run_context
+from .tokens import default_token_counter, fit_messages
 
 import logging
 logger = logging.getLogger(__name__)
@@ -26,6 +28,10 @@ class Team(Askable):
         include_tools_descriptions (bool): Whether to include the tools descriptions in the system prompt to help the orchestrator decide.
         reading_strategy (ConversationReadingStrategy): The reading strategy to use to select the messages to use for the decision-making process.
         use_structured_output (bool): Whether to use JSON structured output for the decision-making process. Set to False to use an older LLM API version.
+        max_history_tokens (int): The token budget of the message history shown to the orchestrator. The oldest messages are dropped to fit it, None for no budget.
+        prompt_layout (str): "default" to send the chat history in the system prompt, "cache" to keep the system prompt (instructions and agents)
+            byte-identical across calls (prompt cache friendly) and send the chat history in the user message instead.
+        max_selection_attempts (int): The maximum number of orchestrator calls to select a valid next agent, the run ends with an error after them.
     """
     
     def __init__(self, llm: LLM, description: str, id: str, 
@@ -34,22 +40,31 @@ class Team(Askable):
                  stop_callback: Callable[[list[dict]], bool] = None, 
                  allowed_transitions: dict[Agent, list[Agent]] = None,
                  include_tools_descriptions: bool = False,
-                 reading_strategy: ConversationReadingStrategy = AllMessagesStrategy(),
-                 use_structured_output: bool = True):
+                 reading_strategy: ConversationReadingStrategy = None,
+                 use_structured_output: bool = True,
+                 max_history_tokens: Optional[int] = None,
+                 prompt_layout: str = "default",
+                 max_selection_attempts: int = 3):
         super().__init__(id, description)
         self.agents = members
         self.system_prompt = system_prompt
+        self.max_selection_attempts = max_selection_attempts
         self.stop_callback = stop_callback
         self.include_tools_descriptions = include_tools_descriptions
         self.allowed_transitions = allowed_transitions
-        self.allowed_transitions_str_dict = {tr.id: [agent.id for agent in members] for tr in self.allowed_transitions for agent in self.allowed_transitions[tr]} if self.allowed_transitions else None
+        self.allowed_transitions_str_dict = {agent.id: [next_agent.id for next_agent in next_agents] for agent, next_agents in self.allowed_transitions.items()} if self.allowed_transitions else None
         self.use_structured_output = use_structured_output
+        self.max_history_tokens = max_history_tokens
+        if prompt_layout not in ("default", "cache"):
+            raise ValueError(f"Unknown prompt layout: {prompt_layout}")
+        self.prompt_layout = prompt_layout
         
-        self.current_agent = None
         self.agents_dict = {agent.id: agent for agent in members}
+        # The rendered roster and cache layout prompt, with the roster version they were rendered for
+        self._compiled_prompt = None
         
         self.llm = llm
-        self.reading_strategy = reading_strategy
+        self.reading_strategy = reading_strategy or AllMessagesStrategy()
         
         logger.debug("[Team %s] initialized with agents: %s", self.id, self.agents_dict)
 
@@ -63,32 +78,54 @@ class Team(Askable):
             conversation.update(["start", self.id])
             
         execution_result = None
+        # The current agent is execution state, kept local to the call: the team is shared by the concurrent runs
+        current_agent = None
         while True:
-            next_agent_id = self._select_next_agent(conversation)
+            next_agent_id = self._select_next_agent(conversation, current_agent)
+            if next_agent_id is None:
+                execution_result = "agent-error"
+                break
             logger.debug("[Team %s] selected next agent ID: %s", self.id, next_agent_id)
             
-            self.current_agent = self.agents_dict[next_agent_id]
-            logger.debug("[Team %s] current agent: '%s'", self.id, self.current_agent.id)
+            current_agent = self._start_agent(next_agent_id)
             
-            agent_result = self.current_agent.ask(conversation, stream=stream)
+            agent_result = current_agent.ask(conversation, stream=stream)
                 
             logger.debug("[Team %s] asked current agent with messages: %s", self.id, agent_result)
             
-            if agent_result == "stop":
-                logger.debug("[Team %s] stop signal received, ending workflow.", self.id)
-                conversation.log.append(("info", "team/stop", self.id))
-                execution_result = "agent-stop"
+            execution_result = self._handle_agent_result(conversation, agent_result)
+            if execution_result is not None:
                 break
-            elif agent_result == "error":
-                logger.error("[Team %s] error signal received, ending workflow.", self.id)
-                conversation.log.append(("error", "team/error", self.id))
+                
+        if stream:
+            conversation.update(["end", self.id])
+            
+        return execution_result
+
+    async def ask_async(self, conversation: Conversation, stream = False):
+        """
+        Async version of ask: both the orchestrator and the selected agents are asked through their async interfaces."""
+        
+        if stream:
+            conversation.update(["start", self.id])
+            
+        execution_result = None
+        current_agent = None
+        while True:
+            next_agent_id = await self._select_next_agent_async(conversation, current_agent)
+            if next_agent_id is None:
                 execution_result = "agent-error"
                 break
+            logger.debug("[Team %s] selected next agent ID: %s", self.id, next_agent_id)
             
-            if self.stop_callback(conversation.messages):
-                logger.debug("[Team %s] stop callback triggered, ending workflow.", self.id)
-                conversation.log.append(("info", "team/callback-stop", self.id))
-                execution_result = "callback-stop"
+            current_agent = self._start_agent(next_agent_id)
+            
+            agent_result = await current_agent.ask_async(conversation, stream=stream)
+                
+            logger.debug("[Team %s] asked current agent with messages: %s", self.id, agent_result)
+            
+            execution_result = self._handle_agent_result(conversation, agent_result)
+            if execution_result is not None:
                 break
                 
         if stream:
@@ -96,7 +133,67 @@ class Team(Askable):
             
         return execution_result
 
-    def _select_next_agent(self, conversation: Conversation):
+    def _start_agent(self, agent_id: str) -> Askable:
+        agent = self.agents_dict[agent_id]
+        logger.debug("[Team %s] current agent: '%s'", self.id, agent.id)
+        run = get_run_context()
+        if run is not None:
+            # Exposed to the other askables of the run, never read back by the team
+            run.state(self.id)["current_agent"] = agent.id
+        return agent
+
+    def _handle_agent_result(self, conversation: Conversation, agent_result: str):
+        """
+        Returns the team execution result when the workflow must end, None to continue with the next agent.
+        """
+        if agent_result == "stop":
+            logger.debug("[Team %s] stop signal received, ending workflow.", self.id)
+            conversation.log.append(("info", "team/stop", self.id))
+            return "agent-stop"
+        elif agent_result == "error":
+            logger.error("[Team %s] error signal received, ending workflow.", self.id)
+            conversation.log.append(("error", "team/error", self.id))
+            return "agent-error"
+        
+        if self.stop_callback(conversation.messages):
+            logger.debug("[Team %s] stop callback triggered, ending workflow.", self.id)
+            conversation.log.append(("info", "team/callback-stop", self.id))
+            return "callback-stop"
+        
+        return None
+
+    def _select_next_agent(self, conversation: Conversation, current_agent: Optional[Askable] = None) -> Optional[str]:
+        """
+        The id of the next agent, None when the orchestrator did not select a valid one in max_selection_attempts calls.
+        """
+        local_messages = self._prepare_selection_messages(conversation)
+        response_format = self._selection_response_format()
+        for _ in range(self.max_selection_attempts):
+            result, usage = self.llm.ask(messages=local_messages, temperature=0, **response_format)
+            next_agent_id = self._validate_selection(conversation, result, usage, current_agent)
+            if next_agent_id is not None:
+                return next_agent_id
+            # A cached answer would be served again to the identical request
+            self.llm.invalidate(local_messages, temperature=0, **response_format)
+        return self._selection_failed(conversation)
+
+    async def _select_next_agent_async(self, conversation: Conversation, current_agent: Optional[Askable] = None) -> Optional[str]:
+        local_messages = self._prepare_selection_messages(conversation)
+        response_format = self._selection_response_format()
+        for _ in range(self.max_selection_attempts):
+            result, usage = await self.llm.ask_async(messages=local_messages, temperature=0, **response_format)
+            next_agent_id = self._validate_selection(conversation, result, usage, current_agent)
+            if next_agent_id is not None:
+                return next_agent_id
+            await self.llm.invalidate_async(local_messages, temperature=0, **response_format)
+        return self._selection_failed(conversation)
+
+    def _selection_failed(self, conversation: Conversation) -> None:
+        logger.error("[Team %s] no valid agent selected after %s attempts, ending workflow.", self.id, self.max_selection_attempts)
+        conversation.log.append(("error", "team/choice-limit", self.id, self.max_selection_attempts))
+        return None
+
+    def _prepare_selection_messages(self, conversation: Conversation):
         system_prompt = """
 You are a team orchestrator that uses a chat history to determine the next best speaker in the conversation. 
 Your task is to return the agent_id of the speaker that is best suited to proceed based on the context provided in the chat history and the description of the agents.
@@ -117,48 +214,71 @@ When provided, you can also take a decision based on the allowed transitions bet
 BE SURE TO READ AGAIN THE INSTUCTIONS ABOVE BEFORE PROCEEDING.
 """
         local_messages = []
-        agents_info = self.generate_agents_info()
+        agents_info, cache_layout_prompt = self._compile_prompt()
         history = self.construct_message_history(conversation)
         
+        if self.prompt_layout == "cache":
+            # Static prefix first (instructions and agents), volatile history last
+            local_messages.append({"role": "system", "content": cache_layout_prompt})
+            local_messages.append({"role": "user", "content": f"# CHAT HISTORY\n\n{history}\n\nRead the conversation and provide the agent_id of the next speaker."})
+            return local_messages
+        
         local_messages.append({"role": "system", "content": system_prompt.format(agents=agents_info, history=history)})
         local_messages.append({"role": "user", "content": "Read the conversation and provide the agent_id of the next speaker."})
+        return local_messages
         
+    def _selection_response_format(self):
+        return {"response_format": AgentChoiceResponse} if self.use_structured_output else {}
+
+    def _validate_selection(self, conversation: Conversation, result, usage, current_agent: Optional[Askable] = None):
+        """
+        Extract the agent_id selected by the orchestrator. Returns None when the selection is not valid and must be repeated.
+        """
         if self.use_structured_output:
-            result, usage = self.llm.ask(messages=local_messages, temperature=0, response_format=AgentChoiceResponse)
             logger.debug("[Team %s] selected agent_id: %s, (reason: '%s')", self.id, result.parsed.agent_id, result.parsed.reason)
             conversation.log.append(("info", "team/choice", self.id, result.parsed.agent_id, result.parsed.reason))
             next_agent_id = result.parsed.agent_id
         else:
-            result, usage = self.llm.ask(messages=local_messages, temperature=0)
             next_agent_id = result.content.split(" ")[-1].strip()
             logger.debug("[Team %s] selected agent_id: %s", self.id, next_agent_id)
             conversation.log.append(("info", "team/choice", self.id, next_agent_id))
         
-        if usage is not None:
-            # Update conversation metrics with response usage
-            conversation.metrics.total_tokens += usage["total_tokens"]
-            conversation.metrics.prompt_tokens += usage["prompt_tokens"]
-            conversation.metrics.completion_tokens += usage["completion_tokens"]
+        # Update conversation metrics with response usage
+        conversation.metrics.add_usage(usage, self.id, getattr(self.llm, "purpose", "router"))
         
         
         if next_agent_id not in self.agents_dict:
             logger.error("[Team %s] invalid agent_id selected: %s", self.id, next_agent_id)
             conversation.log.append(("error", "team/choice", self.id, next_agent_id))
-            return self._select_next_agent(conversation)
+            return None
         
-        if self.allowed_transitions_str_dict is not None and self.current_agent is not None:
-            if next_agent_id not in self.allowed_transitions_str_dict[self.current_agent.id]:
+        if self.allowed_transitions_str_dict is not None and current_agent is not None and current_agent.id in self.allowed_transitions_str_dict:
+            if next_agent_id not in self.allowed_transitions_str_dict[current_agent.id]:
                 logger.error("[Team %s] invalid agent_id selected: %s", self.id, next_agent_id)
                 conversation.log.append(("error", "team/choice", self.id, next_agent_id))
-                return self._select_next_agent(conversation)
+                return None
         
         return next_agent_id
 
     def construct_message_history(self, conversation):
         selected_messages = self.reading_strategy.get_messages(conversation)
+        if self.max_history_tokens is not None:
+            selected_messages = fit_messages(selected_messages, self.max_history_tokens, default_token_counter)
         history = "\n".join([f"{message['role']}: {message['content']}" for message in selected_messages])
         return history
 
+    def _compile_prompt(self) -> tuple[str, str]:
+        """
+        The agents info and the cache layout system prompt, rendered again only when the roster changes (e.g. a member registered a tool).
+        """
+        version = roster_version(self.agents)
+        compiled = self._compiled_prompt
+        if compiled is None or compiled[0] != version:
+            agents_info = self.generate_agents_info()
+            compiled = (version, agents_info, CACHE_LAYOUT_SELECTION_PROMPT.format(agents=agents_info))
+            self._compiled_prompt = compiled
+        return compiled[1], compiled[2]
+
     def generate_agents_info(self):
         agents_info = []
         for agent in self.agents:
@@ -180,6 +300,29 @@ BE SURE TO READ AGAIN THE INSTUCTIONS ABOVE BEFORE PROCEEDING.
         
         return "\n".join(agents_info)
 
+def roster_version(agents: list[Askable]) -> tuple:
+    """
+    A cheap fingerprint of what the agents info is rendered from: the ids, descriptions and number of tools of the members.
+    """
+    return tuple((agent.id, agent.description, len(getattr(agent, "tools", None) or ())) for agent in agents)
+
+CACHE_LAYOUT_SELECTION_PROMPT = """
+You are a team orchestrator that uses a chat history to determine the next best speaker in the conversation. 
+Your task is to return the agent_id of the speaker that is best suited to proceed based on the context provided in the chat history and the description of the agents.
+You MUST return agent_id value from the list of available agents.
+The names are case-sensitive and should not be abbreviated or changed.
+When a user input is expected, you MUST select an agent capable of handling the user input.
+When provided, you can also take a decision based on tools available to each agent
+When provided, you can also take a decision based on the allowed transitions between agents.
+The chat history is provided in the user message.
+
+# AVAILABLE AGENTS
+
+{agents}
+
+BE SURE TO READ AGAIN THE INSTUCTIONS ABOVE BEFORE PROCEEDING.
+"""
+
 class AgentChoiceResponse(BaseModel):
     agent_id: Annotated[str, "Agent ID selected by the orchestrator. Must be a valid agent_id from the list of available agents."]
     reason: Annotated[str, "Reasoning behind the agent_id selection."]
\ No newline at end of file
@@ -0,0 +1,193 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+
+import openai
+
+from .tokens import default_token_counter
+
+import logging
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """
+    Client-side token bucket for an Azure OpenAI deployment, limiting both tokens per minute (TPM) and requests per minute (RPM).
+
+    Requests acquire their estimated tokens before being sent; the estimate is corrected with the actual usage once known.
+    A throttled response pauses the bucket for everybody until the server's retry-after has elapsed.
+
+    Args:
+        tokens_per_minute (int): The TPM quota of the deployment, None for no token limit.
+        requests_per_minute (int): The RPM quota of the deployment, None for no request limit.
+    """
+    def __init__(self, tokens_per_minute: Optional[int] = None, requests_per_minute: Optional[int] = None):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.lock = threading.Lock()
+        self.tokens = float(tokens_per_minute or 0)
+        self.requests = float(requests_per_minute or 0)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        if self.tokens_per_minute:
+            self.tokens = min(self.tokens_per_minute, self.tokens + elapsed * self.tokens_per_minute / 60)
+        if self.requests_per_minute:
+            self.requests = min(self.requests_per_minute, self.requests + elapsed * self.requests_per_minute / 60)
+
+    def _try_acquire(self, tokens: int) -> float:
+        """
+        Acquire the tokens and one request if available, otherwise returns the seconds to wait before trying again.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self._refill(now)
+            # A request larger than the whole bucket is let through when the bucket is full, not blocked forever
+            tokens = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+            wait = 0.0
+            if self.tokens_per_minute and self.tokens < tokens:
+                wait = max(wait, (tokens - self.tokens) * 60 / self.tokens_per_minute)
+            if self.requests_per_minute and self.requests < 1:
+                wait = max(wait, (1 - self.requests) * 60 / self.requests_per_minute)
+            if wait > 0:
+                return wait
+            self.tokens -= tokens
+            if self.requests_per_minute:
+                self.requests -= 1
+            return 0.0
+
+    def acquire(self, tokens: int):
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            logger.debug("Rate limiter: waiting %.2fs for %s tokens", wait, tokens)
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int):
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            logger.debug("Rate limiter: waiting %.2fs for %s tokens", wait, tokens)
+            await asyncio.sleep(wait)
+
+    def adjust(self, tokens: int):
+        """
+        Correct the bucket once the actual usage is known: a positive value consumes more tokens, a negative one gives them back.
+        """
+        if not self.tokens_per_minute:
+            return
+        with self.lock:
+            self.tokens = min(self.tokens_per_minute, self.tokens - tokens)
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def remaining(self) -> dict:
+        """
+        The tokens and requests currently available, None when not limited.
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            return {
+                "tokens": self.tokens if self.tokens_per_minute else None,
+                "requests": self.requests if self.requests_per_minute else None,
+            }
+
+_rate_limiters: dict[tuple, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(endpoint: str, deployment: str, tokens_per_minute: Optional[int] = None, requests_per_minute: Optional[int] = None) -> RateLimiter:
+    """
+    The process-wide rate limiter of a deployment, shared by all the LLM instances using it.
+    """
+    key = (endpoint, deployment)
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(tokens_per_minute, requests_per_minute)
+            _rate_limiters[key] = limiter
+        return limiter
+
+def estimate_tokens(messages: list, tools: list = None, completion_tokens: int = 500) -> int:
+    """
+    Estimate of the tokens consumed by a completion, counted locally with the shared TokenCounter, plus an allowance for the completion.
+    """
+    return default_token_counter.count_request(messages, tools) + completion_tokens
+
+class RetryPolicy:
+    """
+    Retries throttled (429) and transient (5xx, connection, timeout) errors with exponential backoff, honouring the Retry-After headers.
+
+    Args:
+        max_retries (int): The maximum number of retries.
+        base_delay (float): The first backoff delay in seconds, doubled at every retry.
+        max_delay (float): The maximum backoff delay in seconds.
+        rate_limiter (RateLimiter): Paused on throttling, so that the other callers of the deployment back off too.
+    """
+    def __init__(self, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0, rate_limiter: RateLimiter = None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limiter = rate_limiter
+
+    def is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+        return False
+
+    def delay(self, error: Exception, attempt: int) -> float:
+        response = getattr(error, "response", None)
+        headers = response.headers if response is not None else {}
+        for header, scale in (("retry-after-ms", 0.001), ("x-ms-retry-after-ms", 0.001), ("retry-after", 1)):
+            value = headers.get(header)
+            if value is not None:
+                try:
+                    return min(float(value) * scale, self.max_delay)
+                except ValueError:
+                    pass
+        # Full jitter, to avoid all the callers retrying at the same time
+        return random.uniform(0, min(self.base_delay * 2 ** attempt, self.max_delay))
+
+    def _on_error(self, error: Exception, attempt: int) -> float:
+        if attempt >= self.max_retries or not self.is_retryable(error):
+            raise error
+        delay = self.delay(error, attempt)
+        logger.warning("LLM call failed with %s, retrying in %.2fs (attempt %s of %s)", type(error).__name__, delay, attempt + 1, self.max_retries)
+        if self.rate_limiter is not None and getattr(error, "status_code", None) == 429:
+            self.rate_limiter.pause(delay)
+        return delay
+
+    def call(self, func: callable, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+            attempt += 1
+            time.sleep(delay)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(0)
+
+    async def call_async(self, func: callable, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+            attempt += 1
+            await asyncio.sleep(delay)
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async(0)
@@ -0,0 +1,151 @@
+import json
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# See https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+TOKENS_PER_REPLY = 3
+# Low detail image cost, high detail images are tiled and cost more
+TOKENS_PER_IMAGE = 85
+
+class TokenCounter:
+    """
+    Counts locally the tokens of the messages and tool schemas sent to the LLM.
+
+    Uses tiktoken when installed, otherwise approximates with ~4 characters per token.
+
+    Args:
+        model (str): The model name, used to select the tiktoken encoding.
+    """
+    _encodings = {}
+    _encodings_lock = threading.Lock()
+
+    def __init__(self, model: str = "gpt-4o"):
+        self.model = model
+        self.encoding = self._get_encoding(model)
+
+    @classmethod
+    def _get_encoding(cls, model: str):
+        if tiktoken is None:
+            return None
+        with cls._encodings_lock:
+            if model not in cls._encodings:
+                try:
+                    cls._encodings[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    cls._encodings[model] = tiktoken.get_encoding("o200k_base")
+            return cls._encodings[model]
+
+    def count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def count_content(self, content) -> int:
+        if content is None:
+            return 0
+        if isinstance(content, str):
+            return self.count_text(content)
+        if isinstance(content, list):
+            # Multi-modal content, see WorkflowInput.to_message
+            tokens = 0
+            for part in content:
+                if part.get("type") == "text":
+                    tokens += self.count_text(part.get("text"))
+                elif part.get("type") == "image_url":
+                    tokens += TOKENS_PER_IMAGE
+            return tokens
+        return self.count_text(json.dumps(content, default=str))
+
+    def count_message(self, message) -> int:
+        if not isinstance(message, dict):
+            message = message.model_dump(exclude_none=True)
+        tokens = TOKENS_PER_MESSAGE + self.count_content(message.get("content"))
+        if message.get("name"):
+            tokens += TOKENS_PER_NAME + self.count_text(message["name"])
+        if message.get("tool_calls"):
+            tokens += self.count_text(json.dumps(message["tool_calls"], default=str))
+        return tokens
+
+    def count_messages(self, messages: list) -> int:
+        return sum(self.count_message(message) for message in messages) + TOKENS_PER_REPLY
+
+    def count_tools(self, tools: list) -> int:
+        return self.count_text(json.dumps(tools)) if tools else 0
+
+    def count_request(self, messages: list, tools: list = None) -> int:
+        """
+        The estimated prompt tokens of a completion request.
+        """
+        return self.count_messages(messages) + self.count_tools(tools)
+
+default_token_counter = TokenCounter()
+
+# The drop order of fit_messages: tool calls with their results first, then the assistant answers, then the user inputs
+DEFAULT_DROP_PRIORITY = ("tool", "assistant", "user")
+
+def _message_units(messages: list) -> list[tuple[str, list[int]]]:
+    """
+    Group the messages in units that can be dropped together: an assistant message with tool calls and its tool results form one unit,
+    so that the request never contains a tool result without its call (or vice versa).
+    """
+    units = []
+    i = 0
+    while i < len(messages):
+        message = messages[i]
+        role = message.get("role") if isinstance(message, dict) else message.role
+        tool_calls = message.get("tool_calls") if isinstance(message, dict) else message.tool_calls
+        if role == "assistant" and tool_calls:
+            indexes = [i]
+            i += 1
+            while i < len(messages) and (messages[i].get("role") if isinstance(messages[i], dict) else messages[i].role) == "tool":
+                indexes.append(i)
+                i += 1
+            units.append(("tool", indexes))
+        else:
+            units.append(("tool" if role == "tool" else role, [i]))
+            i += 1
+    return units
+
+def fit_messages(messages: list, max_tokens: int, counter: TokenCounter = None, priority: tuple[str] = DEFAULT_DROP_PRIORITY) -> list:
+    """
+    Drop the oldest messages, in priority order, until the messages fit in max_tokens. The last message is always kept.
+
+    Args:
+        messages (list): The messages to fit.
+        max_tokens (int): The token budget of the messages.
+        counter (TokenCounter): The token counter, defaults to the shared one.
+        priority (tuple[str]): The kinds of messages to drop first ("tool", "assistant", "user", "system").
+    """
+    counter = counter or default_token_counter
+    counts = [counter.count_message(message) for message in messages]
+    total = sum(counts) + TOKENS_PER_REPLY
+    if total <= max_tokens:
+        return messages
+
+    units = _message_units(messages)
+    dropped = set()
+    for kind in priority:
+        # The last unit is never dropped
+        for unit_kind, indexes in units[:-1]:
+            if total <= max_tokens:
+                break
+            if unit_kind == kind:
+                dropped.update(indexes)
+                total -= sum(counts[i] for i in indexes)
+
+    if total > max_tokens:
+        logger.warning("Messages exceed the token budget after trimming: %s > %s", total, max_tokens)
+    else:
+        logger.debug("Dropped %s messages to fit the token budget of %s", len(dropped), max_tokens)
+    return [message for i, message in enumerate(messages) if i not in dropped]
@@ -0,0 +1,245 @@
+import asyncio
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional, Union
+
+from .run_context import canonical_arguments
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Seconds between two polls of the indexer status by the invalidation watchers, 0 to disable them
+TOOL_CACHE_INDEXER_POLL_SECONDS = float(os.getenv("TOOL_CACHE_INDEXER_POLL_SECONDS", "300"))
+
+# Tag of the AI Search results whose index is only known at runtime (e.g. the Semantic Kernel facades), invalidated by any indexer run
+AI_SEARCH_TAG = "ai_search"
+
+class ToolCachePolicy:
+    """
+    How the results of a read-only tool are cached across requests.
+
+    Args:
+        ttl (float): Seconds a result is fresh.
+        stale_ttl (float): Seconds after ttl during which the stale result is still served while it is refreshed in the background
+            (stale-while-revalidate), defaults to ttl. 0 to always wait for the refresh.
+        tags (Iterable[str]): Tags of the entries, to invalidate them together (e.g. the AI Search index name queried by the tool).
+    """
+    def __init__(self, ttl: float, stale_ttl: Optional[float] = None, tags: Iterable[str] = ()):
+        self.ttl = ttl
+        self.stale_ttl = ttl if stale_ttl is None else stale_ttl
+        # Tags from unset environment variables are ignored
+        self.tags = frozenset(tag for tag in tags if tag)
+
+class ToolCache:
+    """
+    Process-wide LRU cache of tool results, keyed by tool name and canonical arguments (sorted keys, so the argument order does not matter).
+
+    NOTE the cached results are shared by all the callers, they must not be mutated.
+
+    Args:
+        max_size (int): The maximum number of entries, the least recently used are evicted first.
+    """
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.refreshing = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def lookup(self, key: tuple) -> tuple[str, Any]:
+        """
+        Returns ("fresh" | "stale" | "miss", result).
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return "miss", None
+            age = time.time() - entry["created_at"]
+            if age <= entry["policy"].ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return "fresh", entry["value"]
+            if age <= entry["policy"].ttl + entry["policy"].stale_ttl:
+                self.entries.move_to_end(key)
+                self.stale_hits += 1
+                return "stale", entry["value"]
+            del self.entries[key]
+            self.misses += 1
+            return "miss", None
+
+    def store(self, key: tuple, value: Any, policy: ToolCachePolicy):
+        with self.lock:
+            self.entries[key] = {"value": value, "policy": policy, "created_at": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def begin_refresh(self, key: tuple) -> bool:
+        """
+        Whether the caller should refresh the entry, only one refresh per key runs at a time.
+        """
+        with self.lock:
+            if key in self.refreshing:
+                return False
+            self.refreshing.add(key)
+            return True
+
+    def end_refresh(self, key: tuple):
+        with self.lock:
+            self.refreshing.discard(key)
+
+    def invalidate(self, tag: Optional[str] = None, name: Optional[str] = None) -> int:
+        """
+        Drop the entries with the given tag and/or of the given tool, all the entries when none is given. Returns the number of entries dropped.
+        """
+        with self.lock:
+            keys = [key for key, entry in self.entries.items()
+                    if (tag is None or tag in entry["policy"].tags) and (name is None or key[0] == name)]
+            for key in keys:
+                del self.entries[key]
+        logger.info("Tool cache invalidated (tag: %s, tool: %s): %s entries dropped", tag, name, len(keys))
+        return len(keys)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses}
+
+tool_cache = ToolCache(max_size=int(os.getenv("TOOL_CACHE_MAX_SIZE", "1000")))
+
+# References to the pending async refreshes, so that they are not garbage collected
+_background_tasks = set()
+
+def _arguments_key(signature: inspect.Signature, args: tuple, kwargs: dict) -> str:
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    # Methods (e.g. the Semantic Kernel facades) are keyed by their arguments only, the tool name identifies the facade
+    return canonical_arguments({name: value for name, value in bound.arguments.items() if name not in ("self", "cls")})
+
+def cached_tool(policy: Union[ToolCachePolicy, float], name: Optional[str] = None, cache: Optional[ToolCache] = None) -> Callable:
+    """
+    Decorator caching the results of a read-only tool (function or method, sync or async) across requests.
+
+    Usable directly on the Semantic Kernel kernel_function methods, below the @kernel_function decorator.
+
+    Args:
+        policy (ToolCachePolicy | float): The cache policy, or its ttl in seconds.
+        name (str): The name of the tool in the cache keys, defaults to the qualified name of the function.
+        cache (ToolCache): The cache, defaults to the process-wide one.
+    """
+    policy = policy if isinstance(policy, ToolCachePolicy) else ToolCachePolicy(ttl=policy)
+    cache = cache or tool_cache
+
+    def _decorator(func: Callable) -> Callable:
+        tool_name = name or func.__qualname__
+        signature = inspect.signature(func)
+
+        if inspect.iscoroutinefunction(func):
+            async def _refresh_async(key, args, kwargs):
+                try:
+                    cache.store(key, await func(*args, **kwargs), policy)
+                except Exception as e:
+                    # The stale result has been served, the next call tries again
+                    logger.warning("Background refresh of tool %s failed: %s", tool_name, e)
+                finally:
+                    cache.end_refresh(key)
+
+            @functools.wraps(func)
+            async def _a_cached(*args, **kwargs):
+                key = (tool_name, _arguments_key(signature, args, kwargs))
+                state, value = cache.lookup(key)
+                if state == "fresh":
+                    return value
+                if state == "stale":
+                    if cache.begin_refresh(key):
+                        task = asyncio.create_task(_refresh_async(key, args, kwargs))
+                        _background_tasks.add(task)
+                        task.add_done_callback(_background_tasks.discard)
+                    return value
+                value = await func(*args, **kwargs)
+                cache.store(key, value, policy)
+                return value
+            _a_cached._cache_policy = policy
+            return _a_cached
+
+        def _refresh(key, args, kwargs):
+            try:
+                cache.store(key, func(*args, **kwargs), policy)
+            except Exception as e:
+                logger.warning("Background refresh of tool %s failed: %s", tool_name, e)
+            finally:
+                cache.end_refresh(key)
+
+        @functools.wraps(func)
+        def _cached(*args, **kwargs):
+            key = (tool_name, _arguments_key(signature, args, kwargs))
+            state, value = cache.lookup(key)
+            if state == "fresh":
+                return value
+            if state == "stale":
+                if cache.begin_refresh(key):
+                    threading.Thread(target=_refresh, args=(key, args, kwargs), name="tool-cache-refresh", daemon=True).start()
+                return value
+            value = func(*args, **kwargs)
+            cache.store(key, value, policy)
+            return value
+        _cached._cache_policy = policy
+        return _cached
+
+    return _decorator
+
+_watchers_lock = threading.Lock()
+_watchers = {}
+
+def watch_indexer(endpoint: str, indexer_name: str, credential, tag: Optional[str] = None, cache: Optional[ToolCache] = None,
+                  interval: float = TOOL_CACHE_INDEXER_POLL_SECONDS):
+    """
+    Invalidate the entries tagged with the indexer name (or the given tag) whenever a new run of the indexer completes
+    (e.g. after scripts/data_load/setup_aisearch.py uploaded new documents). The status is polled in a daemon thread, one per indexer.
+
+    Args:
+        endpoint (str): The AI Search endpoint.
+        indexer_name (str): The indexer name, the same as the index name for the indexers created by setup_aisearch.py.
+        credential: The AI Search credential.
+        tag (str): The tag of the entries to invalidate, defaults to the indexer name.
+        cache (ToolCache): The cache, defaults to the process-wide one.
+        interval (float): Seconds between two polls, 0 to disable the watcher.
+    """
+    if not endpoint or not indexer_name or interval <= 0:
+        return
+    cache = cache or tool_cache
+    tag = tag or indexer_name
+    with _watchers_lock:
+        if (endpoint, indexer_name, tag) in _watchers:
+            return
+        _watchers[(endpoint, indexer_name, tag)] = True
+
+    def last_run(client) -> Optional[str]:
+        status = client.get_indexer_status(indexer_name)
+        result = status.last_result
+        if result is None or result.status != "success" or result.end_time is None:
+            return None
+        return result.end_time.isoformat()
+
+    def watch():
+        from azure.search.documents.indexes import SearchIndexerClient
+        client = SearchIndexerClient(endpoint, credential)
+        seen = None
+        while True:
+            try:
+                current = last_run(client)
+                if seen is not None and current is not None and current != seen:
+                    logger.info("Indexer %s completed a new run at %s", indexer_name, current)
+                    cache.invalidate(tag=tag)
+                seen = current or seen
+            except Exception as e:
+                logger.warning("Failed to read the status of the indexer %s: %s", indexer_name, e)
+            time.sleep(interval)
+
+    threading.Thread(target=watch, name=f"indexer-watch-{indexer_name}", daemon=True).start()
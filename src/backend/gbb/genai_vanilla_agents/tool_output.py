@@ -0,0 +1,206 @@
+import json
+import re
+from typing import Any, Callable, Optional
+
+from pydantic import BaseModel
+
+from .function_utils import serialize_to_str
+from .tokens import TokenCounter, default_token_counter
+
+import logging
+logger = logging.getLogger(__name__)
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+WORD = re.compile(r"\w+")
+
+class ToolOutputPolicy:
+    """
+    Shapes the result of a tool before it is appended to the conversation as a tool message, to keep tool payloads out of the prompt.
+
+    The steps are applied in order: field allowlist, de-duplication of overlapping chunks, sort, max items, then the size limit.
+
+    Args:
+        max_tokens (int): The maximum tokens of the serialized result, None for no limit.
+        mode (str): How results over max_tokens are reduced:
+            - "truncate": drop whole trailing items of lists until the result fits, cut the text of the other results.
+            - "extract": keep the sentences of the text fields sharing the most words with the tool arguments (extractive compression), then truncate.
+        fields (list[str]): The allowlist of fields kept in dict results (or in the dict items of list results). Dotted paths select nested fields.
+        text_field (str): The field holding the text of dict items (e.g. "chunk" for AI Search results), used by dedupe and extract.
+        dedupe (bool): Whether to drop duplicated items and strip the text overlapping with a previous item (e.g. chunks of the same page).
+        min_overlap (int): The minimum overlap, in characters, stripped by dedupe.
+        sort_key (Callable[[Any], Any]): The sort key of the items of list results, applied before max_items (e.g. the publication date), None to keep the tool order.
+        descending (bool): Whether the items are sorted in descending order of sort_key, e.g. the most recent first.
+        max_items (int): The maximum items of list results, None for no limit.
+        token_counter (TokenCounter): The token counter, defaults to the shared one.
+    """
+    def __init__(self, max_tokens: Optional[int] = None, mode: str = "truncate", fields: Optional[list[str]] = None,
+                 text_field: Optional[str] = None, dedupe: bool = False, min_overlap: int = 50, max_items: Optional[int] = None,
+                 sort_key: Optional[Callable[[Any], Any]] = None, descending: bool = False, token_counter: Optional[TokenCounter] = None):
+        if mode not in ("truncate", "extract"):
+            raise ValueError(f"Unknown tool output mode: {mode}")
+        self.max_tokens = max_tokens
+        self.mode = mode
+        self.fields = fields
+        self.text_field = text_field
+        self.dedupe = dedupe
+        self.min_overlap = min_overlap
+        self.max_items = max_items
+        self.sort_key = sort_key
+        self.descending = descending
+        self.token_counter = token_counter or default_token_counter
+
+    def apply(self, result: Any, arguments: dict = None) -> str:
+        """
+        Shape the raw result of a tool, returns the serialized result for the tool message.
+        """
+        value = self._load(result)
+        if self.fields is not None:
+            value = [self._select_fields(item) for item in value] if isinstance(value, list) else self._select_fields(value)
+        if isinstance(value, list):
+            if self.dedupe:
+                value = self._dedupe(value)
+            if self.sort_key is not None:
+                value = sorted(value, key=self.sort_key, reverse=self.descending)
+            if self.max_items is not None and len(value) > self.max_items:
+                value = value[:self.max_items]
+        if self.max_tokens is None or self._fits(serialize_to_str(value)):
+            return serialize_to_str(value)
+
+        if self.mode == "extract":
+            value = self._extract(value, self._query_words(arguments))
+            output = serialize_to_str(value)
+            if self._fits(output):
+                return output
+        return self._truncate(value)
+
+    def _load(self, result: Any) -> Any:
+        if isinstance(result, BaseModel):
+            return result.model_dump()
+        if isinstance(result, str) and result[:1] in ("[", "{"):
+            # Results already serialized by the tool
+            try:
+                return json.loads(result)
+            except ValueError:
+                return result
+        return result
+
+    def _fits(self, text: str) -> bool:
+        return self.token_counter.count_text(text) <= self.max_tokens
+
+    def _select_fields(self, item: Any) -> Any:
+        if not isinstance(item, dict):
+            return item
+        selected = {}
+        for field in self.fields:
+            source, target = item, selected
+            path = field.split(".")
+            for key in path[:-1]:
+                if not isinstance(source, dict) or key not in source:
+                    source = None
+                    break
+                source = source[key]
+                target = target.setdefault(key, {})
+            if isinstance(source, dict) and path[-1] in source:
+                target[path[-1]] = source[path[-1]]
+        return selected
+
+    def _text(self, item: Any) -> Optional[str]:
+        if isinstance(item, str):
+            return item
+        if isinstance(item, dict) and isinstance(item.get(self.text_field), str):
+            return item[self.text_field]
+        return None
+
+    def _with_text(self, item: Any, text: str) -> Any:
+        if isinstance(item, str):
+            return text
+        return {**item, self.text_field: text}
+
+    def _overlap(self, previous: str, text: str) -> int:
+        """
+        The length of the longest prefix of text which is a suffix of previous.
+        """
+        probe = text[:self.min_overlap]
+        if len(probe) < self.min_overlap:
+            return 0
+        start = previous.find(probe)
+        while start != -1:
+            if text.startswith(previous[start:]):
+                return len(previous) - start
+            start = previous.find(probe, start + 1)
+        return 0
+
+    def _dedupe(self, items: list) -> list:
+        kept = []
+        texts = []
+        seen = set()
+        for item in items:
+            text = self._text(item)
+            if text is None:
+                kept.append(item)
+                continue
+            normalized = " ".join(text.split())
+            if normalized in seen or any(normalized in other for other in seen):
+                continue
+            seen.add(normalized)
+            overlap = max((self._overlap(previous, text) for previous in texts), default=0)
+            texts.append(text)
+            kept.append(self._with_text(item, text[overlap:]) if overlap else item)
+        if len(kept) < len(items):
+            logger.debug("Tool output: dropped %s duplicated items", len(items) - len(kept))
+        return kept
+
+    def _query_words(self, arguments: dict) -> set[str]:
+        words = set()
+        for value in (arguments or {}).values():
+            words.update(word.lower() for word in WORD.findall(value if isinstance(value, str) else json.dumps(value, default=str)))
+        return words
+
+    def _compress(self, text: str, query_words: set[str], max_tokens: int) -> str:
+        """
+        Keep the sentences sharing the most words with the query, in their original order, within max_tokens.
+        """
+        sentences = [sentence for sentence in SENTENCE_SPLIT.split(text) if sentence.strip()]
+        ranked = sorted(range(len(sentences)),
+                        key=lambda i: -len(query_words.intersection(word.lower() for word in WORD.findall(sentences[i]))))
+        selected = set()
+        tokens = 0
+        for i in ranked:
+            sentence_tokens = self.token_counter.count_text(sentences[i]) + 1
+            if tokens + sentence_tokens > max_tokens:
+                continue
+            selected.add(i)
+            tokens += sentence_tokens
+        return " ".join(sentences[i] for i in sorted(selected))
+
+    def _extract(self, value: Any, query_words: set[str]) -> Any:
+        if isinstance(value, str):
+            return self._compress(value, query_words, self.max_tokens)
+        if isinstance(value, list):
+            texts = [self._text(item) for item in value]
+            if not any(text is not None for text in texts):
+                return value
+            # The budget left by the other fields is shared evenly by the text fields
+            fixed_tokens = self.token_counter.count_text(serialize_to_str([self._with_text(item, "") if text is not None else item for item, text in zip(value, texts)]))
+            budget = max((self.max_tokens - fixed_tokens) // sum(1 for text in texts if text is not None), 0)
+            return [self._with_text(item, self._compress(text, query_words, budget)) if text is not None else item for item, text in zip(value, texts)]
+        return value
+
+    def _truncate(self, value: Any) -> str:
+        if isinstance(value, list):
+            # Only whole items are dropped, from the end: the result stays valid JSON and no item is cut in the middle
+            for kept in range(len(value) - 1, -1, -1):
+                output = serialize_to_str(value[:kept] + [f"[{len(value) - kept} more results omitted]"])
+                if self._fits(output):
+                    return output
+            logger.warning("Tool output: no item fits in %s tokens", self.max_tokens)
+            return serialize_to_str([f"[{len(value)} more results omitted]"])
+        output = serialize_to_str(value)
+        # Cut at the character estimate of the budget, then shrink until it fits
+        length = min(self.max_tokens * 4, len(output) - 1)
+        while length > 0:
+            truncated = output[:length] + f"... [truncated {len(output) - length} characters]"
+            if self._fits(truncated):
+                return truncated
+            length = int(length * 0.8)
+        return output[:self.max_tokens]
@@ -4,6 +4,7 @@ import threading
 from typing import Union
 from .askable import Askable
 from .conversation import Conversation
+from .run_context import RunContext, run_scope
 
 import logging
 logger = logging.getLogger(__name__)
@@ -11,9 +12,9 @@ logger = logging.getLogger(__name__)
 import base64
 
 class WorkflowInput:
-    def __init__(self, text: str, images: list[str] = []):
+    def __init__(self, text: str, images: list[str] = None):
         self.text = text
-        self.images = images
+        self.images = images if images is not None else []
         
     # Function to encode the image
     def _encode_image(self, image_path: str):
@@ -48,7 +49,19 @@ class Workflow():
     def run(self, workflow_input: Union[str, WorkflowInput]):
         self._handle_workflow_input(workflow_input)
         
-        execution_result = self.askable.ask(self.conversation)
+        with run_scope(RunContext()):
+            execution_result = self.askable.ask(self.conversation)
+            
+        return execution_result
+
+    async def run_async(self, workflow_input: Union[str, WorkflowInput]):
+        """
+        Async version of run, to be awaited from an event loop (e.g. a web request handler) without blocking it.
+        """
+        self._handle_workflow_input(workflow_input)
+        
+        with run_scope(RunContext()):
+            execution_result = await self.askable.ask_async(self.conversation)
             
         return execution_result
 
@@ -73,7 +86,9 @@ class Workflow():
         result_queue = queue.Queue()
         def ask_in_thread():
             try:
-                res = self.askable.ask(self.conversation, stream=True)
+                # The run context of the thread, the tool results are memoized for this run only
+                with run_scope(RunContext()):
+                    res = self.askable.ask(self.conversation, stream=True)
             except Exception as e:
                 logger.error("Error during askable.ask: %s", e)
                 self.conversation.update(["error", e])
@@ -1,7 +1,10 @@
+import asyncio
 import logging
 import json
 
 from gbb.genai_vanilla_agents.conversation import Conversation
+from gbb.genai_vanilla_agents.llm_routing import purpose_metrics
+from gbb.genai_vanilla_agents.tool_cache import tool_cache
 from gbb.genai_vanilla_agents.workflow import Workflow
 
 #Vanilla Agents implementation
@@ -15,6 +18,8 @@ class VanillaAgenticHandler:
 
         # Initialize conversation history
         conversation_history = Conversation(messages=[], variables={})
+        # Team strategy of the previous turn, stored next to the conversation and reused by the uncertain follow-up inquiries
+        previous_strategy = None
 
         if load_history is True:
             # Handle load_history request
@@ -38,6 +43,7 @@ class VanillaAgenticHandler:
             logging.debug(f"Conversation data={conversation_data}")
             if conversation_data:
                 conversation_history = Conversation.from_dict(conversation_data)
+                previous_strategy = conversation_data.get("team_strategy")
             else:
                 return {"status_code": 404, "error": "chat_id not found"}
         else:
@@ -50,29 +56,36 @@ class VanillaAgenticHandler:
 
         # Proceed with the conversation
         history_count = len(conversation_history.messages)
+        metrics_before = conversation_history.metrics.model_copy(deep=True)
 
         # Select use case group chat
+        # The team selection may call the model, keep it off the event loop
         if 'fsi_insurance' == usecase_type:
-            team = create_group_chat_insurance(user_message)
+            team, strategy = await asyncio.to_thread(create_group_chat_insurance, user_message, conversation_history.metrics, previous_strategy)
         elif 'fsi_banking' == usecase_type:
-            team = create_group_chat_banking(user_message)
+            team, strategy = await asyncio.to_thread(create_group_chat_banking, user_message, conversation_history.metrics, previous_strategy)
         else:
             return {"status_code": 400, "error": "Use case not recognized"}
 
         workflow = Workflow(askable=team, conversation=conversation_history)
-        run_result = workflow.run(user_message)
+        run_result = await workflow.run_async(user_message)
         logging.info(f"run_result = {run_result}")
+        logging.debug(f"LLM metrics by purpose = {purpose_metrics.snapshot()}")
+        logging.debug(f"Tool cache = {tool_cache.to_dict()}")
+        workflow.conversation.log.export()
 
         if "agent-error" == run_result:
             return {"status_code": 400, "chat_id": chat_id, "reply": run_result}
 
         previous_history = user_data['chat_histories'].get(chat_id)
-        merged_history = {**previous_history, **workflow.conversation.to_dict()}
+        merged_history = {**previous_history, **workflow.conversation.to_dict(), "team_strategy": strategy}
         user_data['chat_histories'][chat_id] = merged_history
         self.db.update_user_info(user_id, user_data)
 
         delta = len(workflow.conversation.messages) - history_count
         new_messages = workflow.conversation.messages[-delta:]
+        # Usage of this request only, the conversation metrics are cumulative
+        usage = workflow.conversation.metrics.since(metrics_before).model_dump()
 
         # Return the chat_id and reply to the client
-        return {"status_code": 200, "chat_id": chat_id, "reply": new_messages}
\ No newline at end of file
+        return {"status_code": 200, "chat_id": chat_id, "reply": new_messages, "usage": usage}
\ No newline at end of file
@@ -1,6 +1,5 @@
 import logging
 import os
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
 from semantic_kernel.agents import AgentGroupChat
 from semantic_kernel.agents.strategies.termination.termination_strategy import TerminationStrategy
 from semantic_kernel.agents.strategies import KernelFunctionSelectionStrategy
@@ -19,6 +18,7 @@ from semantic_kernel.connectors.ai.azure_ai_inference import AzureAIInferenceCha
 import azure.ai.inference.aio as aio_inference
 import azure.identity.aio as aio_identity
 from foundry_agent_utils import FoundryAgentUtils
+from gbb.genai_vanilla_agents.shared_clients import get_azure_transport, get_credential
 
 class BankingOrchestrator(SemanticOrchastrator):
     def __init__(self):
@@ -27,19 +27,21 @@ class BankingOrchestrator(SemanticOrchastrator):
         self.logger.debug("Banking Orchestrator init")
         
         crm = CRMFacade(
-                key=DefaultAzureCredential(),
+                key=get_credential(),
                 cosmosdb_endpoint=os.getenv("COSMOSDB_ENDPOINT"),
                 crm_database_name=os.getenv("COSMOSDB_DATABASE_NAME"),
-                crm_container_name=os.getenv("COSMOSDB_CONTAINER_CLIENT_NAME"))
+                crm_container_name=os.getenv("COSMOSDB_CONTAINER_CLIENT_NAME"),
+                transport=get_azure_transport())
 
         product = FundsFacade(
-            credential=DefaultAzureCredential(),
+            credential=get_credential(),
+            transport=get_azure_transport(),
             service_endpoint=os.getenv('AI_SEARCH_ENDPOINT'),
             index_name=os.getenv('AI_SEARCH_FUNDS_INDEX_NAME'),
             semantic_configuration_name="default")
 
         self.kernel = Kernel(
-            services=[self.gpt4o_service],
+            services=[self.gpt4o_service, self.router_service],
             plugins=[
                 KernelPlugin.from_object(plugin_instance=crm, plugin_name="crm"),
                 KernelPlugin.from_object(plugin_instance=product, plugin_name="product"),
@@ -50,12 +52,13 @@ class BankingOrchestrator(SemanticOrchastrator):
     # --------------------------------------------
     # Selection Strategy
     # --------------------------------------------
-    def create_selection_strategy(self, agents, default_agent):
+    def create_selection_strategy(self, agents, default_agent, kernel=None):
         """Speaker selection strategy for the agent group chat."""
         definitions = "\n".join([f"{agent.name}: {agent.description}" for agent in agents])
         selection_function = KernelFunctionFromPrompt(
                 function_name="SpeakerSelector",
                 prompt_execution_settings=AzureChatPromptExecutionSettings(
+                    service_id="router",
                     temperature=0),
                 prompt=fr"""
                     You are the next speaker selector.
@@ -83,7 +86,7 @@ class BankingOrchestrator(SemanticOrchastrator):
             return default_agent.name
 
         return KernelFunctionSelectionStrategy(
-                    kernel=self.kernel,
+                    kernel=kernel or self.kernel,
                     function=selection_function,
                     result_parser=parse_selection_output,
                     agent_variable_name="agents",
@@ -112,7 +115,7 @@ class BankingOrchestrator(SemanticOrchastrator):
     # --------------------------------------------
     # Create Agent Group Chat
     # --------------------------------------------
-    def create_agent_group_chat(self):
+    def create_agent_group_chat(self, kernel=None):
         """
         Create an agent group chat using agents loaded from Azure AI Foundry.
         Agents are retrieved or created in Foundry using FoundryAgentUtils.ensure_agent.
@@ -120,35 +123,36 @@ class BankingOrchestrator(SemanticOrchastrator):
         The group chat is orchestrated using Semantic Kernel's AgentGroupChat.
         """
         self.logger.debug("Creating banking chat (Foundry)")
+        kernel = kernel or self.kernel
 
         # Agents are loaded from Foundry, falling back to YAML if not present in Foundry
         crm_agent = self.foundry_utils.ensure_agent(
             agent_name="CRMAgent",
-            kernel=self.kernel,
+            kernel=kernel,
             foundry_project_name=os.getenv("AI_PROJECT_CONNECTION_STRING"),
             fallback_yaml_path="sk/agents/banking/crm.yaml"
         )
         funds_agent = self.foundry_utils.ensure_agent(
             agent_name="FundsAgent",
-            kernel=self.kernel,
+            kernel=kernel,
             foundry_project_name=os.getenv("AI_PROJECT_CONNECTION_STRING"),
             fallback_yaml_path="sk/agents/banking/funds.yaml"
         )
         cio_agent = self.foundry_utils.ensure_agent(
             agent_name="CIOAgent",
-            kernel=self.kernel,
+            kernel=kernel,
             foundry_project_name=os.getenv("AI_PROJECT_CONNECTION_STRING"),
             fallback_yaml_path="sk/agents/banking/cio.yaml"
         )
         news_agent = self.foundry_utils.ensure_agent(
             agent_name="NewsAgent",
-            kernel=self.kernel,
+            kernel=kernel,
             foundry_project_name=os.getenv("AI_PROJECT_CONNECTION_STRING"),
             fallback_yaml_path="sk/agents/banking/news.yaml"
         )
         responder_agent = self.foundry_utils.ensure_agent(
             agent_name="SummariserAgent",
-            kernel=self.kernel,
+            kernel=kernel,
             foundry_project_name=os.getenv("AI_PROJECT_CONNECTION_STRING"),
             fallback_yaml_path="sk/agents/banking/responder.yaml"
         )
@@ -157,7 +161,7 @@ class BankingOrchestrator(SemanticOrchastrator):
 
         agent_group_chat = AgentGroupChat(
                 agents=agents,
-                selection_strategy=self.create_selection_strategy(agents, responder_agent),
+                selection_strategy=self.create_selection_strategy(agents, responder_agent, kernel),
                 termination_strategy = self.create_termination_strategy(
                                          agents=agents,
                                          final_agent=responder_agent,
@@ -14,7 +14,10 @@ from opentelemetry.trace import get_tracer
 
 from semantic_kernel.connectors.ai.azure_ai_inference import AzureAIInferenceChatCompletion
 import azure.ai.inference.aio as aio_inference
-import azure.identity.aio as aio_identity
+from azure.core.credentials import AzureKeyCredential
+
+from gbb.genai_vanilla_agents.shared_clients import get_async_credential
+from gbb.genai_vanilla_agents.llm_pool import create_endpoint_pool, endpoint_configs_from_env
 
 import util
 
@@ -28,27 +31,55 @@ class SemanticOrchastrator:
         self.logger = logging.getLogger(__name__)
         self.logger.debug("Semantic Orchestrator Handler init")
         
-        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-        deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-        
-        self.gpt4o_service = AzureAIInferenceChatCompletion(
+        # One chat completion service per deployment (AZURE_OPENAI_ENDPOINTS, or the single AZURE_OPENAI_ENDPOINT),
+        # each conversation is bound to a deployment picked from the pool
+        self.llm_pool = create_endpoint_pool(endpoint_configs_from_env(), self._create_chat_service)
+        self.gpt4o_service = self.llm_pool.endpoints[0].target
+        # The speaker selection is simple classification: it runs on the "router" service, set AZURE_OPENAI_ROUTER_DEPLOYMENT_NAME to use a smaller and faster model
+        router_config = {**self.llm_pool.endpoints[0].config}
+        if os.getenv("AZURE_OPENAI_ROUTER_DEPLOYMENT_NAME"):
+            router_config["azure_deployment"] = os.getenv("AZURE_OPENAI_ROUTER_DEPLOYMENT_NAME")
+        self.router_service = self._create_chat_service(router_config, service_id="router")
+        self._kernels = {}
+
+    def _create_chat_service(self, config, service_id=None):
+        return AzureAIInferenceChatCompletion(
             ai_model_id="gpt-4o",
+            service_id=service_id,
             client=aio_inference.ChatCompletionsClient(
-                endpoint=f"{str(endpoint).strip('/')}/openai/deployments/{deployment_name}",
-                credential=aio_identity.DefaultAzureCredential(),
+                endpoint=f"{str(config['azure_endpoint']).strip('/')}/openai/deployments/{config['azure_deployment']}",
+                # Key authentication when an API key is configured (e.g. testing/fake_openai_server.py), Entra ID otherwise
+                credential=AzureKeyCredential(config['api_key']) if config.get('api_key') else get_async_credential(),
                 credential_scopes=["https://cognitiveservices.azure.com/.default"],
             ))
+
+    def _kernel_for(self, endpoint):
+        """
+        The kernel of the subclass, with the chat completion service of the given endpoint.
+        """
+        if endpoint.target is self.gpt4o_service:
+            return self.kernel
+        kernel = self._kernels.get(endpoint.name)
+        if kernel is None:
+            kernel = self.kernel.clone()
+            kernel.remove_all_services()
+            kernel.add_service(endpoint.target)
+            kernel.add_service(self.router_service)
+            self._kernels[endpoint.name] = kernel
+        return kernel
  
  
     # --------------------------------------------
     # ABSTRACT method - MUST be implemented by the subclass
     # --------------------------------------------
     @abstractmethod
-    def create_agent_group_chat(self): 
+    def create_agent_group_chat(self, kernel=None): 
         pass
     
     async def process_conversation(self, user_id, conversation_messages):
-        agent_group_chat = self.create_agent_group_chat()
+        endpoint = self.llm_pool.select()
+        self.logger.debug(f"Conversation bound to endpoint {endpoint.name}")
+        agent_group_chat = self.create_agent_group_chat(self._kernel_for(endpoint))
         chat_history = [
             ChatMessageContent(
                 role=AuthorRole(d.get('role')),
@@ -61,8 +92,15 @@ class SemanticOrchastrator:
         
         tracer = get_tracer(__name__)
         with tracer.start_as_current_span("AgenticChat"):
-            async for _ in agent_group_chat.invoke():
-                pass
+            try:
+                async for _ in agent_group_chat.invoke():
+                    pass
+            except Exception as e:
+                # Only the endpoint failures (throttling, 5xx, timeouts, connection errors) count against the endpoint health
+                self.llm_pool.report_error(endpoint, e)
+                raise
+        # No latency sample: a whole conversation is not comparable to a single completion
+        self.llm_pool.report_success(endpoint)
 
         response = list(reversed([item async for item in agent_group_chat.get_chat_messages()]))
 
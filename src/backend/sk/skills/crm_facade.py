@@ -14,12 +14,13 @@ class CRMFacade:
     Once a single framwork is adopted it can be retired.
     """
     
-    def __init__(self, key, cosmosdb_endpoint, crm_database_name, crm_container_name):
+    def __init__(self, key, cosmosdb_endpoint, crm_database_name, crm_container_name, transport=None):
         self.crm_db = CRMStore(
             url=cosmosdb_endpoint,
             key=key,
             database_name=crm_database_name,
-            container_name=crm_container_name)
+            container_name=crm_container_name,
+            transport=transport)
 
     @kernel_function(
         name="load_from_crm_by_client_fullname",
@@ -7,16 +7,21 @@ from azure.search.documents.models import VectorizableTextQuery
 
 from semantic_kernel.functions import kernel_function
 
+from gbb.genai_vanilla_agents.tool_cache import AI_SEARCH_TAG, ToolCachePolicy, cached_tool, watch_indexer
+
 class FundsFacade:
-    def __init__(self, service_endpoint, credential, index_name, semantic_configuration_name):
+    def __init__(self, service_endpoint, credential, index_name, semantic_configuration_name, transport=None):
         self.semantic_configuration_name = semantic_configuration_name
-        self.search_client = SearchClient(service_endpoint, index_name, credential)
+        self.search_client = SearchClient(service_endpoint, index_name, credential, **({"transport": transport} if transport is not None else {}))
+        # The cached searches are dropped when a new run of the indexer completes
+        watch_indexer(service_endpoint, index_name, credential, tag=AI_SEARCH_TAG)
         # self.search_client = SearchClient(service_endpoint, index_name, AzureKeyCredential(key))
 
     @kernel_function(
         name="search_funds_details", 
         description="Search details about Funds and or ETFs"
     )
+    @cached_tool(ToolCachePolicy(ttl=3600, tags=[AI_SEARCH_TAG]))
     def search(self, query: Annotated[str,"The query to search for"]) -> Annotated[str, "The output in JSON format"]:
         
         text_vector_query = VectorizableTextQuery(
@@ -0,0 +1,100 @@
+"""
+Micro-benchmark of the CPU time spent by Agent.ask and by the Team routing prompt, excluding the network.
+
+The LLM is replaced by an in-process stub answering immediately, so the timings only cover the preparation of the request
+(tool schemas and bindings, messages, token estimates) and the handling of the response.
+The previous implementation (schema of update_conversation_variable and roster rebuilt on every call) is kept here as the baseline.
+
+Usage:
+    python src/backend/testing/benchmark_agent.py [--messages 20] [--tools 5] [--repeat 2000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Annotated
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gbb.genai_vanilla_agents.agent import Agent
+from gbb.genai_vanilla_agents.conversation import Conversation
+from gbb.genai_vanilla_agents.function_utils import get_function_schema, wrap_function
+from gbb.genai_vanilla_agents.team import CACHE_LAYOUT_SELECTION_PROMPT, Team
+from stubs import StubLLM
+
+USAGE = {"completion_tokens": 2, "prompt_tokens": 100, "total_tokens": 102, "cached_tokens": 0}
+
+
+def make_agent(index, tools):
+    agent = Agent(id=f"agent_{index}", description=f"Agent number {index}, handles the inquiries of kind {index}.",
+                  system_message="You are a helpful assistant.\n\n## CONTEXT\n__context__", llm=StubLLM(usage=USAGE))
+    for tool_index in range(tools):
+        def tool(client_id: Annotated[str, "The client id"], fields: Annotated[list[str], "The fields to load"] = None) -> str:
+            return "{}"
+        agent.register_tool(name=f"tool_{tool_index}", description=f"Tool number {tool_index} of the agent")(tool)
+    return agent
+
+
+def make_conversation(messages):
+    conversation = Conversation(messages=[{"role": "system", "content": ""}], variables={"client_id": "123456"})
+    for i in range(messages):
+        role = "user" if i % 2 == 0 else "assistant"
+        conversation.messages.append({"role": role, "name": role, "content": f"Message {i} about the portfolio of the client and its risk profile."})
+    return conversation
+
+
+# Previous implementation, kept here as the baseline
+def legacy_prepare_llm_tools(agent, conversation):
+    def update_conversation_variable(
+        variableName: Annotated[str, "The variable name to update"],
+        variableValue: Annotated[str, "The new value of the variable"]) -> Annotated[str, "Confirmation that the variable was updated"]:
+        conversation.variables[variableName] = variableValue
+        return f"Variable {variableName} updated to {variableValue}"
+
+    s = get_function_schema(update_conversation_variable, name="update_conversation_variable", description="update a conversation or context variable")
+    return agent.tools + [s], {**agent.tools_function, "update_conversation_variable": wrap_function(update_conversation_variable)}
+
+
+def legacy_prepare_selection_messages(team, conversation):
+    agents_info = team.generate_agents_info()
+    history = team.construct_message_history(conversation)
+    return [{"role": "system", "content": CACHE_LAYOUT_SELECTION_PROMPT.format(agents=agents_info)},
+            {"role": "user", "content": f"# CHAT HISTORY\n\n{history}\n\nRead the conversation and provide the agent_id of the next speaker."}]
+
+
+def measure(func, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return round(statistics.median(durations) * 1e6, 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU time per Agent.ask and per Team routing prompt, without network")
+    parser.add_argument("--messages", type=int, default=20, help="Messages in the conversation")
+    parser.add_argument("--tools", type=int, default=5, help="Tools registered per agent")
+    parser.add_argument("--agents", type=int, default=6, help="Agents in the team")
+    parser.add_argument("--repeat", type=int, default=2000, help="Repetitions, the median is reported")
+    args = parser.parse_args()
+
+    agents = [make_agent(i, args.tools) for i in range(args.agents)]
+    team = Team(llm=StubLLM(usage=USAGE), description="Benchmark team", id="team", members=agents,
+                stop_callback=lambda messages: True, include_tools_descriptions=True, prompt_layout="cache")
+    conversation = make_conversation(args.messages)
+    agent = agents[0]
+
+    def ask():
+        agent.ask(conversation)
+        # Keep the conversation size stable
+        conversation.messages.pop()
+
+    results = {
+        "prepare_tools_baseline_us": measure(lambda: legacy_prepare_llm_tools(agent, conversation), args.repeat),
+        "prepare_tools_us": measure(lambda: agent._prepare_llm_tools(conversation), args.repeat),
+        "ask_us": measure(ask, args.repeat),
+        "selection_prompt_baseline_us": measure(lambda: legacy_prepare_selection_messages(team, conversation), args.repeat),
+        "selection_prompt_us": measure(lambda: team._prepare_selection_messages(conversation), args.repeat),
+    }
+    print("  ".join(f"{key}={value}" for key, value in results.items()))
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark of the conversation reading strategies over long histories.
+
+The previous implementations (copy of the messages without the system ones, then slicing, and a new Conversation per pipeline stage)
+are kept here as the baseline, the selected messages of both implementations are checked to be the same.
+
+Usage:
+    python src/backend/testing/benchmark_reading_strategy.py [--sizes 1000 5000 10000] [--repeat 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gbb.genai_vanilla_agents.conversation import (AllMessagesStrategy, Conversation, LastNMessagesStrategy,
+                                                   PipelineConversationReadingStrategy, TopKLastNMessagesStrategy)
+
+
+# Previous implementations, kept here as the baseline
+def legacy_exclude_system_messages(messages):
+    return [message for message in messages if message["role"] != "system"]
+
+
+def legacy_last_n(n):
+    return lambda conversation: legacy_exclude_system_messages(conversation.messages)[-n:]
+
+
+def legacy_all(conversation):
+    return legacy_exclude_system_messages(conversation.messages)
+
+
+def legacy_top_k_last_n(k, n):
+    def get_messages(conversation):
+        messages = legacy_exclude_system_messages(conversation.messages)
+        return messages[:k] + messages[-n:]
+    return get_messages
+
+
+def legacy_pipeline(stages):
+    def get_messages(conversation):
+        messages = conversation.messages
+        for stage in stages:
+            messages = stage(Conversation(messages=messages, metrics=conversation.metrics))
+        return messages
+    return get_messages
+
+
+def make_conversation(size):
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    for i in range(size - 1):
+        role = ("user", "assistant", "tool", "system")[i % 4] if i % 50 == 49 else ("user", "assistant")[i % 2]
+        messages.append({"role": role, "name": role, "content": f"Message {i} about the portfolio of the client."})
+    return Conversation(messages=messages)
+
+
+def measure(func, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return round(statistics.median(durations) * 1e6, 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time per get_messages call of the reading strategies, legacy copies vs message views")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 10000], help="Messages in the conversation")
+    parser.add_argument("--repeat", type=int, default=200, help="Repetitions, the median is reported")
+    args = parser.parse_args()
+
+    cases = {
+        "last_20": (legacy_last_n(20), LastNMessagesStrategy(20)),
+        "top_2_last_20": (legacy_top_k_last_n(2, 20), TopKLastNMessagesStrategy(2, 20)),
+        "all": (legacy_all, AllMessagesStrategy()),
+        "pipeline_top_2_last_100_then_last_20": (
+            legacy_pipeline([legacy_top_k_last_n(2, 100), legacy_last_n(20)]),
+            PipelineConversationReadingStrategy([TopKLastNMessagesStrategy(2, 100), LastNMessagesStrategy(20)])),
+    }
+    for size in args.sizes:
+        conversation = make_conversation(size)
+        for name, (legacy, strategy) in cases.items():
+            if legacy(conversation) != strategy.get_messages(conversation):
+                print(f"size={size} {name}: the selected messages differ from the baseline")
+                sys.exit(1)
+            baseline = measure(lambda: legacy(conversation), args.repeat)
+            current = measure(lambda: strategy.get_messages(conversation), args.repeat)
+            print(f"size={size}  {name}  baseline_us={baseline}  view_us={current}  speedup={baseline / max(current, 0.1):.1f}x")
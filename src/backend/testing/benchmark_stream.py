@@ -0,0 +1,138 @@
+"""
+Micro-benchmark of the per-chunk CPU cost of the streamed completion processing in AzureOpenAILLM.ask_stream.
+
+Compares the previous implementation (pydantic dump + json round trip of every delta, recursive merge, += concatenation)
+with StreamAccumulator (direct field reads, list-joined buffers), with and without delta coalescing.
+Chunks are built in memory, no network is involved.
+
+Usage:
+    python src/backend/testing/benchmark_stream.py [--chunks 2000] [--repeat 20] [--coalesce 32]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk, Choice, ChoiceDelta, ChoiceDeltaToolCall, ChoiceDeltaToolCallFunction
+from openai.types.completion_usage import CompletionUsage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gbb.genai_vanilla_agents.llm import StreamAccumulator
+
+
+def content_chunks(count):
+    words = "The portfolio is well diversified across equities and fixed income with a moderate risk profile".split(" ")
+    chunks = [ChatCompletionChunk(id="chatcmpl-bench", object="chat.completion.chunk", created=0, model="gpt-4o",
+                                  choices=[Choice(index=0, delta=ChoiceDelta(role="assistant", content=""), finish_reason=None)])]
+    for i in range(count):
+        chunks.append(ChatCompletionChunk(id="chatcmpl-bench", object="chat.completion.chunk", created=0, model="gpt-4o",
+                                          choices=[Choice(index=0, delta=ChoiceDelta(content=" " + words[i % len(words)]), finish_reason=None)]))
+    chunks.append(ChatCompletionChunk(id="chatcmpl-bench", object="chat.completion.chunk", created=0, model="gpt-4o", choices=[],
+                                      usage=CompletionUsage(completion_tokens=count, prompt_tokens=1000, total_tokens=count + 1000)))
+    return chunks
+
+
+def tool_call_chunks(count):
+    arguments = json.dumps({"full_name": "Pete Mitchell", "fields": ["portfolio", "investmentProfile"]})
+    pieces = [arguments[i:i + 4] for i in range(0, len(arguments), 4)]
+    chunks = [ChatCompletionChunk(id="chatcmpl-bench", object="chat.completion.chunk", created=0, model="gpt-4o",
+                                  choices=[Choice(index=0, delta=ChoiceDelta(tool_calls=[ChoiceDeltaToolCall(
+                                      index=0, id="call_bench", type="function",
+                                      function=ChoiceDeltaToolCallFunction(name="load_from_crm_by_client_fullname", arguments=""))]), finish_reason=None)])]
+    for i in range(count):
+        chunks.append(ChatCompletionChunk(id="chatcmpl-bench", object="chat.completion.chunk", created=0, model="gpt-4o",
+                                          choices=[Choice(index=0, delta=ChoiceDelta(tool_calls=[ChoiceDeltaToolCall(
+                                              index=0, function=ChoiceDeltaToolCallFunction(arguments=pieces[i % len(pieces)]))]), finish_reason=None)]))
+    return chunks
+
+
+# Previous implementation, kept here as the baseline
+def merge_fields(target, source):
+    for key, value in source.items():
+        if isinstance(value, str):
+            target[key] += value
+        elif value is not None and isinstance(value, dict):
+            merge_fields(target[key], value)
+
+
+def merge_chunk(source, delta):
+    delta.pop("role", None)
+    merge_fields(source, delta)
+
+    tool_calls = delta.get("tool_calls")
+    if tool_calls and len(tool_calls) > 0:
+        index = tool_calls[0].pop("index")
+        merge_fields(source["tool_calls"][index], tool_calls[0])
+
+
+def baseline(chunks, updates):
+    usage = {"completion_tokens": 0, "prompt_tokens": 0, "total_tokens": 0}
+    response_message = {
+        "content": "",
+        "role": "assistant",
+        "function_call": None,
+        "tool_calls": defaultdict(lambda: {"function": {"arguments": "", "name": ""}, "id": "", "type": ""})
+    }
+    for chunk in chunks:
+        if len(chunk.choices) > 0:
+            delta = json.loads(chunk.choices[0].delta.model_dump_json())
+            updates.append(["delta", delta])
+            delta.pop("role", None)
+            delta.pop("name", None)
+            merge_chunk(response_message, delta)
+        if chunk.usage:
+            usage["completion_tokens"] += chunk.usage.completion_tokens
+            usage["prompt_tokens"] += chunk.usage.prompt_tokens
+            usage["total_tokens"] += chunk.usage.total_tokens
+    return response_message
+
+
+def accumulator(coalesce_chars):
+    def run(chunks, updates):
+        usage = {"completion_tokens": 0, "prompt_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+        acc = StreamAccumulator(usage, coalesce_chars)
+        for chunk in chunks:
+            delta = acc.add(chunk)
+            if delta is not None:
+                updates.append(["delta", delta])
+        delta = acc.flush()
+        if delta is not None:
+            updates.append(["delta", delta])
+        return acc.message()
+    return run
+
+
+def measure(name, func, chunks, repeat):
+    durations = []
+    events = 0
+    for _ in range(repeat):
+        updates = []
+        started = time.perf_counter()
+        func(chunks, updates)
+        durations.append(time.perf_counter() - started)
+        events = len(updates)
+    per_chunk_us = statistics.median(durations) / len(chunks) * 1e6
+    return {"name": name, "chunks": len(chunks), "events": events, "per_chunk_us": round(per_chunk_us, 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-chunk CPU cost of the stream processing")
+    parser.add_argument("--chunks", type=int, default=2000, help="Chunks per stream")
+    parser.add_argument("--repeat", type=int, default=20, help="Repetitions, the median is reported")
+    parser.add_argument("--coalesce", type=int, default=32, help="stream_coalesce_chars of the coalescing variant")
+    args = parser.parse_args()
+
+    for stream_name, chunks in (("content", content_chunks(args.chunks)), ("tool_call", tool_call_chunks(args.chunks))):
+        # Both implementations must produce the same message
+        expected = baseline(chunks, [])
+        actual = accumulator(0)(chunks, [])
+        assert expected["content"] == actual["content"], "content mismatch"
+        assert [tool_call["function"]["arguments"] for tool_call in expected["tool_calls"].values()] == \
+            [tool_call["function"]["arguments"] for tool_call in actual["tool_calls"]], "tool call mismatch"
+
+        for name, func in (("baseline", baseline), ("accumulator", accumulator(0)), (f"accumulator_coalesce_{args.coalesce}", accumulator(args.coalesce))):
+            result = measure(name, func, chunks, args.repeat)
+            print(f"{stream_name:10} " + "  ".join(f"{key}={value}" for key, value in result.items()))
@@ -0,0 +1,53 @@
+"""
+Size of the summarization requests of a PlannedTeam fork strategy over the turns of a chat, full vs incremental summaries.
+
+The LLMs are replaced by in-process stubs, no network is involved. Each turn runs a two steps plan on a forked conversation
+whose summary is written back to the chat, the conversation is serialized between the turns as done by the handler.
+
+Usage:
+    python src/backend/testing/benchmark_summary.py [--turns 30]
+"""
+import argparse
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletionMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gbb.genai_vanilla_agents.agent import Agent
+from gbb.genai_vanilla_agents.conversation import Conversation, SummarizeMessagesStrategy
+from gbb.genai_vanilla_agents.planned_team import PlannedTeam, TeamPlan, TeamPlanStep
+from gbb.genai_vanilla_agents.workflow import Workflow
+from stubs import StubLLM
+
+
+def run_chat(turns, incremental):
+    agents = [Agent(id=f"agent_{i}", description=f"Agent {i}", system_message="Answer.",
+                    llm=StubLLM(lambda messages, i=i: ChatCompletionMessage(role="assistant", content=f"Answer of agent {i}")))
+              for i in range(2)]
+    planner = StubLLM(lambda messages: SimpleNamespace(parsed=TeamPlan(plan=[TeamPlanStep(agent_id=agent.id, instructions="Answer") for agent in agents])))
+    summarizer = StubLLM(lambda messages: ChatCompletionMessage(role="assistant", content=f"Summary of {len(messages) - 1} messages"), record_requests=True)
+    team = PlannedTeam(llm=planner, description="Summary team", id="team", members=agents, fork_conversation=True,
+                       fork_strategy=SummarizeMessagesStrategy(summarizer, "Summarize the conversation.", incremental=incremental))
+
+    data = Conversation().to_dict()
+    for turn in range(turns):
+        conversation = Conversation.from_dict(json.loads(json.dumps(data)))
+        Workflow(askable=team, conversation=conversation).run(f"Inquiry {turn}")
+        data = conversation.to_dict()
+    return summarizer.requests
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Messages sent to the summarizer per turn, full vs incremental")
+    parser.add_argument("--turns", type=int, default=30, help="Turns of the chat")
+    args = parser.parse_args()
+
+    full = run_chat(args.turns, incremental=False)
+    incremental = run_chat(args.turns, incremental=True)
+    print(f"turns={args.turns}")
+    print(f"full: messages per summary first={full[0]} last={full[-1]} total={sum(full)}")
+    print(f"incremental: messages per summary first={incremental[0]} last={incremental[-1]} total={sum(incremental)}")
+    sys.exit(0 if incremental[-1] <= incremental[1] else 1)
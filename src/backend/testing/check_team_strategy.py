@@ -0,0 +1,58 @@
+"""
+Regression check of the local team strategy rules on the predefined questions of the frontend, and on inquiries they got wrong.
+
+The rules must either be right or defer to the model (None): a confident wrong answer means the model is never consulted.
+No model is called.
+
+Usage:
+    python src/backend/testing/check_team_strategy.py
+"""
+import os
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(os.path.dirname(BACKEND), "frontend"))
+from config import BANK_PREDEFINED_QUESTIONS, INS_PREDEFINED_QUESTIONS
+from gbb.agents.fsi_banking.config import create_strategy_rules as create_banking_rules
+from gbb.agents.fsi_insurance.config import create_strategy_rules as create_insurance_rules
+from gbb.agents.team_strategy import MULTIPLE, SINGLE
+
+# The expected decision of each inquiry, None when the model must decide
+BANKING_CASES = {
+    "Provide me a summary of the portfolio's positions of my client id 123456": SINGLE,
+    "What are our Chief Investment Office (CIO) believes on the AI sector?": SINGLE,
+    "What is our in-house view from our CIO about Growth investing?": SINGLE,
+    "Show Pete Mitchell portfolio performance and suggest any rebalancing options based on recent CIO views.": MULTIPLE,
+    "List 3 Funds or ETFs we are offering for growth focused strategies": SINGLE,
+    "Can you give me an update on the UBS 100 Index Switzerland Equity Fund CHF and its latest performance?": SINGLE,
+    "Craft a rebalance proposal for the client Pete Mitchell increasing the weight of investments in tech stocks absed on our offering": None,
+    "What does the Chief Investment Office think about equities": SINGLE,
+    "Show the portfolio of client 123456 and also the latest news about its positions": MULTIPLE,
+    "Hello": SINGLE,
+}
+INSURANCE_CASES = {
+    "Provide information about my client John Doe": SINGLE,
+    "Can he travel to Bali with his current coverage?": None,
+    "Do we cover COVID-19 treatements in Indonesia?": None,
+}
+
+
+def check(name, rules, questions, cases):
+    missing = [question for question in questions if question not in cases]
+    if missing:
+        print(f"{name}: no expected decision for the predefined questions {missing}")
+    failures = 0
+    for inquiry, expected in cases.items():
+        decision = rules.decide(inquiry)
+        if decision != expected:
+            failures += 1
+            print(f"{name}: {inquiry!r} decided {decision}, expected {expected} (domains {sorted(rules.matched_domains(inquiry))})")
+    print(f"{name}: {len(cases)} inquiries, {failures} failures")
+    return failures + len(missing)
+
+
+if __name__ == "__main__":
+    failures = check("banking", create_banking_rules(), BANK_PREDEFINED_QUESTIONS, BANKING_CASES)
+    failures += check("insurance", create_insurance_rules(), INS_PREDEFINED_QUESTIONS, INSURANCE_CASES)
+    sys.exit(1 if failures else 0)
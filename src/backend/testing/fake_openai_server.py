@@ -0,0 +1,311 @@
+"""
+Local fake of the Azure OpenAI chat completions API, for wire-level load testing.
+
+Implements the subset used by the backend: non-streaming completions, stream=True with stream_options.include_usage,
+tool calls and structured outputs (response_format json_schema, as sent by beta.chat.completions.parse).
+Both the Azure OpenAI route (/openai/deployments/{deployment}/chat/completions, used by AzureOpenAILLM and by the SK
+AzureAIInferenceChatCompletion service) and the OpenAI route (/v1/chat/completions) are served. Any API key is accepted.
+
+Responses come from a script: a JSON list of rules evaluated in order, the first matching one wins:
+
+    [
+        {"match": "single or multiple", "content": "multiple"},
+        {"match": "next speaker", "json": {"agent_id": "crm", "reason": "client data needed"}},
+        {"match": "portfolio", "tool_calls": [{"name": "load_from_crm_by_client_fullname", "arguments": {"full_name": "Pete Mitchell"}}]},
+        {"content": "This is a fake response."}
+    ]
+
+- match: optional regex, searched in the content of all the request messages (case-insensitive)
+- content / json: the response text, json being serialized (for structured outputs)
+- tool_calls: returned only when the request has tools and the last message is not a tool result, otherwise the next rule applies
+- latency, ttft, tokens_per_second, error_rate: optional per-rule overrides of the server knobs
+
+Without a matching rule, structured output requests get an instance generated from the JSON schema and the others a default text.
+
+Usage:
+    python src/backend/testing/fake_openai_server.py --port 8089 [--script script.json] [--latency 0.2] [--ttft 0.3] [--tokens-per-second 50] [--error-rate 0.01]
+
+Then point the backend at it, e.g. AZURE_OPENAI_ENDPOINT=http://localhost:8089 AZURE_OPENAI_KEY=fake.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_CONTENT = "This is a fake response from the local OpenAI server."
+
+AZURE_PATH = re.compile(r"^/openai/deployments/(?P<deployment>[^/]+)/chat/completions$")
+OPENAI_PATH = re.compile(r"^/(v1/)?chat/completions$")
+
+
+def count_tokens(text):
+    # ~4 characters per token, good enough for load testing
+    return max(1, len(text) // 4) if text else 0
+
+
+def split_tokens(text):
+    """Split text into token-like pieces (words with their leading space), to be streamed one by one."""
+    return re.findall(r"\s*\S+", text) or [text]
+
+
+def instance_from_schema(schema, definitions=None):
+    """Generate a minimal instance of a JSON schema, for structured output requests without a scripted response."""
+    definitions = definitions if definitions is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return instance_from_schema(definitions[schema["$ref"].split("/")[-1]], definitions)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "anyOf" in schema:
+        return instance_from_schema(schema["anyOf"][0], definitions)
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        return {name: instance_from_schema(prop, definitions) for name, prop in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        return [instance_from_schema(schema.get("items", {}), definitions)]
+    if schema_type == "integer":
+        return 0
+    if schema_type == "number":
+        return 0.0
+    if schema_type == "boolean":
+        return False
+    if schema_type == "null":
+        return None
+    return "fake"
+
+
+class FakeOpenAIServer:
+    """
+    The fake server, runnable in-process (start/stop, or as a context manager) or from the command line.
+
+    Args:
+    - script (list[dict]): The scripted response rules, see the module docstring.
+    - latency (float): Seconds before a non-streamed response.
+    - ttft (float): Seconds before the first streamed chunk (time to first token).
+    - tokens_per_second (float): Generation throughput, paces the streamed chunks and adds to the non-streamed latency. 0 for no limit.
+    - error_rate (float): Fraction of requests answered with 429 and a retry-after-ms header.
+    - retry_after_ms (int): The retry-after-ms of the injected 429 errors.
+    - seed (int): Random seed of the error injection.
+    """
+    def __init__(self, host="127.0.0.1", port=0, script=None, latency=0.0, ttft=0.0, tokens_per_second=0.0, error_rate=0.0, retry_after_ms=100, seed=42):
+        self.script = script or []
+        self.latency = latency
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.retry_after_ms = retry_after_ms
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "streamed": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def record(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def should_fail(self, rule):
+        error_rate = rule.get("error_rate", self.error_rate)
+        if not error_rate:
+            return False
+        with self.lock:
+            return self.random.random() < error_rate
+
+    def select_rule(self, request):
+        messages = request.get("messages", [])
+        text = "\n".join(m["content"] if isinstance(m.get("content"), str) else json.dumps(m.get("content")) for m in messages if m.get("content"))
+        last_is_tool_result = bool(messages) and messages[-1].get("role") == "tool"
+        for rule in self.script:
+            if rule.get("match") and not re.search(rule["match"], text, re.IGNORECASE):
+                continue
+            if "tool_calls" in rule and (not request.get("tools") or last_is_tool_result):
+                continue
+            return rule
+        return {}
+
+    def build_message(self, request, rule):
+        """Returns the content and tool calls of the response."""
+        if "tool_calls" in rule:
+            tool_calls = [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments", {}))},
+            } for call in rule["tool_calls"]]
+            return None, tool_calls
+        if "json" in rule:
+            return json.dumps(rule["json"]), None
+        if "content" in rule:
+            return rule["content"], None
+        response_format = request.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            return json.dumps(instance_from_schema(response_format["json_schema"].get("schema", {}))), None
+        if response_format.get("type") == "json_object":
+            return "{}", None
+        return DEFAULT_CONTENT, None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                path = self.path.split("?")[0]
+                match = AZURE_PATH.match(path)
+                if not match and not OPENAI_PATH.match(path):
+                    self.send_json(404, {"error": {"code": "404", "message": f"Unknown path {path}"}})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                model = match.group("deployment") if match else request.get("model", "fake")
+                server.record(requests=1)
+
+                rule = server.select_rule(request)
+                if server.should_fail(rule):
+                    server.record(errors=1)
+                    self.send_json(429, {"error": {"code": "429", "message": "Rate limit is exceeded (fake)."}},
+                                   headers={"retry-after-ms": str(server.retry_after_ms), "retry-after": str(max(1, server.retry_after_ms // 1000))})
+                    return
+
+                content, tool_calls = server.build_message(request, rule)
+                prompt_tokens = count_tokens(json.dumps(request.get("messages", []))) + (count_tokens(json.dumps(request["tools"])) if request.get("tools") else 0)
+                completion_tokens = count_tokens(content) if content else count_tokens(json.dumps(tool_calls))
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+                server.record(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+                tokens_per_second = rule.get("tokens_per_second", server.tokens_per_second)
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+                if request.get("stream"):
+                    server.record(streamed=1)
+                    include_usage = (request.get("stream_options") or {}).get("include_usage", False)
+                    self.send_stream(completion_id, model, content, tool_calls, usage if include_usage else None,
+                                     rule.get("ttft", server.ttft), tokens_per_second)
+                    return
+
+                delay = rule.get("latency", server.latency) + (completion_tokens / tokens_per_second if tokens_per_second else 0)
+                if delay:
+                    time.sleep(delay)
+                self.send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "finish_reason": "tool_calls" if tool_calls else "stop",
+                        "message": {"role": "assistant", "content": content, "tool_calls": tool_calls, "refusal": None},
+                    }],
+                    "usage": usage,
+                })
+
+            def send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_event(self, body):
+                data = f"data: {body if isinstance(body, str) else json.dumps(body)}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def send_stream(self, completion_id, model, content, tool_calls, usage, ttft, tokens_per_second):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def chunk(delta, finish_reason=None, chunk_usage=None):
+                    return {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+                        "usage": chunk_usage,
+                    }
+
+                if ttft:
+                    time.sleep(ttft)
+                self.send_event(chunk({"role": "assistant", "content": "" if content is not None else None}))
+                if tool_calls:
+                    for index, tool_call in enumerate(tool_calls):
+                        self.send_event(chunk({"tool_calls": [{"index": index, "id": tool_call["id"], "type": "function",
+                                                               "function": {"name": tool_call["function"]["name"], "arguments": ""}}]}))
+                        self.send_event(chunk({"tool_calls": [{"index": index, "function": {"arguments": tool_call["function"]["arguments"]}}]}))
+                else:
+                    interval = 1 / tokens_per_second if tokens_per_second else 0
+                    for token in split_tokens(content):
+                        if interval:
+                            time.sleep(interval)
+                        self.send_event(chunk({"content": token}))
+                self.send_event(chunk({}, finish_reason="tool_calls" if tool_calls else "stop"))
+                if usage is not None:
+                    self.send_event(chunk(None, chunk_usage=usage))
+                self.send_event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake of the Azure OpenAI chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--script", default=None, help="JSON file with the scripted response rules")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before a non-streamed response")
+    parser.add_argument("--ttft", type=float, default=0.0, help="Seconds before the first streamed chunk")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Generation throughput, 0 for no limit")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after-ms", type=int, default=100, help="retry-after-ms of the injected 429 errors")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as file:
+            script = json.load(file)
+
+    server = FakeOpenAIServer(args.host, args.port, script=script, latency=args.latency, ttft=args.ttft,
+                              tokens_per_second=args.tokens_per_second, error_rate=args.error_rate, retry_after_ms=args.retry_after_ms)
+    print(f"Fake OpenAI server listening on {server.endpoint}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats))
+        server.httpd.server_close()
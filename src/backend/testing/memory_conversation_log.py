@@ -0,0 +1,85 @@
+"""
+Memory check of the conversation state over thousands of workflow runs, as served by a long running process.
+
+The LLMs are replaced by in-process stubs, one of the agents fails on every other call so that errors (with their exceptions) are logged too:
+- "fresh" mode: every run uses a new Conversation() built with the default arguments, nothing must be shared between them;
+- "session" mode: all the runs use the same conversation, its messages are trimmed after each run (as a reading strategy would do)
+  so that only the event log can grow, and it must stay within CONVERSATION_LOG_MAX_EVENTS.
+The traced memory is sampled after each batch of runs and must stay flat after the warmup.
+
+Usage:
+    python src/backend/testing/memory_conversation_log.py [--runs 5000] [--mode fresh|session]
+"""
+import argparse
+import gc
+import itertools
+import os
+import sys
+import tracemalloc
+
+from openai.types.chat import ChatCompletionMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gbb.genai_vanilla_agents.agent import Agent
+from gbb.genai_vanilla_agents.conversation import Conversation
+from gbb.genai_vanilla_agents.team import AgentChoiceResponse, Team
+from gbb.genai_vanilla_agents.workflow import Workflow
+from stubs import StubLLM
+
+
+def failing_answer(calls):
+    if calls % 2 == 0:
+        raise RuntimeError(f"call {calls} failed " + "x" * 1000)
+    return ChatCompletionMessage(role="assistant", content="Answer " + "y" * 1000)
+
+
+def build_team():
+    class Choice:
+        def __init__(self, agent_id):
+            self.parsed = AgentChoiceResponse(agent_id=agent_id, reason="stub")
+
+    answering = Agent(id="answering", description="Answers", system_message="Answer.",
+                      llm=StubLLM(lambda messages: ChatCompletionMessage(role="assistant", content="Answer " + "z" * 1000)))
+    failing_calls = itertools.count(1)
+    failing = Agent(id="failing", description="Fails every other call", system_message="Answer.",
+                    llm=StubLLM(lambda messages: failing_answer(next(failing_calls))))
+    router_calls = itertools.count(1)
+    router = StubLLM(lambda messages: Choice("failing" if next(router_calls) % 2 else "answering"))
+    # Two agent turns per run
+    return Team(llm=router, description="Memory team", id="team", members=[answering, failing],
+                stop_callback=lambda messages: sum(1 for message in messages if message.get("role") == "assistant") >= 2)
+
+
+def traced_kib():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Traced memory over many workflow runs")
+    parser.add_argument("--runs", type=int, default=5000, help="Workflow runs")
+    parser.add_argument("--batch", type=int, default=500, help="Runs between two memory samples")
+    parser.add_argument("--mode", choices=["fresh", "session"], default="fresh", help="A new conversation per run, or one conversation for all the runs")
+    parser.add_argument("--max-growth-kib", type=float, default=256, help="Maximum growth between the first and the last sample")
+    args = parser.parse_args()
+
+    team = build_team()
+    session = Conversation()
+    samples = []
+    tracemalloc.start()
+    for run in range(1, args.runs + 1):
+        conversation = Conversation() if args.mode == "fresh" else session
+        Workflow(askable=team, conversation=conversation).run(f"Inquiry {run}")
+        if args.mode == "session":
+            del conversation.messages[:]
+        if run % args.batch == 0:
+            samples.append(traced_kib())
+            print(f"runs={run} traced_kib={samples[-1]:.1f} log_events={len(conversation.log)} log_dropped={conversation.log.dropped}")
+
+    shared = Conversation()
+    if shared.messages or len(shared.log):
+        print(f"A new conversation already has {len(shared.messages)} messages and {len(shared.log)} events")
+        sys.exit(1)
+    growth = samples[-1] - samples[0]
+    print(f"mode={args.mode} runs={args.runs} growth_kib={growth:.1f}")
+    sys.exit(1 if growth > args.max_growth_kib else 0)
@@ -0,0 +1,157 @@
+"""
+Concurrency stress test of Team and PlannedTeam instances shared by many parallel workflows, as the gbb agents are shared by the requests.
+
+The LLMs are replaced by in-process stubs with random latencies, no network is involved:
+- each request asks for its own route (a sequence of agents), the router stub follows it and the planner stub plans it;
+- the team only allows the transitions agent_i -> agent_i+1, so an orchestrator reading the current agent of another run rejects valid choices;
+- every run must end with exactly the answers of its route, tagged with its own request id.
+
+Usage:
+    python src/backend/testing/stress_team.py [--requests 200] [--concurrency 32] [--mode thread|async] [--team team|planned]
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletionMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gbb.genai_vanilla_agents.agent import Agent
+from gbb.genai_vanilla_agents.conversation import Conversation
+from gbb.genai_vanilla_agents.planned_team import PlannedTeam, TeamPlan, TeamPlanStep
+from gbb.genai_vanilla_agents.team import AgentChoiceResponse, Team
+from gbb.genai_vanilla_agents.workflow import Workflow
+from stubs import StubLLM
+
+AGENTS = 4
+ROUTE = re.compile(r"request (\d+) route: ([\w ]+)")
+# A run whose router is asked more than this is stuck on rejected choices
+MAX_ROUTER_CALLS_PER_REQUEST = 20
+
+
+def parse_route(text):
+    request_id, route = ROUTE.search(text).groups()
+    return request_id, route.split()
+
+
+def text_of(messages):
+    return "\n".join(str(message.get("content")) for message in messages if isinstance(message, dict))
+
+
+class AgentLLM(StubLLM):
+    def __init__(self, agent_id, max_latency):
+        super().__init__(max_latency=max_latency)
+        self.agent_id = agent_id
+
+    def answer(self, messages):
+        request_id, _ = parse_route(text_of(messages))
+        return ChatCompletionMessage(role="assistant", content=f"[{self.agent_id}:{request_id}]")
+
+
+class RouterLLM(StubLLM):
+    def __init__(self, max_latency):
+        super().__init__(max_latency=max_latency)
+        self.calls = {}
+
+    def answer(self, messages):
+        text = text_of(messages)
+        request_id, route = parse_route(text)
+        self.calls[request_id] = self.calls.get(request_id, 0) + 1
+        if self.calls[request_id] > MAX_ROUTER_CALLS_PER_REQUEST:
+            raise RuntimeError(f"request {request_id}: the orchestrator keeps rejecting valid choices")
+        next_agent = next(agent for agent in route if f"[{agent}:{request_id}]" not in text)
+        return SimpleNamespace(parsed=AgentChoiceResponse(agent_id=next_agent, reason="route"))
+
+
+class PlannerLLM(StubLLM):
+    def answer(self, messages):
+        request_id, route = parse_route(text_of(messages))
+        return SimpleNamespace(parsed=TeamPlan(plan=[TeamPlanStep(agent_id=agent, instructions=f"request {request_id} route: {' '.join(route)}") for agent in route]))
+
+
+def build_team(kind, max_latency):
+    agents = [Agent(id=f"agent_{i}", description=f"Agent {i}", system_message="Answer.", llm=AgentLLM(f"agent_{i}", max_latency)) for i in range(AGENTS)]
+
+    def route_completed(messages):
+        request_id, route = parse_route(text_of(messages))
+        return f"[{route[-1]}:{request_id}]" in str(messages[-1].get("content"))
+
+    if kind == "planned":
+        return PlannedTeam(llm=PlannerLLM(max_latency=max_latency), description="Stress team", id="team", members=agents)
+    transitions = {agent: [agents[(i + 1) % AGENTS]] for i, agent in enumerate(agents)}
+    return Team(llm=RouterLLM(max_latency=max_latency), description="Stress team", id="team", members=agents,
+                stop_callback=route_completed, allowed_transitions=transitions)
+
+
+def make_request(request_id):
+    start = random.randrange(AGENTS)
+    route = [f"agent_{(start + step) % AGENTS}" for step in range(random.randint(1, 3))]
+    return f"request {request_id} route: {' '.join(route)}", route
+
+
+def check(request_id, route, result, conversation):
+    answers = [message["content"] for message in conversation.messages if message.get("role") == "assistant" and message.get("name", "").startswith("agent_")]
+    expected = [f"[{agent}:{request_id}]" for agent in route]
+    if result == "agent-error" or answers != expected:
+        return f"request {request_id}: result {result}, answers {answers}, expected {expected}"
+    return None
+
+
+def run_threads(team, requests, concurrency):
+    def run(request_id):
+        inquiry, route = make_request(request_id)
+        workflow = Workflow(askable=team, conversation=Conversation(messages=[], variables={}, log=[]))
+        try:
+            result = workflow.run(inquiry)
+        except Exception as e:
+            return f"request {request_id}: {e}"
+        return check(request_id, route, result, workflow.conversation)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(run, range(requests)))
+
+
+async def run_async(team, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(request_id):
+        inquiry, route = make_request(request_id)
+        workflow = Workflow(askable=team, conversation=Conversation(messages=[], variables={}, log=[]))
+        async with semaphore:
+            try:
+                result = await workflow.run_async(inquiry)
+            except Exception as e:
+                return f"request {request_id}: {e}"
+        return check(request_id, route, result, workflow.conversation)
+
+    return await asyncio.gather(*[run(request_id) for request_id in range(requests)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel workflows over shared team and agent instances")
+    parser.add_argument("--requests", type=int, default=200, help="Workflows to run")
+    parser.add_argument("--concurrency", type=int, default=32, help="Workflows running at the same time")
+    parser.add_argument("--mode", choices=["thread", "async"], default="thread", help="Workflow.run in threads or Workflow.run_async on one event loop")
+    parser.add_argument("--team", choices=["team", "planned"], default="team", help="Team (routed) or PlannedTeam")
+    parser.add_argument("--max-latency", type=float, default=0.005, help="Maximum latency of the stub LLM calls, in seconds")
+    args = parser.parse_args()
+
+    team = build_team(args.team, args.max_latency)
+    started = time.perf_counter()
+    if args.mode == "thread":
+        failures = run_threads(team, args.requests, args.concurrency)
+    else:
+        failures = asyncio.run(run_async(team, args.requests, args.concurrency))
+    failures = [failure for failure in failures if failure is not None]
+    elapsed = time.perf_counter() - started
+
+    for failure in failures[:10]:
+        print(failure)
+    print(f"team={args.team} mode={args.mode} requests={args.requests} concurrency={args.concurrency} failures={len(failures)} elapsed_s={elapsed:.2f}")
+    sys.exit(1 if failures else 0)
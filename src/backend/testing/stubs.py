@@ -0,0 +1,78 @@
+"""
+In-process stubs shared by the testing scripts, no network is involved.
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Callable
+
+from openai.types.chat import ChatCompletionMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gbb.genai_vanilla_agents.llm import LLM
+
+USAGE = {"completion_tokens": 1, "prompt_tokens": 1, "total_tokens": 2, "cached_tokens": 0}
+
+
+class StubLLM(LLM):
+    """
+    LLM answering with a function of the request messages, after an optional random latency.
+
+    Subclasses can override answer instead of passing a function. The answer is a message (e.g. ChatCompletionMessage),
+    or an object with a parsed attribute for the requests with a response_format.
+
+    Args:
+        answer (Callable[[list], any]): The answer to the request messages, a fixed "Done." message when not given.
+        usage (dict): The usage returned with every answer.
+        max_latency (float): The maximum latency of a call in seconds, sampled uniformly.
+        record_requests (bool): Whether to keep the number of messages of each request in requests, off for the memory checks.
+    """
+    def __init__(self, answer: Callable[[list], any] = None, usage: dict = USAGE, max_latency: float = 0, record_requests: bool = False):
+        super().__init__({})
+        self.answer_function = answer
+        self.usage = usage
+        self.max_latency = max_latency
+        self.record_requests = record_requests
+        self.requests = []
+
+    def answer(self, messages: list):
+        if self.answer_function is None:
+            return ChatCompletionMessage(role="assistant", content="Done.")
+        return self.answer_function(messages)
+
+    def record(self, messages: list):
+        if self.record_requests:
+            self.requests.append(len(messages))
+
+    def wait(self):
+        if self.max_latency > 0:
+            time.sleep(random.uniform(0, self.max_latency))
+
+    async def wait_async(self):
+        if self.max_latency > 0:
+            await asyncio.sleep(random.uniform(0, self.max_latency))
+
+    def ask(self, messages, tools=None, tools_function=None, temperature=0.7, response_format=None):
+        self.record(messages)
+        self.wait()
+        return self.answer(messages), dict(self.usage)
+
+    async def ask_async(self, messages, tools=None, tools_function=None, temperature=0.7, response_format=None):
+        self.record(messages)
+        await self.wait_async()
+        return self.answer(messages), dict(self.usage)
+
+    def ask_stream(self, messages, tools=None, tools_function=None, temperature=0.7):
+        self.record(messages)
+        yield ["start", ""]
+        self.wait()
+        message = self.answer(messages)
+        content = getattr(message, "content", None) or ""
+        if content:
+            yield ["delta", {"content": content}]
+        response = [{"role": "assistant", "content": content}, dict(self.usage)]
+        yield ["response", response]
+        yield ["end", ""]
+        return response